@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+
+from snapshot_readers import SNAPSHOT_COLUMNS, sniff_format, available_engines
+
+
+def _usecols_for(filename):
+    '''按文件名匹配快照表声明的列，关键词取最长匹配（避免"销售量统计表"误配"-权益"表）'''
+    keys = [k for k in SNAPSHOT_COLUMNS if filename.startswith(k)]
+    return SNAPSHOT_COLUMNS[max(keys, key=len)] if keys else None
+
+
+def _best_of(func, repeat):
+    '''重复执行取最短耗时（秒）'''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark(folder_path, repeat=3):
+    '''
+    对文件夹下每个源文件、每个可用引擎分别测试整表读取与按列读取的耗时
+
+    :return: [(文件名, 格式, 引擎, 整表耗时, 按列耗时), ...]
+    '''
+    rows = []
+    for filename in sorted(os.listdir(folder_path)):
+        full_path = os.path.join(folder_path, filename)
+        if not os.path.isfile(full_path) or not filename.endswith(('.xls', '.xlsx', '.csv')):
+            continue
+        fmt = sniff_format(full_path)
+        usecols = _usecols_for(filename)
+        for engine, reader in available_engines(fmt):
+            full = _best_of(lambda: reader(full_path), repeat)
+            projected = _best_of(lambda: reader(full_path, usecols), repeat) if usecols else None
+            rows.append((filename, fmt, engine, full, projected))
+    return rows
+
+
+if __name__ == "__main__":
+    # 读取并校验执行参数
+    if len(sys.argv) > 3:
+        print("用法: python benchmark_readers.py [源文件夹] [重复次数]")
+        sys.exit(1)
+
+    folder_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.getcwd(), '参考文件')
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    print(f"{'文件':<40}{'格式':<8}{'引擎':<10}{'整表(秒)':>10}{'按列(秒)':>10}")
+    for filename, fmt, engine, full, projected in benchmark(folder_path, repeat):
+        projected = f"{projected:.3f}" if projected is not None else '-'
+        print(f"{filename:<40}{fmt:<8}{engine:<10}{full:>10.3f}{projected:>10}")
@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from run_metrics import STAGES, peak_mb, reset_metrics
+
+DEFAULT_SCALES = [1000, 10000, 100000]
+
+
+def run_one(name, workdir, param_date, cache=False):
+    '''
+    在独立的子进程中生成一张报表并计时（由benchmark调用），写出进程数固定为1，写出耗时计入write阶段
+
+    :param cache: 为False时不使用快照缓存，每次都解析源文件
+    :return: {'seconds': {阶段: 秒}, 'total': 秒, 'base_mb': 开始前内存, 'peak_mb': 内存峰值, 'error': 失败原因}
+    '''
+    os.chdir(workdir)
+    import snapshot_cache
+    snapshot_cache.CACHE_ENABLED = cache
+    import run_reports
+    from workbook_pool import get_writer_pool
+    get_writer_pool().max_workers = 1
+    from report_api import load_report
+    load_report(name)
+
+    # 各阶段耗时取自运行指标中的自身耗时，嵌套调用只计入最内层的阶段
+    metrics = reset_metrics()
+    base_mb = peak_mb()
+    start = time.perf_counter()
+    # 报表的过程输出及异常堆栈不显示，失败原因由返回值给出
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, \
+            contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        failures = run_reports.run_reports(param_date, [name], workdir)
+    total = time.perf_counter() - start
+    seconds = dict.fromkeys(STAGES, 0.0)
+    for record in metrics.records:
+        if record['stage'] in seconds:
+            seconds[record['stage']] += record.get('self_s') or 0.0
+    seconds = {stage: round(value, 4) for stage, value in seconds.items()}
+    seconds['other'] = round(max(total - sum(seconds.values()), 0.0), 4)
+    return {'seconds': seconds, 'total': round(total, 4), 'base_mb': base_mb,
+            'peak_mb': peak_mb(), 'error': failures.get(name)}
+
+
+def prepare_workdir(root, managers, param_date, fmt, seed):
+    '''生成（或复用参数相同的）全部报表所需的合成数据工作目录，返回 (目录, 生成耗时秒数)'''
+    from synthetic_data import PARAMS_FILE, generate_workdir
+    workdir = os.path.join(root, f"{managers}_{fmt}_{seed}")
+    params = {'dates': [param_date], 'names': None, 'format': fmt, 'managers': managers, 'seed': seed}
+    params_path = os.path.join(workdir, PARAMS_FILE)
+    if os.path.exists(params_path):
+        with open(params_path, encoding='utf-8') as f:
+            saved = json.load(f)
+        if all(saved.get(k) == v for k, v in params.items()):
+            return workdir, 0.0
+    start = time.perf_counter()
+    generate_workdir(workdir, [param_date], None, fmt, managers=managers, seed=seed)
+    return workdir, time.perf_counter() - start
+
+
+def benchmark(scales, names, param_date='20250319', root=None, fmt='xlsx', seed=0, repeat=1, cache=False):
+    '''
+    在各规模的合成数据上逐张报表计时：每张报表在新的子进程中运行（互不共享已读取的快照），
+    重复repeat次取总耗时最短的一次
+
+    :param scales: 理财经理人数列表，如 [1000, 10000, 100000]
+    :param names: 报表名列表
+    :param cache: 为True时使用快照缓存，并先运行一次预热
+    :return: [{'managers', 'report', 'seconds', 'total', 'rows_per_sec', 'base_mb', 'peak_mb', 'error'}, ...]
+    '''
+    import run_reports
+    names = run_reports.parse_report_names(names)
+    root = root or os.path.join(tempfile.gettempdir(), 'report_benchmark')
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for managers in scales:
+        workdir, generated = prepare_workdir(root, managers, param_date, fmt, seed)
+        if generated:
+            print(f"已生成{managers}人的合成数据，用时{generated:.1f}秒：{workdir}\n")
+        for name in names:
+            runs = []
+            for i in range(repeat + (1 if cache else 0)):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    runs.append(executor.submit(run_one, name, workdir, param_date, cache).result())
+            if cache:
+                runs = runs[1:]
+            best = min(runs, key=lambda r: r['total'])
+            best.update({
+                'managers': managers,
+                'report': name,
+                'rows_per_sec': round(managers / best['total'], 1) if best['total'] else None,
+                'peak_mb': max(r['peak_mb'] for r in runs) if best['peak_mb'] is not None else None,
+            })
+            results.append(best)
+            print(format_row(best))
+    return results
+
+
+def format_header():
+    return f"{'人数':>9} {'报表':<14}" + ''.join(f"{stage:>14}" for stage in list(STAGES) + ['other']) + \
+        f"{'总耗时':>10}{'人/秒':>12}{'内存峰值MB':>12}"
+
+
+def format_row(result):
+    stages = ''.join(f"{result['seconds'][stage]:>14.3f}" for stage in list(STAGES) + ['other'])
+    peak = f"{result['peak_mb']:.1f}" if result['peak_mb'] is not None else '-'
+    line = f"{result['managers']:>9} {result['report']:<14}{stages}{result['total']:>10.3f}" \
+           f"{result['rows_per_sec'] or 0:>12.0f}{peak:>12}"
+    if result.get('error'):
+        line += f"  失败：{result['error']}"
+    return line
+
+
+def compare(results, baseline):
+    '''与基线结果逐项对比，返回 [(人数, 报表, 阶段, 基线秒数, 本次秒数, 本次/基线), ...]'''
+    previous = {(r['managers'], r['report']): r for r in baseline}
+    rows = []
+    for r in results:
+        base = previous.get((r['managers'], r['report']))
+        if base is None:
+            continue
+        for stage in list(STAGES) + ['other', 'total']:
+            old = base['total'] if stage == 'total' else base['seconds'].get(stage, 0.0)
+            new = r['total'] if stage == 'total' else r['seconds'].get(stage, 0.0)
+            rows.append((r['managers'], r['report'], stage, old, new, new / old if old else None))
+    return rows
+
+
+if __name__ == "__main__":
+
+    # 读取并校验执行参数
+    parser = argparse.ArgumentParser(description='在合成数据上按阶段测试各报表的耗时、吞吐量及内存峰值')
+    parser.add_argument('reports', nargs='*', help='报表名，默认为all')
+    parser.add_argument('--managers', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help=f"理财经理人数（可给出多个规模），默认 {' '.join(map(str, DEFAULT_SCALES))}")
+    parser.add_argument('--date', default='20250319', help='报表日期，格式为YYYYMMDD，默认20250319')
+    parser.add_argument('--workdir', help='合成数据的存放目录，默认在系统临时目录下')
+    parser.add_argument('--format', choices=('xlsx', 'csv'), default='xlsx', help='源文件格式，默认xlsx')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子，默认0')
+    parser.add_argument('--repeat', type=int, default=1, help='每张报表重复次数，取最短的一次，默认1')
+    parser.add_argument('--cache', action='store_true', help='使用快照缓存（先预热一次），默认每次都解析源文件')
+    parser.add_argument('--json', dest='output', help='将结果保存为json文件')
+    parser.add_argument('--baseline', help='与之前保存的json结果对比')
+    args = parser.parse_args()
+
+    try:
+        import run_reports
+        from datetime import datetime
+        datetime.strptime(args.date, "%Y%m%d")
+        run_reports.parse_report_names(args.reports)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(format_header())
+    results = benchmark(args.managers, args.reports or None, args.date, args.workdir, args.format,
+                        args.seed, args.repeat, args.cache)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存至：{args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n{'人数':>9} {'报表':<14}{'阶段':<14}{'基线(秒)':>10}{'本次(秒)':>10}{'本次/基线':>10}")
+        for managers, name, stage, old, new, ratio in compare(results, baseline):
+            ratio = f"{ratio:.2f}" if ratio is not None else '-'
+            print(f"{managers:>9} {name:<14}{stage:<14}{old:>10.3f}{new:>10.3f}{ratio:>10}")
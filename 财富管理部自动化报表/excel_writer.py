@@ -0,0 +1,311 @@
+import os
+import re
+import json
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pandas as pd
+
+# 每批转换并写出的行数，同一时间只有一批行以Python对象的形式存在
+BATCH_ROWS = 5000
+
+_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_CT_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+
+# 审计及下游分析用的中间表，不对外通报。设置环境变量 REPORT_SIDE_OUTPUT（parquet、feather 或 csv.gz）后
+# 这些工作表改为在工作簿旁写出列式文件，工作簿只保留通报用的工作表，并写出关联二者的清单文件
+INTERMEDIATE_SHEETS = ('机构中间表', '用户中间表', '多日明细情况')
+SIDE_OUTPUT_FORMATS = ('parquet', 'feather', 'csv.gz')
+SIDE_OUTPUT = os.environ.get('REPORT_SIDE_OUTPUT') or None
+
+# 日期时间单元格的格式，与 DataFrame.to_excel 的默认格式相同
+DATETIME_FORMAT = 'YYYY-MM-DD HH:MM:SS'
+DATE_FORMAT = 'YYYY-MM-DD'
+_EPOCH = datetime(1899, 12, 30)
+
+# xml中不允许出现的控制字符
+_ILLEGAL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# 工作表名称中不允许出现的字符
+_BAD_SHEET_NAME = re.compile(r'[\[\]:*?/\\]')
+
+
+def column_letter(i):
+    '''列号（从1开始）转换为列字母'''
+    letters = ''
+    while i > 0:
+        i, rem = divmod(i - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def check_writable(df, sheet_name, index=True):
+    '''
+    检查df能否写出：行索引只支持单层；多层列名需要写出行索引（与 to_excel 相同），否则抛出ValueError
+    '''
+    if df.index.nlevels > 1:
+        raise ValueError(f"工作表{sheet_name}的行索引为多层，需先 reset_index 后再写出")
+    if df.columns.nlevels > 1 and not index:
+        raise ValueError(f"工作表{sheet_name}的列名为多层，需要写出行索引（index=True）")
+
+
+def _column_values(series):
+    '''将一列转换为可写入单元格的Python对象列表：空值写为空单元格，正负无穷与to_excel一样写为 inf/-inf'''
+    values = series.to_numpy(dtype=object, na_value=None)
+    if series.dtype.kind == 'f':
+        data = series.to_numpy(dtype='float64', na_value=np.nan)
+        values[np.isnan(data)] = None
+        values[np.isposinf(data)] = 'inf'
+        values[np.isneginf(data)] = '-inf'
+    return values.tolist()
+
+
+class StreamingExcelWriter:
+    '''
+    流式写出excel：各工作表的xml按批生成后直接压缩写入xlsx文件，不构造单元格对象，
+    内存占用只与一批行的大小有关。单元格取值及合并单元格与 DataFrame.to_excel 相同，
+    可代替 pd.ExcelWriter(engine='openpyxl') 配合 to_excel 的写法。
+    各文件先写入临时文件，完成后原子替换，不会留下写了一半的工作簿；
+    开启旁路输出时中间表写为 "{工作簿名}.{工作表名}.{格式}" 文件，并写出 "{工作簿名}.manifest.json"
+    '''
+
+    def __init__(self, path, batch_rows=BATCH_ROWS, side_output=None):
+        '''
+        :param side_output: 中间表的旁路输出格式，见SIDE_OUTPUT_FORMATS，为None时使用模块变量SIDE_OUTPUT（默认写入工作簿）
+        '''
+        self.path = path
+        self.batch_rows = batch_rows
+        self.side_output = side_output or SIDE_OUTPUT
+        if self.side_output is not None and self.side_output not in SIDE_OUTPUT_FORMATS:
+            raise ValueError(f"不支持的中间表输出格式: {self.side_output}，可选: {', '.join(SIDE_OUTPUT_FORMATS)}")
+        self.sheets = []
+        self.side_files = []
+        # 单元格样式：[数字格式, ...]，样式0为常规格式
+        self._formats = [None]
+        self._tmp_path = self._temporary(path)
+        self._zip = zipfile.ZipFile(self._tmp_path, 'w', zipfile.ZIP_DEFLATED)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.save()
+        else:
+            # 写出失败时不保留不完整的文件
+            self._zip.close()
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+
+    @staticmethod
+    def _temporary(path):
+        return f"{path}.{os.getpid()}.tmp"
+
+    def _style(self, number_format):
+        '''返回数字格式对应的样式编号，首次使用时登记'''
+        if not number_format:
+            return 0
+        if number_format not in self._formats:
+            self._formats.append(number_format)
+        return self._formats.index(number_format)
+
+    def _cell(self, ref, value, style):
+        '''单个单元格的xml，空值返回空字符串'''
+        if value is None:
+            return ''
+        if isinstance(value, np.generic):
+            value = value.item()
+        s = f' s="{style}"' if style else ''
+        if isinstance(value, bool):
+            return f'<c r="{ref}" t="b"{s}><v>{int(value)}</v></c>'
+        if isinstance(value, (int, float)):
+            return f'<c r="{ref}"{s}><v>{value!r}</v></c>'
+        if isinstance(value, datetime):
+            if isinstance(value, pd.Timestamp):
+                value = value.to_pydatetime()
+            serial = (value.replace(tzinfo=None) - _EPOCH).total_seconds() / 86400
+            style = style or self._style(DATETIME_FORMAT)
+            return f'<c r="{ref}" s="{style}"><v>{serial!r}</v></c>'
+        if isinstance(value, date):
+            serial = (value - _EPOCH.date()).days
+            style = style or self._style(DATE_FORMAT)
+            return f'<c r="{ref}" s="{style}"><v>{serial}</v></c>'
+        text = _ILLEGAL.sub('', str(value))
+        if text == '':
+            return ''
+        space = ' xml:space="preserve"' if text != text.strip() else ''
+        return f'<c r="{ref}" t="inlineStr"{s}><is><t{space}>{escape(text)}</t></is></c>'
+
+    def _header_rows(self, df, index, top=0):
+        '''表头行及需要合并的单元格区域，与 to_excel(merge_cells=True) 一致；top为表头之上已占用的行数'''
+        offset = 1 if index else 0
+        columns = df.columns
+        if columns.nlevels == 1:
+            names = [df.index.name] if index else []
+            return [names + list(columns)], []
+
+        rows, merges = [], []
+        tuples = list(columns)
+        for level in range(columns.nlevels):
+            row = [columns.names[level]]
+            if level < columns.nlevels - 1:
+                # 上层标签在前缀相同的连续列上合并
+                start = 0
+                for i in range(1, len(tuples) + 1):
+                    if i == len(tuples) or tuples[i][:level + 1] != tuples[start][:level + 1]:
+                        row.extend([tuples[start][level]] + [None] * (i - start - 1))
+                        if i - start > 1:
+                            merges.append(f"{column_letter(start + offset + 1)}{top + level + 1}:"
+                                          f"{column_letter(i + offset)}{top + level + 1}")
+                        start = i
+            else:
+                row.extend(t[level] for t in tuples)
+            rows.append(row)
+        # to_excel在多层列表头之后留出一行写行索引名称
+        rows.append([df.index.name] + [None] * len(tuples))
+        return rows, merges
+
+    def _write_side(self, df, sheet_name, index):
+        '''将中间表写为工作簿旁的列式文件'''
+        stem = os.path.splitext(self.path)[0]
+        path = f"{stem}.{sheet_name}.{self.side_output}"
+        tmp_path = self._temporary(path)
+        if self.side_output == 'parquet':
+            df.to_parquet(tmp_path, index=index)
+        elif self.side_output == 'feather':
+            # feather不保存行索引，需要时转为普通列
+            (df.reset_index() if index else df.reset_index(drop=True)).to_feather(tmp_path)
+        else:
+            df.to_csv(tmp_path, index=index, compression='gzip')
+        os.replace(tmp_path, path)
+        self.side_files.append({
+            'sheet': sheet_name,
+            'path': os.path.basename(path),
+            'format': self.side_output,
+            'rows': len(df),
+            'columns': ([df.index.name or 'index'] if index else []) + [str(col) for col in df.columns],
+        })
+
+    def write(self, df, sheet_name, index=True, title_rows=None):
+        '''
+        将df写入新的工作表，等同于 df.to_excel(writer, sheet_name=sheet_name, index=index)；
+        开启旁路输出时中间表（INTERMEDIATE_SHEETS）改为写出列式文件
+
+        :param index: 是否写出行索引（单层），多层列名时必须写出，见check_writable
+        :param title_rows: 表头之上的标题行，每行为单元格取值的列表，如源文件前两行的表名及统计时间
+        '''
+        check_writable(df, sheet_name, index)
+        if self.side_output is not None and sheet_name in INTERMEDIATE_SHEETS:
+            return self._write_side(df, sheet_name, index)
+        if len(sheet_name) > 31 or _BAD_SHEET_NAME.search(sheet_name) or sheet_name in self.sheets:
+            raise ValueError(f"无效或重复的工作表名称: {sheet_name}")
+        title_rows = [list(row) for row in title_rows or []]
+        header, merges = self._header_rows(df, index, top=len(title_rows))
+        header = title_rows + header
+        offset = 1 if index else 0
+        width = max([df.shape[1] + offset] + [len(row) for row in header])
+        letters = [column_letter(j + 1) for j in range(width)]
+
+        self.sheets.append(sheet_name)
+        last = f"{letters[-1]}{len(header) + len(df)}" if width else 'A1'
+        with self._zip.open(f'xl/worksheets/sheet{len(self.sheets)}.xml', 'w') as f:
+            f.write((f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                     f'<worksheet xmlns="{_NS}" xmlns:r="{_REL_NS}">'
+                     f'<dimension ref="A1:{last}"/><sheetData>').encode('utf-8'))
+            rows = []
+            for r, row in enumerate(header, start=1):
+                cells = ''.join(self._cell(f'{letters[j]}{r}', v, 0) for j, v in enumerate(row))
+                rows.append(f'<row r="{r}">{cells}</row>')
+            f.write(''.join(rows).encode('utf-8'))
+
+            index_values = pd.Series(df.index, index=df.index)
+            r = len(header)
+            for start in range(0, len(df), self.batch_rows):
+                batch = df.iloc[start:start + self.batch_rows]
+                columns = [_column_values(batch.iloc[:, j]) for j in range(batch.shape[1])]
+                if index:
+                    columns.insert(0, _column_values(index_values.iloc[start:start + self.batch_rows]))
+                rows = []
+                for row in zip(*columns):
+                    r += 1
+                    cells = ''.join(self._cell(f'{letters[j]}{r}', v, 0) for j, v in enumerate(row))
+                    rows.append(f'<row r="{r}">{cells}</row>')
+                f.write(''.join(rows).encode('utf-8'))
+
+            tail = '</sheetData>'
+            if merges:
+                tail += f'<mergeCells count="{len(merges)}">'
+                tail += ''.join(f'<mergeCell ref="{m}"/>' for m in merges) + '</mergeCells>'
+            f.write((tail + '</worksheet>').encode('utf-8'))
+
+    def _styles_xml(self):
+        formats = self._formats[1:]
+        num_fmts = ''
+        if formats:
+            num_fmts = f'<numFmts count="{len(formats)}">' + ''.join(
+                f'<numFmt numFmtId="{164 + i}" formatCode={quoteattr(fmt)}/>' for i, fmt in enumerate(formats)
+            ) + '</numFmts>'
+        xfs = '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>' + ''.join(
+            f'<xf numFmtId="{164 + i}" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+            for i in range(len(formats)))
+        return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<styleSheet xmlns="{_NS}">{num_fmts}'
+                '<fonts count="1"><font><sz val="11"/><name val="Calibri"/><family val="2"/></font></fonts>'
+                '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+                '<fill><patternFill patternType="gray125"/></fill></fills>'
+                '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+                '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+                f'<cellXfs count="{len(formats) + 1}">{xfs}</cellXfs>'
+                '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+                '</styleSheet>')
+
+    def save(self):
+        '''写入工作簿结构及样式并关闭文件'''
+        if not self.sheets:
+            raise ValueError("工作簿中至少需要一张工作表")
+        n = len(self.sheets)
+        head = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        content_types = (f'{head}<Types xmlns="{_CT_NS}">'
+                         '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                         '<Default Extension="xml" ContentType="application/xml"/>'
+                         '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                         '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                         + ''.join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                                   for i in range(1, n + 1))
+                         + '</Types>')
+        root_rels = (f'{head}<Relationships xmlns="{_PKG_REL_NS}">'
+                     f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+                     '</Relationships>')
+        workbook = (f'{head}<workbook xmlns="{_NS}" xmlns:r="{_REL_NS}"><sheets>'
+                    + ''.join(f'<sheet name={quoteattr(name)} sheetId="{i}" r:id="rId{i}"/>'
+                              for i, name in enumerate(self.sheets, start=1))
+                    + '</sheets></workbook>')
+        workbook_rels = (f'{head}<Relationships xmlns="{_PKG_REL_NS}">'
+                         + ''.join(f'<Relationship Id="rId{i}" Type="{_REL_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                                   for i in range(1, n + 1))
+                         + f'<Relationship Id="rId{n + 1}" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+                         '</Relationships>')
+        self._zip.writestr('[Content_Types].xml', content_types)
+        self._zip.writestr('_rels/.rels', root_rels)
+        self._zip.writestr('xl/workbook.xml', workbook)
+        self._zip.writestr('xl/_rels/workbook.xml.rels', workbook_rels)
+        self._zip.writestr('xl/styles.xml', self._styles_xml())
+        self._zip.close()
+        os.replace(self._tmp_path, self.path)
+        if self.side_files:
+            self._write_manifest()
+
+    def _write_manifest(self):
+        '''清单文件：工作簿中的工作表及各中间表文件，路径相对于清单所在文件夹'''
+        manifest = {
+            'workbook': os.path.basename(self.path),
+            'sheets': self.sheets,
+            'side_outputs': self.side_files,
+        }
+        path = f"{os.path.splitext(self.path)[0]}.manifest.json"
+        tmp_path = self._temporary(path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
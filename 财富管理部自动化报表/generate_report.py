@@ -1,319 +1,415 @@
 import os
 import sys
+import argparse
 import warnings
+import traceback
 import pandas as pd
-from datetime import datetime, timedelta
+from snapshot_repository import get_repository
+from snapshot_schema import fill_missing
+from report_aggregation import aggregate, rollup
+from report_hierarchy import HIERARCHIES, DEFAULT_HIERARCHY, TOTAL_GROUP, MATCH_FILES, PERIODS, LAYOUTS, SALES_REPORTS
+from period_delta import PeriodDelta, window_start
+from snapshot_tensor import SnapshotTensor
+from workbook_pool import WorkbookJob, get_writer_pool, wait_workbooks
+from run_metrics import timed, finish_run
+from run_profiler import add_profile_arguments, profiling
+from datetime import datetime
 
 
 # 忽略读取警告
 warnings.filterwarnings('ignore', category=UserWarning, message="Workbook contains no default style")
-# 读取并校验执行参数
-
-# 检查是否有足够的参数
-if len(sys.argv) != 2:
-    print("用法: python 111.py <YYYYMMDD>")
-    sys.exit(1)  # 如果没有参数，退出程序
-
-param_date = sys.argv[1]
-abs_path = os.getcwd()
-
-def get_first_workday_of_month(date_obj):
-    """获取某个月的第一个工作日（周一至周五）"""
-    first_day = date_obj.replace(day=1)
-    # 处理首日为周末的情况
-    if first_day.isoweekday() == 6:   # 周六 -> 下周一（+2天）
-        return first_day + timedelta(days=2)
-    elif first_day.isoweekday() == 7: # 周日 -> 下周一（+1天）
-        return first_day + timedelta(days=1)
-    else:
-        return first_day
-
-def get_last_workday(date_obj):
-    """计算上一个工作日（周一返回上周五，周末返回周五，其他返回前一日）"""
-    if date_obj.isoweekday() == 1:  # 周一
-        return date_obj - timedelta(days=3)
-    elif date_obj.isoweekday() >= 6:  # 周六或周日
-        return date_obj - timedelta(days=(date_obj.isoweekday() - 5))
-    else:  # 周二到周五
-        return date_obj - timedelta(days=1)
-
-def get_last_wednesday(date_obj):
-    """计算上一个周三（当天为周三时取七天前）"""
-    current_weekday = date_obj.isoweekday()
-    # 当天是周三时 delta=7，否则按原逻辑计算
-    delta = 7 if current_weekday == 3 else (current_weekday - 3) % 7
-    return date_obj - timedelta(days=delta)
-
-def last_day_of_last_month(date_obj):
-    """计算传入日期的上个月的最后一天"""
-    first_day_of_current_month = date_obj.replace(day=1)
-    return first_day_of_current_month - timedelta(days=1)
-
-
-def load_data(date_str):
-    """
-    根据传入的日期读取相关文件并返回字典
-    
-    :param folder_path: 文件夹路径
-    :param date_str: 8位日期字符串，格式为YYYYMMDD
-    :return: 包含DataFrame的字典
-    """
 
-    date_obj = datetime.strptime(date_str, "%Y%m%d").date()
-    folder_path = os.path.join(abs_path,'参考文件')
-    print(f'正在读取投资理财销售量统计表{date_str}.xlsx...\n')
-    # 处理投资理财销售量统计表
-    sales_dates = {
-        'sales_today': date_obj,
-        'sales_lm': last_day_of_last_month(date_obj),
-        'sales_ld': get_last_workday(date_obj),
-        'sales_lw': get_last_wednesday(date_obj)
-    }
+# 销售量快照中读取的资产列，及由其相加得到的派生列
+ASSET_NEED = ["理财/资管","理财","保险","基金","资产管理计划","贵金属","实物贵金属","黄金积存","合计"]
+DERIVED = {'理财/资管': ['理财','资产管理计划'], '贵金属': ['实物贵金属','黄金积存']}
 
-    if get_last_workday(date_obj).month != date_obj.month:
-        cross_month = 2
-    elif get_last_wednesday(date_obj).month != date_obj.month:
-        cross_month = 1
-    else:
-        cross_month = 0
+# 统计开单情况的资产列，按用户中间表的列顺序排列
+ASSET_COLUMNS = ['理财/资管', '保险', '基金', '贵金属']
 
+# 输出工作簿所在的文件夹
+OUTPUT_DIR = '理财经理开单情况统计表'
 
-    sales_dict = {}
-    print(f'正在读取投资理财销售量统计表{date_str}.xlsx...\n')
-    for key, d in sales_dates.items():
-        filename = f"投资理财销售量统计表{d.strftime('%Y%m%d')}"
-        filepath = os.path.join(folder_path, filename)
-        found = False
-        # 尝试不同的文件扩展名
-        for ext in ['.xls', '.xlsx','.csv']:
-            full_path = filepath + ext
-            if os.path.exists(full_path):
-                try:
-                    if ext == '.csv':
-                        df = pd.read_csv(full_path)
-                    else:
-                        df = pd.read_excel(full_path,engine = 'openpyxl',header=2)
-                    sales_dict[key] = df
-                    found = True
-                    break
-                except Exception as e:
-                    raise ValueError(f"读取文件 {full_path} 失败: {e}")
-        if not found:
-            raise FileNotFoundError(f"未找到文件: {filename}[.csv|.xlsx|.xls]")
-    
-    # 处理理财经理详细信息
-    manager_dates = {
-        'manager_today': date_obj,
-        'manager_lm': last_day_of_last_month(date_obj)
-    }
-    
-    manager_dict = {}
-    for key, d in manager_dates.items():
-        filename = f"理财经理详细信息{d.strftime('%Y%m%d')}"
-        filepath = os.path.join(folder_path, filename)
-        found = False
-        for ext in ['.csv', '.xlsx', '.xls']:
-            full_path = filepath + ext
-            if os.path.exists(full_path):
-                try:
-                    if ext == '.csv':
-                        df = pd.read_csv(full_path)
-                    else:
-                        df = pd.read_excel(full_path,engine = 'openpyxl',header=2)
-                    manager_dict[key] = df
-                    found = True
-                    break
-                except Exception as e:
-                    raise ValueError(f"读取文件 {full_path} 失败: {e}")
-        if not found:
-            raise FileNotFoundError(f"未找到文件: {filename}[.csv|.xlsx]")
-    
-    # 合并字典
-    return {**sales_dict,**manager_dict},cross_month
-
-dfs,cross_month = load_data(param_date)
-
-# 明细销售情况预处理
-
-# 读取分行全简称对应关系及组别分类
-df_match = pd.read_excel(os.path.join(abs_path,'分行全简称对应及组别分类.xlsx'))
+# 结果表中组别的排列顺序
+GROUP_ORDER = ['无组别','第一组','第二组','第三组','第四组']
 
-# 处理柜员信息表并与对应关系关联
-def process_manager(df_manager,df_match):
-    df_manager_match = pd.merge(df_manager,df_match,on = '总行/一级分行名称',how = 'left')
-    column_need = ["序号","柜员号","姓名","总行/一级分行名称","分行","组别"]
-    return df_manager_match[column_need]
-
-# 将单日明细情况与分行情况关联获得分行及组别
-def process_sales(df_sales,df_manager_match):
-    df_sales_processed = pd.merge(df_manager_match,df_sales,how = 'left',left_on = '柜员号',right_on = '人员工号',suffixes=('_manager', '_sales'))
-    df_sales_processed['理财/资管'] = df_sales_processed['理财']+df_sales_processed['资产管理计划']
-    df_sales_processed['贵金属'] = df_sales_processed['实物贵金属'] + df_sales_processed['黄金积存']
-    column_need = ["柜员号","姓名","总行/一级分行名称","分行","组别","理财/资管","理财","保险","基金","资产管理计划","贵金属","实物贵金属","黄金积存","合计"]
-    return df_sales_processed[column_need]
 
-# 对df进行预处理
-def all_df_reduce(dfs,df_match):
+def report_units(names):
+    '''
+    各报表所属的统计单元：对应关系版本及统计口径均相同的报表共用关联后的花名册及聚合结果
 
-    dfs_processed = {}
+    :return: {报表名: 统计单元}，统计单元为口径名，对应关系非默认版本时加上版本号，如 "全国"、"全国24"
+    '''
+    return {name: f"{SALES_REPORTS[name]['hierarchy']}{SALES_REPORTS[name]['match']}" for name in names}
 
-    for i in dfs.keys():
-        if 'manager' in i :
-            dfs_processed[i] = process_manager(dfs[i],df_match).fillna({ '组别': '无组别'})
-        else: continue
-    for i in dfs.keys():
-        if 'sales' in i:
-            dfs_processed[i] = process_sales(dfs[i],dfs_processed['manager_today']).fillna(0)
-        else: continue
+def workbook_name(name):
+    '''
+    报表的工作簿名：统计周期的工作簿名，非默认口径加上口径名、非默认对应关系加上版本号，
+    使各报表的输出互不重名，如 理财经理开单情况统计表-全省、月度理财经理开单情况统计表-24版
+    '''
+    config = SALES_REPORTS[name]
+    parts = [PERIODS[config['period']]['workbook']]
+    if config['hierarchy'] != DEFAULT_HIERARCHY:
+        parts.append(config['hierarchy'])
+    if config['match']:
+        parts.append(f"{config['match']}版")
+    return '-'.join(parts)
 
-    return dfs_processed
+def output_files(param_date,names):
+    '''各报表输出的工作簿路径（相对工作目录）'''
+    return {name: os.path.join(OUTPUT_DIR,f'{workbook_name(name)}{param_date}.xlsx') for name in names}
 
-dfs_processed = all_df_reduce(dfs,df_match)
+def sales_dates(date_obj,names):
+    '''多张报表需要的销售量快照日期 {快照标签: 日期}，各统计周期共用当日快照'''
+    dates = {'today': date_obj}
+    for name in names:
+        for label,window in PERIODS[SALES_REPORTS[name]['period']]['snapshots'].items():
+            dates[label] = window_start(date_obj,window)
+    return dates
 
 
-# 加工当日销售情况
-def manager_sales_situ(sales_today,sales_yesterday,sales_last_week,sales_last_month,cross_month):
+def snapshot_requests(date_str,names=('report',)):
+    """
+    根据传入的日期返回生成报表所需的源文件清单，只计算日期不读取文件
 
-    merge_df1 = pd.merge(sales_today,sales_yesterday,on = '柜员号',how = 'left',suffixes=('', '_yd'))
-    merge_df2 = pd.merge(merge_df1,sales_last_week,on = '柜员号',how = 'left',suffixes=('', '_lw'))
+    :param date_str: 8位日期字符串，格式为YYYYMMDD
+    :param names: 报表名，见 report_hierarchy.SALES_REPORTS，多张报表共用同一日期的快照
+    :return: [(文件关键词, {键: 日期}, 扩展名列表), ...]
+    """
+    date_obj = datetime.strptime(date_str, "%Y%m%d").date()
 
-    merge_result = merge_df2[["柜员号","姓名","分行","组别"]].copy()
-    asset_columns = ['理财/资管', '保险', '基金', '贵金属']
+    # 处理投资理财销售量统计表
+    sales = {f'sales_{label}': d for label,d in sales_dates(date_obj,names).items()}
 
-    if cross_month == 0:
+    # 处理理财经理详细信息
+    manager_dates = {
+        'manager_today': date_obj,
+        'manager_lm': window_start(date_obj,'month')
+    }
 
-        for col in asset_columns:
-            merge_result[f"{col}_本日"] = merge_df2[col]-merge_df2[f"{col}_yd"]
-            merge_result[f"{col}_本周累积"] = merge_df2[col]-merge_df2[f"{col}_lw"]
+    return [('投资理财销售量统计表', sales, ['.xls', '.xlsx', '.csv']),
+            ('理财经理详细信息', manager_dates)]
 
-        merge_result['本日开单业务数'] = (merge_result[['理财/资管_本日','保险_本日','基金_本日','贵金属_本日']] > 0).sum(axis=1)
-        merge_result['本周累积开单业务数'] = (merge_result[['理财/资管_本周累积','保险_本周累积','基金_本周累积','贵金属_本周累积']] > 0).sum(axis=1)
-        merge_result['4种业务开单情况'] = 4*(merge_result['本周累积开单业务数'] ==4).astype(int)
-        merge_result['3种业务开单情况'] = 3*(merge_result['本周累积开单业务数'] ==3).astype(int)
-        merge_result['2种业务开单情况'] = 2*(merge_result['本周累积开单业务数'] ==2).astype(int)
-        merge_result['1种业务开单情况'] = (merge_result['本周累积开单业务数'] ==1).astype(int)
-        merge_result['本周0产能'] = (merge_result['本周累积开单业务数']>0).astype(int)
-        merge_result['当日0产能'] = (merge_result['本日开单业务数']>0).astype(int)
-        return merge_df2,merge_result
 
-    elif cross_month == 1:
-        merge_df3 = pd.merge(merge_df2,sales_last_month,on = '柜员号',how = 'left',suffixes=('', '_lm'))
+@timed('load')
+def load_data(date_str,names,abs_path):
+    """
+    根据传入的日期读取相关文件并返回字典
 
-        for col in asset_columns:
-            merge_result[f"{col}_本日"] = merge_df3[col]-merge_df3[f"{col}_yd"]
-            merge_result[f"{col}_本周累积"] = merge_df3[col] + merge_df3[f"{col}_lm"] - merge_df3[f"{col}_lw"]
+    :param date_str: 8位日期字符串，格式为YYYYMMDD
+    :param names: 报表名列表
+    :param abs_path: 工作目录
+    :return: 包含DataFrame的字典
+    """
 
-        merge_result['本日开单业务数'] = (merge_result[['理财/资管_本日','保险_本日','基金_本日','贵金属_本日']] > 0).sum(axis=1)
-        merge_result['本周累积开单业务数'] = (merge_result[['理财/资管_本周累积','保险_本周累积','基金_本周累积','贵金属_本周累积']] > 0).sum(axis=1)
-        merge_result['4种业务开单情况'] = 4*(merge_result['本周累积开单业务数'] ==4).astype(int)
-        merge_result['3种业务开单情况'] = 3*(merge_result['本周累积开单业务数'] ==3).astype(int)
-        merge_result['2种业务开单情况'] = 2*(merge_result['本周累积开单业务数'] ==2).astype(int)
-        merge_result['1种业务开单情况'] = (merge_result['本周累积开单业务数'] ==1).astype(int)
-        merge_result['本周0产能'] = (merge_result['本周累积开单业务数']>0).astype(int)
-        merge_result['当日0产能'] = (merge_result['本日开单业务数']>0).astype(int)
-        return merge_df3,merge_result
+    folder_path = os.path.join(abs_path,'参考文件')
+    print(f'正在读取投资理财销售量统计表{date_str}.xlsx...\n')
 
-    elif cross_month == 2:
-        merge_df3 = pd.merge(merge_df2,sales_last_month,on = '柜员号',how = 'left',suffixes=('', '_lm'))
+    # 所有源文件一次性读取，只解码流水线用到的列
+    dfs = get_repository().load(snapshot_requests(date_str,names), folder_path)
 
-        for col in asset_columns:
-            merge_result[f"{col}_本日"] = merge_df3[col] + merge_df3[f"{col}_lm"] - merge_df3[f"{col}_yd"]
-            merge_result[f"{col}_本周累积"] = merge_df3[col] + merge_df3[f"{col}_lm"] - merge_df3[f"{col}_lw"]
+    return dfs
 
-        merge_result['本日开单业务数'] = (merge_result[['理财/资管_本日','保险_本日','基金_本日','贵金属_本日']] > 0).sum(axis=1)
-        merge_result['本周累积开单业务数'] = (merge_result[['理财/资管_本周累积','保险_本周累积','基金_本周累积','贵金属_本周累积']] > 0).sum(axis=1)
-        merge_result['4种业务开单情况'] = 4*(merge_result['本周累积开单业务数'] ==4).astype(int)
-        merge_result['3种业务开单情况'] = 3*(merge_result['本周累积开单业务数'] ==3).astype(int)
-        merge_result['2种业务开单情况'] = 2*(merge_result['本周累积开单业务数'] ==2).astype(int)
-        merge_result['1种业务开单情况'] = (merge_result['本周累积开单业务数'] ==1).astype(int)
-        merge_result['本周0产能'] = (merge_result['本周累积开单业务数']>0).astype(int)
-        merge_result['当日0产能'] = (merge_result['本日开单业务数']>0).astype(int)
-        return merge_df3,merge_result
 
+# 处理柜员信息表并与对应关系关联
+def process_manager(df_manager,df_match,on):
+    column_need = ["序号","柜员号","姓名",on,"分行","组别"]
+    # 同一花名册与对应关系表在进程内只关联一次
+    return get_repository().roster(df_manager,df_match,on,column_need)
 
-merge_mid,df_result = manager_sales_situ(dfs_processed['sales_today'],dfs_processed['sales_ld'],dfs_processed['sales_lw'],dfs_processed['sales_lm'],cross_month)
+# 将各日销售量快照按人员工号对齐到花名册，存为 人员×资产×快照 的数组，与统计口径无关
+def process_sales(sales_snapshots,df_manager):
+    return SnapshotTensor.from_snapshots(df_manager[["柜员号","姓名"]],sales_snapshots,ASSET_NEED,derived=DERIVED,fill=0)
 
+# 对df进行预处理
+@timed('reduce')
+def all_df_reduce(dfs,df_matches,units):
+    '''
+    :param df_matches: {对应关系版本: 分行全简称对应关系}
+    :param units: {统计单元: (对应关系版本, 统计口径)}
+    :return: ({统计单元: {键: 关联后的花名册}}, 销售量快照数组, {统计单元: 关联失败的异常})
+    '''
+    rosters = {}
+    failures = {}
+    for unit,(match,hierarchy) in units.items():
+        on = HIERARCHIES[hierarchy]['on']
+        # 对应关系表中没有该口径的关联键等只影响该统计单元
+        try:
+            rosters[unit] = {i: fill_missing(process_manager(dfs[i],df_matches[match],on),{ '组别': '无组别'})
+                             for i in ('manager_today','manager_lm')}
+        except (KeyError, ValueError) as e:
+            failures[unit] = e
+    # 各日快照按 today、ld、lw、lm 标识，一次对齐到当日花名册
+    sales_snapshots = {i.split('_',1)[1]: dfs[i] for i in dfs.keys() if 'sales' in i}
+    return rosters,process_sales(sales_snapshots,dfs['manager_today']),failures
+
+
+# 加工各统计窗口的销售情况
+@timed('deltas')
+def manager_sales_situ(sales,date_obj,snapshots,windows):
+    '''
+    :param snapshots: {快照标签: 日期}
+    :param windows: {明细列后缀: 窗口名称}，如 {'本日': 'day', '本周累积': 'week'}
+    :return: 与花名册逐行对应的 柜员号、姓名、各资产各窗口的销售额及各窗口的开单业务数
+    '''
+    # 各日快照均为当月累计值，跨月时加回上月底数据由增量引擎按窗口处理
+    period = PeriodDelta(date_obj,sales,{('' if label == 'today' else f'_{label}'): (d,label) for label,d in snapshots.items()})
+
+    merge_result = pd.concat([sales.roster[["柜员号","姓名"]],period.deltas(windows,ASSET_COLUMNS)],axis=1)
+    for suffix in windows:
+        merge_result[f'{suffix}开单业务数'] = (merge_result[[f'{col}_{suffix}' for col in ASSET_COLUMNS]] > 0).sum(axis=1)
+    return merge_result
+
+def user_table(df_result,org,period):
+    '''用户中间表：按统计周期取出各窗口的销售额，并标出开单业务数及是否开单'''
+    windows = PERIODS[period]['windows']
+    columns = [f'{col}_{suffix}' for col in ASSET_COLUMNS for suffix,*_ in windows]
+    merge_result = pd.concat([df_result[["柜员号","姓名"]],org,df_result[columns]],axis=1)
+    for suffix,*_ in windows:
+        merge_result[f'{suffix}开单业务数'] = df_result[f'{suffix}开单业务数']
+    last = windows[-1][0]
+    merge_result['4种业务开单情况'] = 4*(merge_result[f'{last}开单业务数'] ==4).astype(int)
+    merge_result['3种业务开单情况'] = 3*(merge_result[f'{last}开单业务数'] ==3).astype(int)
+    merge_result['2种业务开单情况'] = 2*(merge_result[f'{last}开单业务数'] ==2).astype(int)
+    merge_result['1种业务开单情况'] = (merge_result[f'{last}开单业务数'] ==1).astype(int)
+    for suffix,_,_,flag in reversed(windows):
+        merge_result[flag] = (merge_result[f'{suffix}开单业务数']>0).astype(int)
+    return merge_result
+
+
+@timed('aggregation')
+def generate_report(df_result,orgs,last_month_orgs,windows,levels,totals):
+    '''
+    各统计单元的明细按单元堆叠后一次分组聚合，再一次上卷出各单元的总计行
+
+    :param orgs: {统计单元: 与df_result逐行对应的 分行、组别}
+    :param last_month_orgs: {统计单元: 关联后的上月底花名册}
+    :param windows: 各统计窗口的明细列后缀
+    :param levels: 按开单业务数分层统计的窗口后缀
+    :param totals: {统计单元: 总计行的分行名称}
+    :return: {统计单元: 机构中间表}，含全部窗口的统计列，分层人数列名前加窗口后缀，总计行在首行
+    '''
+    columns = ['柜员号',*[f'{col}_{suffix}' for suffix in windows for col in ASSET_COLUMNS],*[f'{suffix}开单业务数' for suffix in windows]]
+    stacked = pd.concat([pd.concat([org,df_result[columns]],axis=1).assign(口径=unit) for unit,org in orgs.items()],ignore_index=True)
+    last_month_df = pd.concat([df[['柜员号','分行','组别']].assign(口径=unit) for unit,df in last_month_orgs.items()],ignore_index=True)
 
-def generate_report(df,last_month_df):
     # 预处理：过滤无效数据
-    filtered = df[df['组别'] != '无组别'].copy()
-    last_month_df = last_month_df[last_month_df['组别'] != '无组别'].copy()
-    last_month_df = last_month_df.groupby('分行',as_index=False).agg(上月底总人数=('柜员号','nunique'))
-    
-    # 定义资产类别（与图片列顺序一致）
-    assets = ['保险', '理财/资管','贵金属','基金']
-    
-    agg_dict={"理财经理总人数":pd.NamedAgg(column='柜员号',aggfunc='nunique'),
-              **{f'{asset}_本日开单人数':pd.NamedAgg(column=f'{asset}_本日',aggfunc=lambda x: (x > 0).sum()) for asset in assets},
-              '本日未开单人数(0产能)':pd.NamedAgg(column='本日开单业务数',aggfunc=lambda x: (x <= 0).sum()),
-              **{f'{asset}_本周累积开单人数': pd.NamedAgg(column=f'{asset}_本周累积',aggfunc=lambda x: (x > 0).sum()) for asset in assets},
-              '本周累积未开单人数(0产能)':pd.NamedAgg(column='本周累积开单业务数',aggfunc=lambda x: (x <= 0).sum())
-              }
-    # 按分行分组聚合计算开单人数
-    group_persons_result = filtered.groupby(['组别','分行'], as_index=False).agg(**agg_dict)
-
-    # 分组统计不同业务数的人数
-    asset_num_result = (
-        df.groupby(["分行", "组别"])["本周累积开单业务数"]
-        .value_counts()
-        .unstack(fill_value=0)
-        .reindex(columns=[1, 2, 3, 4], fill_value=0)  # 确保包含所有业务数
-        .rename(columns=lambda x: f"{x}种业务开单人数")
-        .reset_index()
-    )
-    group_persons_result = group_persons_result.merge(asset_num_result,on = ['分行','组别'],how = 'left')
-    group_persons_result = group_persons_result.merge(last_month_df,on = '分行',how = 'left')
-
-    # 创建汇总字典，计算全国开单人数
-    sum_data = {'组别': '无组别', '分行': '全国'}
-    # 对其他数值列求和
-    for col in group_persons_result.columns:
-        if col not in ['组别', '分行']:
-            sum_data[col] = group_persons_result[col].sum()
-
-    # 将汇总行转换为DataFrame并调整位置
-    df_sum = pd.DataFrame([sum_data])
-    group_persons_result = pd.concat([df_sum, group_persons_result]).reset_index(drop=True)
-    custom_order = ['无组别','第一组','第二组','第三组','第四组']
-    group_persons_result['组别'] = pd.Categorical(group_persons_result['组别'],categories = custom_order,ordered=True)
+    filtered = stacked[stacked['组别'] != '无组别']
+    last_month_df = last_month_df[last_month_df['组别'] != '无组别']
+    last_month_df = last_month_df.groupby(['口径','分行'],as_index=False).agg(上月底总人数=('柜员号','nunique'))
+
+    agg_specs=[("理财经理总人数",'柜员号','nunique')]
+    for suffix in windows:
+        agg_specs += [(f'{asset}_{suffix}开单人数',f'{asset}_{suffix}','>0') for asset in ASSET_COLUMNS]
+        agg_specs.append((f'{suffix}未开单人数(0产能)',f'{suffix}开单业务数','<=0'))
+    for suffix in levels:
+        agg_specs += [(f'{suffix}{i}种业务开单人数',f'{suffix}开单业务数',f'=={i}') for i in [1, 2, 3, 4]]
+    # 按统计单元、分行分组一次聚合计算开单人数及开办不同业务数的人数
+    group_persons_result = aggregate(filtered,['口径','组别','分行'],agg_specs)
+    group_persons_result = group_persons_result.merge(last_month_df,on = ['口径','分行'],how = 'left')
+
+    # 一次上卷出各统计单元的合计行（置于各单元首行），分行取各单元口径的总计名称
+    rows = len(group_persons_result)
+    group_persons_result = rollup(group_persons_result,['口径','组别','分行'],[['口径']],{'组别': TOTAL_GROUP,'分行': None})
+    head = len(group_persons_result) - rows
+    branch = group_persons_result['分行'].to_numpy(dtype=object,copy=True)
+    branch[:head] = group_persons_result['口径'].iloc[:head].map(totals).to_numpy(dtype=object)
+    group_persons_result['分行'] = branch
+    return {unit: part.drop(columns='口径').reset_index(drop=True)
+            for unit,part in group_persons_result.groupby('口径',sort=False)}
+
+def report_sheets(group,period,layout):
+    '''按统计周期及版式从统计单元的机构中间表中取出本报表的统计列，并计算开单率'''
+    windows = PERIODS[period]['windows']
+    assets = LAYOUTS[layout]['assets']
+    last = windows[-1][0]
+    columns = ['组别','分行','理财经理总人数']
+    for suffix,*_ in windows:
+        columns += [f'{asset}_{suffix}开单人数' for asset in assets] + [f'{suffix}未开单人数(0产能)']
+    columns += [f'{last}{i}种业务开单人数' for i in [1, 2, 3, 4]] + ['上月底总人数']
+    group_persons_result = group[columns].rename(columns={f'{last}{i}种业务开单人数': f'{i}种业务开单人数' for i in [1, 2, 3, 4]})
+
+    group_persons_result['组别'] = pd.Categorical(group_persons_result['组别'],categories = GROUP_ORDER,ordered=True)
     group_persons_result = group_persons_result.sort_values('组别').reset_index(drop=True)
-    #group_persons_result = group_persons_result.sort_values(by='组别',ascending=False)
     # 计算开单率
     df_rate_result = group_persons_result [['组别','分行','理财经理总人数']].copy()
     df_rate_result['人数变动'] = group_persons_result ['理财经理总人数'] - group_persons_result ['上月底总人数']
 
-    df_day_rate = pd.DataFrame() # group_persons_result [['组别','分行']].copy()
-    df_day_rate['合计开单率'] = ((1 - group_persons_result['本日未开单人数(0产能)'] / group_persons_result["理财经理总人数"]) ).round(4)
-    df_week_rate = pd.DataFrame() # group_persons_result [['组别','分行']].copy()
-    df_week_rate['合计开单率'] = ((1 - group_persons_result['本周累积未开单人数(0产能)'] / group_persons_result["理财经理总人数"]) ).round(4)
-
-    for col in assets:
-        df_day_rate[f"{col}"] = (group_persons_result[f"{col}_本日开单人数"] / group_persons_result["理财经理总人数"] ).round(4)
-        df_week_rate[f"{col}"] = (group_persons_result[f"{col}_本周累积开单人数"] / group_persons_result["理财经理总人数"] ).round(4)
-    
-    df_day_rate['未开单人数(0产能)'] = group_persons_result['本日未开单人数(0产能)'] 
-
-    for i in [4,3,2,1]:
-        df_week_rate[f"{i}种业务开单率"] = (group_persons_result[f"{i}种业务开单人数"] / group_persons_result["理财经理总人数"] ).round(4)
-    df_week_rate['未开单人数(0产能)'] = group_persons_result['本周累积未开单人数(0产能)'] 
-
-    df_rate_result = pd.concat({"":df_rate_result,'本日开单率情况':df_day_rate,'本周开单率情况':df_week_rate},axis=1)
-    #df_rate_result = df_rate_result.sort_values(by='组别',ascending=True)
+    rates = {"": df_rate_result}
+    for suffix,_,title,_ in windows:
+        df_rate = pd.DataFrame()
+        df_rate['合计开单率'] = ((1 - group_persons_result[f'{suffix}未开单人数(0产能)'] / group_persons_result["理财经理总人数"]) ).round(4)
+        for col in assets:
+            name = f"{col}_{suffix}开单率" if LAYOUTS[layout]['rate_suffix'] else col
+            df_rate[name] = (group_persons_result[f"{col}_{suffix}开单人数"] / group_persons_result["理财经理总人数"] ).round(4)
+        if suffix == last:
+            for i in LAYOUTS[layout]['levels']:
+                df_rate[f"{i}种业务开单率"] = (group_persons_result[f"{i}种业务开单人数"] / group_persons_result["理财经理总人数"] ).round(4)
+        df_rate['未开单人数(0产能)'] = group_persons_result[f'{suffix}未开单人数(0产能)']
+        rates[title] = df_rate
+
+    df_rate_result = pd.concat(rates,axis=1)
     return group_persons_result,df_rate_result
 
 
-group_persons_result,df_rate_result = generate_report(df_result,dfs_processed['manager_lm'])
-
-if not os.path.exists('./理财经理开单情况统计表'):
-    os.makedirs('./理财经理开单情况统计表')
-print(f"正在生成：理财经理开单情况统计表{param_date}.xlsx...\n")
-# 将中间结果及结果表写入excel
-output_path = os.path.join(abs_path,'理财经理开单情况统计表',f'理财经理开单情况统计表{param_date}.xlsx') 
-
-# 核心写入逻辑
-with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-    df_rate_result.to_excel(writer, sheet_name='结果通报表')
-    df_result.to_excel(writer, sheet_name='用户中间表', index=False)
-    group_persons_result.to_excel(writer, sheet_name='机构中间表', index=False)
-
-print(f"理财经理开单情况统计表已保存至：{output_path}\n")
+def build(param_date,dfs,df_matches):
+    '''
+    由已读取的源文件一次计算多张开单情况统计表的各工作表，不读写文件，也不使用模块变量：
+    各日快照只对齐一次，全部统计单元只聚合、上卷一次
+
+    :param dfs: load_data的结果，{键: DataFrame}
+    :param df_matches: {报表名: 分行全简称对应关系及组别分类}，报表名见 report_hierarchy.SALES_REPORTS
+    :return: ({报表名: {工作簿名: {工作表名: DataFrame}}}, {报表名: 失败的异常})，某一口径关联失败只影响使用该口径的报表
+    '''
+    date_obj = datetime.strptime(param_date, "%Y%m%d").date()
+    names = list(df_matches)
+    configs = {name: SALES_REPORTS[name] for name in names}
+    unit_of = report_units(names)
+    units = {unit_of[name]: (configs[name]['match'],configs[name]['hierarchy']) for name in names}
+    matches = {configs[name]['match']: df_matches[name] for name in names}
+
+    rosters,sales,unit_failures = all_df_reduce(dfs,matches,units)
+    failures = {name: unit_failures[unit_of[name]] for name in names if unit_of[name] in unit_failures}
+    if not rosters:
+        return {},failures
+
+    windows = {}
+    levels = []
+    for name in names:
+        period_windows = PERIODS[configs[name]['period']]['windows']
+        windows.update({suffix: window for suffix,window,*_ in period_windows})
+        levels.append(period_windows[-1][0])
+    df_result = manager_sales_situ(sales,date_obj,sales_dates(date_obj,names),windows)
+
+    orgs = {unit: fill_missing(roster['manager_today'][['分行','组别']],0) for unit,roster in rosters.items()}
+    groups = generate_report(df_result,orgs,{unit: roster['manager_lm'] for unit,roster in rosters.items()},
+                             windows,list(dict.fromkeys(levels)),{unit: HIERARCHIES[units[unit][1]]['total'] for unit in rosters})
+
+    results = {}
+    for name in names:
+        if name in failures:
+            continue
+        unit = unit_of[name]
+        period = PERIODS[configs[name]['period']]
+        group_persons_result,df_rate_result = report_sheets(groups[unit],configs[name]['period'],configs[name]['layout'])
+        df_user = user_table(df_result,orgs[unit],configs[name]['period'])
+        results[name] = {workbook_name(name): {period['sheet']: df_rate_result,'用户中间表': df_user,'机构中间表': group_persons_result}}
+    return results,failures
+
+@timed('report')
+def main_batch(param_date,reports):
+    '''
+    一次生成多张开单情况统计表，源文件读取、快照对齐及聚合均只做一次
+
+    :param reports: {报表名: SalesReport}，使用其 abs_path（工作目录）及 df_match（分行全简称对应关系）
+    :return: {报表名: 失败的异常}，全部计算成功时为空字典；写出失败由工作簿写出池按报表名归集
+    '''
+    names = list(reports)
+    abs_path = reports[names[0]].abs_path
+    results,failures = build(param_date,load_data(param_date,names,abs_path),{name: reports[name].df_match for name in names})
+
+    output_dir = os.path.join(abs_path,OUTPUT_DIR)
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    pool = get_writer_pool()
+    owner = pool.owner
+    try:
+        for name,workbooks in results.items():
+            # 写出失败按报表名归集
+            pool.owner = name
+            period = PERIODS[SALES_REPORTS[name]['period']]
+            for workbook,sheets in workbooks.items():
+                print(f"正在生成：{workbook}{param_date}.xlsx...\n")
+                # 将中间结果及结果表写入excel
+                output_path = os.path.join(output_dir,f'{workbook}{param_date}.xlsx')
+                with WorkbookJob(output_path) as writer:
+                    writer.write(sheets[period['sheet']],period['sheet'])
+                    writer.write(sheets['用户中间表'],'用户中间表',index=False)
+                    writer.write(sheets['机构中间表'],'机构中间表',index=False)
+    finally:
+        pool.owner = owner
+    return failures
+
+
+class SalesReport:
+    '''
+    一张开单情况统计表（report_hierarchy.SALES_REPORTS中的一项），接口与其他报表脚本模块相同：
+    MATCH_FILE、snapshot_requests、build、main，以及由调用方设置的 abs_path、df_match
+    '''
+
+    # run_reports将同时生成的多张开单情况统计表交给main_batch一次生成
+    main_batch = staticmethod(main_batch)
+
+    def __init__(self,name):
+        self.name = name
+        self.MATCH_FILE = MATCH_FILES[SALES_REPORTS[name]['match']]
+        self.abs_path = None
+        self.df_match = None
+
+    def snapshot_requests(self,date_str):
+        return snapshot_requests(date_str,[self.name])
+
+    def output_files(self,param_date):
+        '''输出的工作簿路径（相对工作目录），供run_reports检查各报表的输出是否重名'''
+        return list(output_files(param_date,[self.name]).values())
+
+    def build(self,param_date,dfs,df_match):
+        '''由已读取的源文件计算各工作表，返回 {工作簿名: {工作表名: DataFrame}}'''
+        results,failures = build(param_date,dfs,{self.name: df_match})
+        if self.name in failures:
+            raise failures[self.name]
+        return results[self.name]
+
+    def main(self,param_date):
+        '''生成报表，使用 abs_path（工作目录）及 df_match（分行全简称对应关系）'''
+        failures = main_batch(param_date,{self.name: self})
+        if self.name in failures:
+            raise failures[self.name]
+
+_reports = {name: SalesReport(name) for name in SALES_REPORTS}
+
+def sales_report(name):
+    '''返回某张开单情况统计表，同一报表名在进程内为同一对象'''
+    return _reports[name]
+
+if __name__ == "__main__":
+
+    # 读取并校验执行参数，--profile 输出性能剖析结果，--trace-allocations 按阶段统计内存分配
+    parser = argparse.ArgumentParser(prog='generate_report.py', description='生成指定日期的理财经理开单情况统计表')
+    parser.add_argument('date', metavar='YYYYMMDD', help='报表日期')
+    parser.add_argument('reports', nargs='*', metavar='报表名',
+                        help=f"可选: {', '.join(SALES_REPORTS)}，可同时指定多个，默认为report")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    unknown = [name for name in args.reports if name not in SALES_REPORTS]
+    if unknown:
+        parser.error(f"未知的报表: {', '.join(unknown)}，可选: {', '.join(SALES_REPORTS)}")
+    param_date = args.date
+    abs_path = os.getcwd()
+
+    reports = {name: sales_report(name) for name in dict.fromkeys(args.reports or ['report'])}
+    params = {'param_date': param_date,'reports': list(reports)}
+    try:
+        # 读取分行全简称对应关系及组别分类
+        for report in reports.values():
+            report.abs_path = abs_path
+            report.df_match = get_repository().match(os.path.join(abs_path,report.MATCH_FILE))
+
+        with profiling(abs_path,'generate_report',params,args.profile,args.trace_allocations):
+            failures = main_batch(param_date,reports)
+            # 等待工作簿在写出进程中全部写完
+            wait_workbooks()
+        # 部分报表失败时失败原因同样记入运行报告
+        if failures:
+            params['failures'] = {name: f"{type(e).__name__}: {e}" for name,e in failures.items()}
+    except BaseException as e:
+        # 失败原因记入运行报告
+        params['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        # 写出运行报告并输出各阶段的耗时，运行失败时同样写出
+        finish_run(abs_path,'generate_report',params)
+
+    for name,e in failures.items():
+        traceback.print_exception(e)
+        print(f"报表{name}生成失败：{type(e).__name__}: {e}\n")
+    sys.exit(1 if failures else 0)
@@ -1,245 +1,144 @@
 import os
-import sys
 import pandas as pd
-from datetime import datetime, timedelta
+from snapshot_repository import get_repository
+from snapshot_schema import fill_missing
+from report_aggregation import aggregate
+from period_delta import PeriodDelta, last_workday, last_wednesday, last_month_end
+from snapshot_tensor import SnapshotTensor
+from leaderboard import leaderboard
+from ranking import rank_columns
+from report_dag import ReportDAG
+from workbook_pool import WorkbookJob, wait_workbooks
+from run_metrics import timed, stage, finish_run
+from run_profiler import parse_report_args, profiling
+from datetime import datetime
 import warnings
 # 忽略读取警告
 warnings.filterwarnings('ignore', category=UserWarning, message="Workbook contains no default style")
 
-def get_first_workday_of_month(date_obj):
-    """获取某个月的第一个工作日（周一至周五）"""
-    first_day = date_obj.replace(day=1)
-    # 处理首日为周末的情况
-    if first_day.isoweekday() == 6:   # 周六 -> 下周一（+2天）
-        return first_day + timedelta(days=2)
-    elif first_day.isoweekday() == 7: # 周日 -> 下周一（+1天）
-        return first_day + timedelta(days=1)
-    else:
-        return first_day
-
-def get_last_workday(date_obj):
-    """计算上一个工作日（周一返回上周五，周末返回周五，其他返回前一日）"""
-    if date_obj.isoweekday() == 1:  # 周一
-        return date_obj - timedelta(days=3)
-    elif date_obj.isoweekday() >= 6:  # 周六或周日
-        return date_obj - timedelta(days=(date_obj.isoweekday() - 5))
-    else:  # 周二到周五
-        return date_obj - timedelta(days=1)
-
-def get_last_wednesday(date_obj):
-    """计算上一个周三（当天为周三时取七天前）"""
-    current_weekday = date_obj.isoweekday()
-    # 当天是周三时 delta=7，否则按原逻辑计算
-    delta = 7 if current_weekday == 3 else (current_weekday - 3) % 7
-    return date_obj - timedelta(days=delta)
-
-def last_day_of_last_month(date_obj):
-    """计算传入日期的上个月的最后一天"""
-    first_day_of_current_month = date_obj.replace(day=1)
-    return first_day_of_current_month - timedelta(days=1)
-
-def find_file_and_load(dict,folder_path,filename_str):
-    '''
-    根据参数字典到对应文件夹获取带有关键词的文件，读取为df并存储在字典中
-    '''
-    result_dict = {}
-    for key, d in dict.items():
-        filename = filename_str + f"{d.strftime('%Y%m%d')}"
-        filepath = os.path.join(folder_path, filename)
-        found = False
-        for ext in ['.csv', '.xlsx', '.xls']:
-            full_path = filepath + ext
-            if os.path.exists(full_path):
-                try:
-                    if ext == '.csv':
-                        df = pd.read_csv(full_path)
-                    else:
-                        df = pd.read_excel(full_path,engine = 'openpyxl',header=2)
-                    result_dict[key] = df
-                    found = True
-                    break
-                except Exception as e:
-                    raise ValueError(f"读取文件 {full_path} 失败: {e}")
-        if not found:
-            raise FileNotFoundError(f"未找到文件: {filename}[.csv|.xlsx]")
-    return result_dict
-
-def load_data(date_str):
-    """
-    根据传入的日期读取相关文件并返回字典
-    
-    :param folder_path: 文件夹路径
-    :param date_str: 8位日期字符串，格式为YYYYMMDD
-    :return: 包含DataFrame的字典
-    """
-    print("开始读取加工目标表所需的源文件...\n")
 
-    date_obj = datetime.strptime(date_str, "%Y%m%d").date()
-    folder_path = os.path.join(abs_path,'参考文件')
+# 报表计算图：源文件读取、花名册加工、增量计算、分组汇总及输出的工作表均为其中的阶段，
+# 生成时只计算已开启工作簿所需的阶段
+report = ReportDAG()
 
-    if get_last_workday(date_obj).month != date_obj.month:
-        cross_month = 2
-    elif get_last_wednesday(date_obj).month != date_obj.month:
-        cross_month = 1
-    else:
-        cross_month = 0
+# 计算图的输入参数
+PARAMS = ('param_date', 'abs_path', 'df_match')
 
-    # 读取理财经理详细信息
+def manager_request(date_obj):
+    """理财经理详细信息的读取清单"""
     manager_dates = {
         'manager_today': date_obj,
-        'manager_lm': last_day_of_last_month(date_obj)
+        'manager_lm': last_month_end(date_obj)
     }
-    
-    manager_dict = find_file_and_load(manager_dates,folder_path,'理财经理详细信息')
-
-    # 读取投资理财销售量统计表
-    # sales_dates = {
-    #     'sales_today': date_obj,
-    #     'sales_lm': last_day_of_last_month(date_obj),
-    #     'sales_ld': get_last_workday(date_obj),
-    #     'sales_lw': get_last_wednesday(date_obj)
-    # }
-    #
-    # sales_dict = find_file_and_load(sales_dates,folder_path,'投资理财销售量统计表')
-
-    # 读取投资理财中收统计表
+    return ('理财经理详细信息', manager_dates)
+
+def sales_request(date_obj):
+    """投资理财销售量统计表的读取清单"""
+    sales_dates = {
+        'sales_today': date_obj,
+        'sales_lm': last_month_end(date_obj),
+        'sales_ld': last_workday(date_obj),
+        'sales_lw': last_wednesday(date_obj)
+    }
+    return ('投资理财销售量统计表', sales_dates)
+
+def interbusi_request(date_obj):
+    """投资理财中收统计表的读取清单"""
     interbusi_dates = {
         'interbusi_today': date_obj,
-        'interbusi_lm': last_day_of_last_month(date_obj),
-        'interbusi_lw': get_last_wednesday(date_obj)
+        'interbusi_lm': last_month_end(date_obj),
+        'interbusi_lw': last_wednesday(date_obj)
     }
-    
-    interbusi_dict = find_file_and_load(interbusi_dates,folder_path,'投资理财中收统计表')
+    return ('投资理财中收统计表', interbusi_dates)
 
-    print("加工目标表所需的源文件已读取完毕。\n")
-    # 合并字典
-    return {**manager_dict,**interbusi_dict},cross_month
-    # return {**manager_dict,**sales_dict,**interbusi_dict},cross_month
+def snapshot_requests(date_str):
+    """
+    根据传入的日期返回已开启的工作簿所需的源文件清单，只计算日期不读取文件
+
+    :param date_str: 8位日期字符串，格式为YYYYMMDD
+    :return: [(文件关键词, {键: 日期}, 扩展名列表), ...]
+    """
+    date_obj = datetime.strptime(date_str, "%Y%m%d").date()
+    return [request(date_obj) for request in report.sources(enabled_stages(), PARAMS).values()]
+
+@timed('load')
+def load_snapshots(request,date_obj,abs_path):
+    """读取一类源文件，已由main一次性读入仓库的直接复用"""
+    folder_path = os.path.join(abs_path,'参考文件')
+    return get_repository().load([request(date_obj)], folder_path)
 
 def get_prov_match(file_path):
     '''读取分行全简称对应关系及组别分类'''
-    return pd.read_excel(os.path.join(file_path))
+    return get_repository().match(file_path)
 
 # 处理柜员信息表并与对应关系关联
 def process_manager(df_manager,df_match):
-    df_manager_match = pd.merge(df_manager,df_match,on = '总行/一级分行名称',how = 'left')
     column_need = ["序号","柜员号","姓名","总行/一级分行名称","分行","组别"]
-    return df_manager_match[column_need]
-
-# 处理销售明细情况与分行情况关联获得分行及组别
-def process_sales(df_sales,df_manager_match):
-    df_sales_processed = pd.merge(df_manager_match,df_sales,how = 'left',left_on = '柜员号',right_on = '人员工号',suffixes=('_manager', '_sales'))
-    df_sales_processed['理财/资管'] = df_sales_processed['理财']+df_sales_processed['资产管理计划']
-    df_sales_processed['贵金属'] = df_sales_processed['实物贵金属'] + df_sales_processed['黄金积存']
-    column_need = ["柜员号","姓名","总行/一级分行名称","分行","组别","理财/资管","理财","保险","基金","资产管理计划","贵金属","实物贵金属","黄金积存","合计"]
-    return df_sales_processed[column_need]
-
-# 处理中收统计情况与分行情况关联获得分行及组别
-def process_interbusi(df_interbusi,df_manager_match):
-    df_interbusi_processed = pd.merge(df_manager_match,df_interbusi,how = 'left',left_on = '柜员号',right_on = '人员工号',suffixes=('_manager', '_interbusi'))
-    df_interbusi_processed['理财/资管'] = df_interbusi_processed['理财']+df_interbusi_processed['资产管理计划']
-    df_interbusi_processed['贵金属'] = df_interbusi_processed['实物贵金属'] + df_interbusi_processed['黄金积存']
-    df_interbusi_processed['4类业务合计'] = df_interbusi_processed['理财/资管'] + df_interbusi_processed['保险'] + df_interbusi_processed['基金'] + df_interbusi_processed['贵金属']
-    column_need = ["柜员号","姓名","总行/一级分行名称","分行","组别","4类业务合计","理财/资管","理财","保险","基金","资产管理计划","贵金属","实物贵金属","黄金积存"]
-    return df_interbusi_processed[column_need]
-
-# 对df进行预处理
-def all_df_reduce(dfs,df_match):
-
-    dfs_processed = {}
-
-    for i in dfs.keys():
-        if 'manager' in i :
-            dfs_processed[i] = process_manager(dfs[i],df_match).fillna({ '组别': '无组别'})
-        else: continue
-    for i in dfs.keys():
-        if 'sales' in i:
-            dfs_processed[i] = process_sales(dfs[i],dfs_processed['manager_today']).fillna(0)
-        else: continue
-    for i in dfs.keys():
-        if 'interbusi' in i:
-            dfs_processed[i] = process_interbusi(dfs[i],dfs_processed['manager_today']).fillna(0)
-        else: continue
-
-    return dfs_processed
+    # 同一花名册与对应关系表在进程内只关联一次
+    return get_repository().roster(df_manager,df_match,'总行/一级分行名称',column_need)
+
+# 将各日销售量快照按人员工号对齐到花名册获得分行及组别，存为 人员×资产×快照 的数组
+def process_sales(sales_snapshots,df_manager_match):
+    roster_need = ["柜员号","姓名","总行/一级分行名称","分行","组别"]
+    asset_need = ["理财/资管","理财","保险","基金","资产管理计划","贵金属","实物贵金属","黄金积存","合计"]
+    derived = {'理财/资管': ['理财','资产管理计划'], '贵金属': ['实物贵金属','黄金积存']}
+    return SnapshotTensor.from_snapshots(df_manager_match[roster_need],sales_snapshots,asset_need,derived=derived,fill=0)
+
+# 将各日中收快照按人员工号对齐到花名册获得分行及组别，存为 人员×资产×快照 的数组
+def process_interbusi(interbusi_snapshots,df_manager_match):
+    roster_need = ["柜员号","姓名","总行/一级分行名称","分行","组别"]
+    asset_need = ["4类业务合计","理财/资管","理财","保险","基金","资产管理计划","贵金属","实物贵金属","黄金积存"]
+    derived = {'理财/资管': ['理财','资产管理计划'], '贵金属': ['实物贵金属','黄金积存'], '4类业务合计': ['理财/资管','保险','基金','贵金属']}
+    return SnapshotTensor.from_snapshots(df_manager_match[roster_need],interbusi_snapshots,asset_need,derived=derived,fill=0)
 
 # 加工理财经理开单情况
-def manager_sales_situ(sales_today,sales_yesterday,sales_last_week,sales_last_month,cross_month):
-
-    merge_df1 = pd.merge(sales_today,sales_yesterday,on = '柜员号',how = 'left',suffixes=('', '_yd'))
-    merge_df2 = pd.merge(merge_df1,sales_last_week,on = '柜员号',how = 'left',suffixes=('', '_lw'))
-
-    merge_result = merge_df2[["柜员号","姓名","分行","组别"]].copy()
+@timed('deltas')
+def manager_sales_situ(sales,date_obj):
+
+    # 各日快照均为当月累计值，跨月时加回上月底数据由增量引擎按窗口处理
+    period = PeriodDelta(date_obj,sales,{'': (date_obj,'today'),
+                                         '_yd': (last_workday(date_obj),'ld'),
+                                         '_lw': (last_wednesday(date_obj),'lw'),
+                                         '_lm': (last_month_end(date_obj),'lm')})
+    windows = {'本日': 'day', '本周累积': 'week'}
     asset_columns = ['理财/资管', '保险', '基金', '贵金属']
 
-    if cross_month == 0:
-
-        for col in asset_columns:
-            merge_result[f"{col}_本日"] = merge_df2[col]-merge_df2[f"{col}_yd"]
-            merge_result[f"{col}_本周累积"] = merge_df2[col]-merge_df2[f"{col}_lw"]
-
-        merge_result['本日开单业务数'] = (merge_result[['理财/资管_本日','保险_本日','基金_本日','贵金属_本日']] > 0).sum(axis=1)
-        merge_result['本周累积开单业务数'] = (merge_result[['理财/资管_本周累积','保险_本周累积','基金_本周累积','贵金属_本周累积']] > 0).sum(axis=1)
-        return merge_df2,merge_result
-
-    elif cross_month == 1:
-        merge_df3 = pd.merge(merge_df2,sales_last_month,on = '柜员号',how = 'left',suffixes=('', '_lm'))
-
-        for col in asset_columns:
-            merge_result[f"{col}_本日"] = merge_df3[col]-merge_df3[f"{col}_yd"]
-            merge_result[f"{col}_本周累积"] = merge_df3[col]-merge_df3[f"{col}_lw"] + merge_df3[f"{col}_lm"]
-
-        merge_result['本日开单业务数'] = (merge_result[['理财/资管_本日','保险_本日','基金_本日','贵金属_本日']] > 0).sum(axis=1)
-        merge_result['本周累积开单业务数'] = (merge_result[['理财/资管_本周累积','保险_本周累积','基金_本周累积','贵金属_本周累积']] > 0).sum(axis=1)
-
-        return merge_df3,merge_result
-
-    elif cross_month == 2:
-        merge_df3 = pd.merge(merge_df2,sales_last_month,on = '柜员号',how = 'left',suffixes=('', '_lm'))
-
-        for col in asset_columns:
-            merge_result[f"{col}_本日"] = merge_df3[col]-merge_df3[f"{col}_yd"] + merge_df3[f"{col}_lm"]
-            merge_result[f"{col}_本周累积"] = merge_df3[col]-merge_df3[f"{col}_lw"] + merge_df3[f"{col}_lm"]
+    merge_df = period.detail(windows)
+    merge_result = pd.concat([merge_df[["柜员号","姓名","分行","组别"]],period.deltas(windows,asset_columns)],axis=1)
 
-        merge_result['本日开单业务数'] = (merge_result[['理财/资管_本日','保险_本日','基金_本日','贵金属_本日']] > 0).sum(axis=1)
-        merge_result['本周累积开单业务数'] = (merge_result[['理财/资管_本周累积','保险_本周累积','基金_本周累积','贵金属_本周累积']] > 0).sum(axis=1)
-
-        return merge_df3,merge_result
+    merge_result['本日开单业务数'] = (merge_result[['理财/资管_本日','保险_本日','基金_本日','贵金属_本日']] > 0).sum(axis=1)
+    merge_result['本周累积开单业务数'] = (merge_result[['理财/资管_本周累积','保险_本周累积','基金_本周累积','贵金属_本周累积']] > 0).sum(axis=1)
+    return merge_df,merge_result
     
-# 加工理财中收情况
-def manager_interbusi_situ(interbusi_today,interbusi_last_week,interbusi_last_month,cross_month):
 
-    merge_df = pd.merge(interbusi_today,interbusi_last_week,on = '柜员号',how = 'left',suffixes=('', '_lw'))
-
-    merge_result = merge_df[["柜员号","姓名","分行"]].copy()
+# 加工理财中收情况
+@timed('deltas')
+def manager_interbusi_situ(interbusi,date_obj):
+
+    # 本周中收由增量引擎计算，上周三在上月时加回上月底数据
+    period = PeriodDelta(date_obj,interbusi,{'': (date_obj,'today'),
+                                             '_lw': (last_wednesday(date_obj),'lw'),
+                                             '_lm': (last_month_end(date_obj),'lm')})
+    windows = {'本周': 'week'}
     # 需要排名的资产列列表
     asset_columns = ['4类业务合计', '理财/资管', '理财', '保险', '基金',
                     '资产管理计划', '贵金属', '实物贵金属', '黄金积存']
 
-    if cross_month == 0:
-        for col in asset_columns:
-            merge_result[f"{col}_本周"] = merge_df[col]-merge_df[f"{col}_lw"]
-        sort_fund = merge_result.sort_values(by='4类业务合计_本周', ascending=False)
-        sort_fund['4类业务合计_本周'] = round(sort_fund['4类业务合计_本周'] / 10000)
-        sort_fund['4类业务合计_本周'] = sort_fund.rename(columns={'4类业务合计_本周': '4类业务合计（万元）'}, inplace=True)
-        sort_fund = sort_fund[['分行', '姓名', '4类业务合计（万元）']]
-    elif cross_month == 2:
-        merge_df = pd.merge(merge_df,interbusi_last_month,on = '柜员号',how = 'left',suffixes=('', '_lm'))
-        for col in asset_columns:
-            merge_result[f"{col}_本周"] = merge_df[col]-merge_df[f"{col}_lw"] + merge_df[f"{col}_lm"]
-        sort_fund = merge_result.sort_values(by='4类业务合计_本周', ascending=False)
-        sort_fund['4类业务合计_本周'] = round(sort_fund['4类业务合计_本周'] / 10000)
-        sort_fund['4类业务合计_本周'] = sort_fund.rename(columns={'4类业务合计_本周': '4类业务合计（万元）'}, inplace=True)
-        sort_fund = sort_fund[['分行', '姓名', '4类业务合计（万元）']]
-    new_columns_order = ["柜员号","姓名","分行"]
-    # 批量生成排名列
-    for col in asset_columns:
-        rank_col = f'{col}_排名'
-        merge_result[rank_col] = merge_result[f"{col}_本周"].rank(ascending=False, method='min').astype(int)
-        new_columns_order.extend([f"{col}_本周",rank_col])
-    
-    return merge_df,merge_result[new_columns_order],sort_fund
+    merge_df = period.detail(windows)
+    merge_result = pd.concat([merge_df[["柜员号","姓名","分行"]],period.deltas(windows,asset_columns)],axis=1)
+
+    # 中间业务收入TOP榜单：只取出入选人员再换算为万元，数值相同按花名册顺序
+    sort_fund = leaderboard(merge_result,'4类业务合计_本周',['分行','姓名','4类业务合计_本周'])
+    sort_fund['4类业务合计_本周'] = round(sort_fund['4类业务合计_本周'] / 10000)
+    sort_fund = sort_fund.rename(columns={'4类业务合计_本周': '4类业务合计（万元）'})
+    # 全部资产列的全国排名一次排序得出，名次列紧跟在对应的本周中收之后
+    ranks = rank_columns(merge_result,[f"{col}_本周" for col in asset_columns],method='min').astype(int)
+    ranks.columns = [f'{col}_排名' for col in asset_columns]
+    new_columns_order = ["柜员号","姓名","分行",*[c for col in asset_columns for c in (f"{col}_本周",f'{col}_排名')]]
 
+    return merge_df,pd.concat([merge_result,ranks],axis=1)[new_columns_order],sort_fund
+
+@timed('aggregation')
 def generate_sales_df(df,last_month_df):
 
     print("开始生成结果报表...\n")
@@ -251,14 +150,14 @@ def generate_sales_df(df,last_month_df):
     # 定义资产类别（与图片列顺序一致）
     assets = ['理财/资管','保险', '基金','贵金属']
     
-    agg_dict={"理财经理总人数":pd.NamedAgg(column='柜员号',aggfunc='nunique'),
-              **{f'{asset}_本日开单人数':pd.NamedAgg(column=f'{asset}_本日',aggfunc=lambda x: (x > 0).sum()) for asset in assets},
-              '本日未开单人数(0产能)':pd.NamedAgg(column='本日开单业务数',aggfunc=lambda x: (x <= 0).sum()),
-              **{f'{asset}_本周累积开单人数': pd.NamedAgg(column=f'{asset}_本周累积',aggfunc=lambda x: (x > 0).sum()) for asset in assets},
-              '本周累积未开单人数(0产能)':pd.NamedAgg(column='本周累积开单业务数',aggfunc=lambda x: (x <= 0).sum())
-              }
+    agg_specs=[("理财经理总人数",'柜员号','nunique'),
+               *[(f'{asset}_本日开单人数',f'{asset}_本日','>0') for asset in assets],
+               ('本日未开单人数(0产能)','本日开单业务数','<=0'),
+               *[(f'{asset}_本周累积开单人数',f'{asset}_本周累积','>0') for asset in assets],
+               ('本周累积未开单人数(0产能)','本周累积开单业务数','<=0')
+              ]
     # 按分行分组聚合计算开单人数
-    group_persons_result = filtered.groupby(['组别','分行'], as_index=False).agg(**agg_dict)
+    group_persons_result = aggregate(filtered,['组别','分行'],agg_specs)
 
     # 分组统计不同业务数的人数
     asset_num_result = (
@@ -308,6 +207,7 @@ def generate_sales_df(df,last_month_df):
 
     return group_persons_result,df_rate_result
 
+@timed('aggregation')
 def generate_interbusi_df(df):
     print("开始生成结果报表...\n")
 
@@ -316,13 +216,13 @@ def generate_interbusi_df(df):
     assets = ['理财/资管','保险','基金','贵金属']
 
     # 按分行分组聚合计算各项报表信息
-    agg_dict={"总人数":pd.NamedAgg(column='柜员号',aggfunc='nunique'),
-              "TOP人数":pd.NamedAgg(column='4类业务合计_排名',aggfunc=lambda x: (x <= 1000).sum()),
-              "4类业务合计":pd.NamedAgg(column='4类业务合计_本周',aggfunc='sum'),
-			  **{f'{asset}业务合计':pd.NamedAgg(column=f'{asset}_本周',aggfunc=lambda x: x.sum()) for asset in assets},
-              }
+    agg_specs=[("总人数",'柜员号','nunique'),
+               ("TOP人数",'4类业务合计_排名','<=1000'),
+               ("4类业务合计",'4类业务合计_本周','sum'),
+               *[(f'{asset}业务合计',f'{asset}_本周','sum') for asset in assets]
+              ]
 
-    group_interbusi_result = filtered.groupby('分行', as_index=False).agg(**agg_dict)
+    group_interbusi_result = aggregate(filtered,'分行',agg_specs)
 
     # 创建汇总字典，计算全国开单人数
     sum_data = { '分行': '总计'}
@@ -356,79 +256,161 @@ def generate_interbusi_df(df):
 
     return group_interbusi_result[columns_order].rename(columns={'分行':'一级名称'})
 
-def to_excel_change_index(df,writer,sheetname):
+def number_rows(df):
+    """将索引替换为从1开始的序号列，即写入excel时的样式"""
     df_export = df.reset_index(drop=True)  # 先重置为默认索引
     df_export.index += 1                   # 索引从1开始
     df_export.index.name = '序号'          # 设置索引列名
+    return df_export
+
+@report.stage('date_obj','param_date')
+def parse_date(param_date):
+    return datetime.strptime(param_date, "%Y%m%d").date()
+
+@report.stage('managers','date_obj','abs_path',source=manager_request)
+def load_managers(date_obj,abs_path):
+    return load_snapshots(manager_request,date_obj,abs_path)
+
+@report.stage('sales_snapshots','date_obj','abs_path',source=sales_request)
+def load_sales(date_obj,abs_path):
+    return load_snapshots(sales_request,date_obj,abs_path)
+
+@report.stage('interbusi_snapshots','date_obj','abs_path',source=interbusi_request)
+def load_interbusi(date_obj,abs_path):
+    return load_snapshots(interbusi_request,date_obj,abs_path)
+
+# 处理当日及上月底花名册
+@report.stage('rosters','managers','df_match')
+@timed('reduce')
+def process_rosters(managers,df_match):
+    return {i: fill_missing(process_manager(df,df_match),{ '组别': '无组别'}) for i, df in managers.items()}
+
+# 各日快照按 today、ld、lw、lm 标识，一次对齐到当日花名册
+@report.stage('sales','sales_snapshots','rosters')
+@timed('reduce')
+def align_sales(sales_snapshots,rosters):
+    return process_sales({i.split('_',1)[1]: df for i, df in sales_snapshots.items()},rosters['manager_today'])
+
+@report.stage('interbusi','interbusi_snapshots','rosters')
+@timed('reduce')
+def align_interbusi(interbusi_snapshots,rosters):
+    return process_interbusi({i.split('_',1)[1]: df for i, df in interbusi_snapshots.items()},rosters['manager_today'])
+
+report.stage('sales_situ','sales','date_obj')(manager_sales_situ)
+report.stage('interbusi_situ','interbusi','date_obj')(manager_interbusi_situ)
+
+@report.stage('sales_report','sales_situ','rosters')
+def sales_report(sales_situ,rosters):
+    return generate_sales_df(sales_situ[1],rosters['manager_lm'])
+
+@report.stage('interbusi_report','interbusi_situ')
+def interbusi_report(interbusi_situ):
+    return generate_interbusi_df(interbusi_situ[1])
+
+# 输出的工作簿：是否生成、输出文件夹，以及各工作表取自的阶段及其结果中的位置（None为整个结果）；
+# numbered为True时写入从1开始的序号列，否则不写索引
+WORKBOOKS = {
+    '理财经理开单情况统计表': {
+        'enabled': False,
+        'folder': '理财经理开单情况统计表',
+        'numbered': True,
+        'sheets': {'结果通报表': ('sales_report', 1), '多日明细情况': ('sales_situ', 0),
+                   '用户中间表': ('sales_situ', 1), '机构中间表': ('sales_report', 0)},
+    },
+    '中间业务收入TOP榜单': {
+        'enabled': True,
+        'folder': '业务TOP周榜单',
+        'numbered': False,
+        'sheets': {'中间业务收入TOP榜单': ('interbusi_situ', 2)},
+    },
+    '投资理财中收统计表': {
+        'enabled': True,
+        'folder': '投资理财中收统计表',
+        'numbered': True,
+        'sheets': {'结果通报表': ('interbusi_report', None), '多日明细情况': ('interbusi_situ', 0),
+                   '用户中间表': ('interbusi_situ', 1)},
+    },
+}
+
+def enabled_stages():
+    """已开启的工作簿用到的阶段"""
+    stages = [stage for workbook in WORKBOOKS.values() if workbook['enabled']
+              for stage, _ in workbook['sheets'].values()]
+    return list(dict.fromkeys(stages))
+
+def workbook_sheets(workbook,results):
+    """从计算图的结果中取出一个工作簿的各工作表：{工作表名: DataFrame}，numbered为True时已加上序号列"""
+    sheets = {}
+    for sheetname, (stage, pos) in workbook['sheets'].items():
+        df = results[stage] if pos is None else results[stage][pos]
+        sheets[sheetname] = number_rows(df) if workbook['numbered'] else df
+    return sheets
+
+def build(param_date,dfs,df_match):
+    '''
+    由已读取的源文件计算已开启工作簿的各工作表，不读写文件，也不使用模块变量；
+    已读取的源文件按读取阶段分组直接作为计算图的输入，读取阶段不再执行
 
-    # 导出到 Excel
-    df_export.to_excel(writer, sheet_name=sheetname)
-
-def generate_sales_report(param_date):
-
-    print(f"开始生成{param_date}日期的理财经理开单情况统计表...\n")
-
-    dfs,cross_month = load_data(param_date)
-    dfs_processed = all_df_reduce(dfs,df_match)
-
-    sales_mid,df_sales_result = manager_sales_situ(dfs_processed['sales_today'],dfs_processed['sales_ld'],dfs_processed['sales_lw'],dfs_processed['sales_lm'],cross_month)
-    group_persons_result,df_rate_result = generate_sales_df(df_sales_result,dfs_processed['manager_lm'])
-
-    sales_output_path = os.path.join(abs_path,'理财经理开单情况统计表',f'理财经理开单情况统计表{param_date}.xlsx') 
-
-    print(f"正在生成：理财经理开单情况统计表{param_date}.xlsx...\n")
-
-    with pd.ExcelWriter(sales_output_path, engine='openpyxl') as writer:
-        to_excel_change_index(df_rate_result,writer,'结果通报表') 
-        to_excel_change_index(sales_mid,writer,'多日明细情况') 
-        to_excel_change_index(df_sales_result,writer,'用户中间表') 
-        to_excel_change_index(group_persons_result,writer,'机构中间表') 
-
-    print(f"理财经理开单情况统计表已保存至：{sales_output_path}\n")
-
-def generate_interbusi_report(param_date):
-
-    print(f"开始生成{param_date}日期的投资理财中收统计表...\n")
-
-    dfs,cross_month = load_data(param_date)
-    dfs_processed = all_df_reduce(dfs,df_match)
-
-    interbusi_mid,df_interbusi_result,business_sort = manager_interbusi_situ(dfs_processed['interbusi_today'],dfs_processed['interbusi_lw'],dfs_processed['interbusi_lm'],cross_month)
-    group_interbusi_result = generate_interbusi_df(df_interbusi_result)
-
-    if not os.path.exists('./业务TOP周榜单'):
-        os.makedirs('./业务TOP周榜单')
-    # 写入文件业务TOP周榜单
-    print(f"正在生成：中间业务收入TOP榜单{param_date}.xlsx...\n")
-    output_path = os.path.join(abs_path, '业务TOP周榜单', f'中间业务收入TOP榜单{param_date}.xlsx')
-    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-        business_sort.to_excel(writer, sheet_name='中间业务收入TOP榜单', index=False)
-    print(f"投资理财中收统计表已保存至：{output_path}\n")
-
-    if not os.path.exists('./投资理财中收统计表'):
-        os.makedirs('./投资理财中收统计表')
-    interbusi_output_path = os.path.join(abs_path,'投资理财中收统计表',f'投资理财中收统计表{param_date}.xlsx') 
-
-    print(f"正在生成：投资理财中收统计表{param_date}.xlsx...\n")
-
-    with pd.ExcelWriter(interbusi_output_path, engine='openpyxl') as writer:
-        to_excel_change_index(group_interbusi_result,writer,'结果通报表') 
-        to_excel_change_index(interbusi_mid,writer,'多日明细情况') 
-        to_excel_change_index(df_interbusi_result,writer,'用户中间表') 
+    :param dfs: {键: DataFrame}，键见 snapshot_requests
+    :param df_match: 分行全简称对应关系及组别分类
+    :return: {工作簿名: {工作表名: DataFrame}}
+    '''
+    date_obj = datetime.strptime(param_date, "%Y%m%d").date()
+    params = {'param_date': param_date, 'df_match': df_match}
+    for name, request in report.sources(enabled_stages(), PARAMS).items():
+        params[name] = {key: dfs[key] for key in request(date_obj)[1]}
+    results = report.compute(enabled_stages(), params)
+    return {name: workbook_sheets(workbook,results) for name, workbook in WORKBOOKS.items() if workbook['enabled']}
+
+def output_files(param_date):
+    '''已开启的各工作簿的输出路径（相对工作目录），供run_reports检查各报表的输出是否重名'''
+    return [os.path.join(workbook['folder'],f'{name}{param_date}.xlsx') for name, workbook in WORKBOOKS.items() if workbook['enabled']]
+
+def write_workbook(name,workbook,sheets,param_date):
+    """将一个工作簿的各工作表写入excel"""
+    folder = os.path.join(abs_path,workbook['folder'])
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    print(f"正在生成：{name}{param_date}.xlsx...\n")
+    output_path = os.path.join(folder,f'{name}{param_date}.xlsx')
+    with WorkbookJob(output_path) as writer:
+        for sheetname, df in sheets.items():
+            writer.write(df,sheetname,index=workbook['numbered'])
+
+# 分行全简称对应关系及组别分类文件
+MATCH_FILE = '分行全简称对应及组别分类.xlsx'
+
+@timed('report')
+def main(param_date):
+    '''生成已开启的工作簿，使用模块变量 abs_path（工作目录）及 df_match（分行全简称对应关系）'''
+    print("开始读取加工目标表所需的源文件...\n")
+    # 所有源文件一次性分发到进程池并行解析，各读取阶段直接取用仓库中的结果
+    with stage('load','preload'):
+        get_repository().load(snapshot_requests(param_date), os.path.join(abs_path,'参考文件'))
+    print("加工目标表所需的源文件已读取完毕。\n")
 
-    print(f"投资理财中收统计表已保存至：{interbusi_output_path}\n")
+    results = report.compute(enabled_stages(), {'param_date': param_date, 'abs_path': abs_path, 'df_match': df_match})
+    for name, workbook in WORKBOOKS.items():
+        if workbook['enabled']:
+            write_workbook(name,workbook,workbook_sheets(workbook,results),param_date)
 
 if __name__ == "__main__":
 
-    # 检查是否有足够的参数
-    if len(sys.argv) != 2:
-        print("用法: python generate_report.py <YYYYMMDD>")
-        sys.exit(1)  # 如果没有参数，退出程序
-
-    param_date = sys.argv[1]
+    # 读取并校验执行参数，--profile 输出性能剖析结果，--trace-allocations 按阶段统计内存分配
+    args = parse_report_args('generate_report_business.py')
+    param_date = args.date
     abs_path = os.getcwd()
-    df_match = get_prov_match(os.path.join(abs_path,'分行全简称对应及组别分类.xlsx'))
-
-    # generate_sales_report(param_date)
-    generate_interbusi_report(param_date)
-
+    params = {'param_date': param_date}
+    try:
+        df_match = get_prov_match(os.path.join(abs_path,MATCH_FILE))
+        with profiling(abs_path,'generate_report_business',params,args.profile,args.trace_allocations):
+            main(param_date)
+            # 等待工作簿在写出进程中全部写完
+            wait_workbooks()
+    except BaseException as e:
+        # 失败原因记入运行报告
+        params['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        # 写出运行报告并输出各阶段的耗时，运行失败时同样写出
+        finish_run(abs_path,'generate_report_business',params)
@@ -0,0 +1,28 @@
+import numpy as np
+
+from run_metrics import timed
+
+
+def top_positions(values):
+    '''
+    按数值降序排列的行位置，空值排在最后，数值相同时行位置在前者优先（结果确定）
+
+    :param values: 一维数值数组
+    '''
+    values = np.asarray(values, dtype='float64')
+    values = np.where(np.isnan(values), -np.inf, values)
+    return np.argsort(-values, kind='stable')
+
+
+@timed('ranking')
+def leaderboard(df, metric, columns):
+    '''
+    按指标生成TOP榜单，只取出输出列，不复制整张表
+
+    :param df: 候选人员
+    :param metric: 排序指标列
+    :param columns: 输出列
+    :return: 按指标降序排列的DataFrame，保留df的原索引
+    '''
+    positions = top_positions(df[metric].to_numpy(dtype='float64', na_value=np.nan))
+    return df.iloc[positions, df.columns.get_indexer(columns)]
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from snapshot_cache import cache_key, load_with_cache
+from snapshot_schema import apply_schema
+
+
+def build_dimension(df_manager, df_match, on):
+    '''
+    生成机构维表：花名册每位理财经理对应的机构及组别，与 pd.merge(df_manager, df_match, on=on, how='left') 的结果相同。
+    按关联键的位置直接取出对应关系表的各列，机构及组别存为分类（整数编码+类别），不再按字符串关联
+
+    :param df_manager: 理财经理详细信息
+    :param df_match: 分行全简称对应及组别分类；同一文件可含多级机构的对应关系，关联键为空的行属于其他层级，不参与关联
+    :param on: 关联键，如 "总行/一级分行名称"
+    :return: 与花名册逐行对应的DataFrame，列为 柜员号、关联键及对应关系表中花名册没有的其余列
+    '''
+    if on not in df_match.columns:
+        raise KeyError(on)
+    df_match = df_match[df_match[on].notna()]
+    if df_match.empty:
+        raise ValueError(f"分行全简称对应关系中没有{on}不为空的行，无法生成机构维表")
+    index = pd.Index(df_match[on])
+    if not index.is_unique:
+        raise ValueError(f"分行全简称对应关系中{on}不唯一，无法生成机构维表")
+    keys = np.asarray(df_manager[on], dtype=object)
+    positions = index.get_indexer(keys)
+    positions[pd.isna(keys)] = -1
+
+    data = {'柜员号': df_manager['柜员号'].to_numpy(), on: df_manager[on].to_numpy()}
+    for col in df_match.columns:
+        # 其他层级的关联键（如 二级分行名称）以花名册中的为准
+        if col == on or col in df_manager.columns:
+            continue
+        values = df_match[col].to_numpy(dtype=object)[positions]
+        values[positions < 0] = np.nan
+        data[col] = values
+    return apply_schema(pd.DataFrame(data))
+
+
+def load_dimension(df_manager, df_match, on, manager_path=None, match_path=None):
+    '''
+    读取机构维表：花名册及对应关系表的源文件均已知时持久化到快照缓存，
+    两个文件均未变化时直接读取，任一文件被替换后重新生成
+
+    :param manager_path: 花名册源文件路径，为None时不持久化
+    :param match_path: 对应关系表源文件路径，为None时不持久化
+    '''
+    def build(_):
+        return build_dimension(df_manager, df_match, on)
+
+    if manager_path is None or match_path is None:
+        return build(None)
+    # 对应关系表的缓存键只计入缓存键而不计入文件名，对应关系表被替换后旧维表缓存随之清理
+    dimension = load_with_cache(manager_path, reader=build, extra=f"org_dimension|{on}", stamp=cache_key(match_path))
+    # 缓存与当前花名册不一致（如读取方式不同）时重新生成
+    staff = df_manager['柜员号'].reset_index(drop=True)
+    if len(dimension) != len(staff) or not dimension['柜员号'].equals(staff):
+        return build(None)
+    return dimension
@@ -0,0 +1,155 @@
+from datetime import date, timedelta
+
+import pandas as pd
+
+
+def last_workday(d):
+    '''上一个工作日（周一返回上周五，周末返回周五，其他返回前一日）'''
+    if d.isoweekday() == 1:
+        return d - timedelta(days=3)
+    if d.isoweekday() >= 6:
+        return d - timedelta(days=d.isoweekday() - 5)
+    return d - timedelta(days=1)
+
+
+def last_wednesday(d):
+    '''上一个周三（当天为周三时取七天前）'''
+    delta = 7 if d.isoweekday() == 3 else (d.isoweekday() - 3) % 7
+    return d - timedelta(days=delta)
+
+
+def month_end(d):
+    '''日期所在月的最后一天'''
+    next_month = (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def last_month_end(d):
+    '''上个月的最后一天'''
+    return d.replace(day=1) - timedelta(days=1)
+
+
+def last_quarter_end(d):
+    '''上个季度的最后一天'''
+    return date(d.year, (d.month - 1) // 3 * 3 + 1, 1) - timedelta(days=1)
+
+
+def last_year_end(d):
+    '''上一年的最后一天'''
+    return date(d.year - 1, 12, 31)
+
+
+# 窗口名称及其起点（不含起点当天的变动）：本日、本周（自上周三起）、本月、本季、本年
+WINDOW_STARTS = {
+    'day': last_workday,
+    'week': last_wednesday,
+    'month': last_month_end,
+    'quarter': last_quarter_end,
+    'ytd': last_year_end,
+}
+
+
+def window_start(d, window):
+    '''窗口起点：窗口名称按WINDOW_STARTS计算，日期原样返回'''
+    if isinstance(window, date):
+        return window
+    if window not in WINDOW_STARTS:
+        raise ValueError(f"不支持的窗口: {window}")
+    return WINDOW_STARTS[window](d)
+
+
+def window_terms(d, window):
+    '''
+    将窗口增量展开为各日快照的加减项。快照为当月累计值，每月初清零，
+    起点在以前月份时需加回起点所在月至上月各月末的快照；起点恰为月末时与该月末抵消
+
+    :return: [(快照日期, 1或-1), ...]，按 当日、各月末、起点 的顺序
+    '''
+    start = window_start(d, window)
+    if start >= d:
+        raise ValueError(f"窗口起点 {start} 不早于 {d}")
+    ends = []
+    end = month_end(start)
+    while end < d.replace(day=1):
+        ends.append(end)
+        end = month_end(end + timedelta(days=1))
+    terms = [(d, 1)]
+    if ends and ends[0] == start:
+        return terms + [(e, 1) for e in ends[1:]]
+    return terms + [(e, 1) for e in ends] + [(start, -1)]
+
+
+def snapshot_dates(d, windows):
+    '''计算一组窗口需要的全部快照日期（按首次出现的顺序）'''
+    dates = []
+    for window in windows:
+        for snapshot_date, _ in window_terms(d, window):
+            if snapshot_date not in dates:
+                dates.append(snapshot_date)
+    return dates
+
+
+class PeriodDelta:
+    '''
+    按统计窗口计算每位理财经理的增量：各日快照已在SnapshotTensor中对齐为
+    人员×资产×快照 的数组，每个窗口只是对其中若干快照层的加减，新增窗口无需再关联
+    '''
+
+    def __init__(self, d, tensor, snapshots):
+        '''
+        :param d: 统计日期
+        :param tensor: SnapshotTensor
+        :param snapshots: {明细列后缀: (快照日期, 快照标签)}，后缀为''的为当日快照，其余按顺序拼入明细表；
+                          标签不在tensor中的快照视为未读取
+        '''
+        self.d = d
+        self.tensor = tensor
+        self.snapshots = {suffix: item for suffix, item in snapshots.items() if item[1] in tensor.labels}
+        if '' not in self.snapshots:
+            raise ValueError("缺少当日快照")
+
+    def _label_of(self, snapshot_date):
+        for d, label in self.snapshots.values():
+            if d == snapshot_date:
+                return label
+        raise ValueError(f"缺少 {snapshot_date} 的快照")
+
+    def deltas(self, windows, columns):
+        '''
+        一次计算全部窗口、全部资产列的增量
+
+        :param windows: {输出列后缀: 窗口名称或起点日期}，如 {'本日': 'day', '本周累积': 'week'}
+        :param columns: 资产列
+        :return: 列为 "{资产列}_{输出列后缀}" 的DataFrame，与花名册逐行对应
+        '''
+        assets = self.tensor.asset_index(columns)
+        values = self.tensor.values
+
+        result = {}
+        for name, window in windows.items():
+            terms = [(self.tensor.label_index(self._label_of(d)), sign) for d, sign in window_terms(self.d, window)]
+            total = values[:, assets, terms[0][0]]
+            for layer, sign in terms[1:]:
+                if sign > 0:
+                    total = total + values[:, assets, layer]
+                else:
+                    total = total - values[:, assets, layer]
+            result[name] = total
+        data = {f"{col}_{name}": result[name][:, j] for j, col in enumerate(columns) for name in windows}
+        return pd.DataFrame(data, index=self.tensor.roster.index)
+
+    def detail(self, windows):
+        '''
+        多日明细表：当日快照后依次拼接窗口用到的各日快照（列名加后缀），
+        与逐个 pd.merge(how='left') 的结果相同
+        '''
+        used = {window_start(self.d, window) for window in windows.values()}
+        used.update(d for window in windows.values() for d, _ in window_terms(self.d, window))
+        parts = []
+        for suffix, (d, label) in self.snapshots.items():
+            if suffix == '':
+                parts.insert(0, self.tensor.frame(label))
+            elif d in used:
+                frame = self.tensor.frame(label).drop(columns=self.tensor.key)
+                parts.append(frame.add_suffix(suffix))
+        return pd.concat(parts, axis=1)
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+from run_metrics import timed
+
+# 并列时的名次：min 取并列中的最小名次（同 Series.rank(method='min')），dense 名次连续，ordinal 按行位置依次排名
+METHODS = ('min', 'dense', 'ordinal')
+
+
+def _run_starts(flags):
+    '''每个位置所在段的起始行号，flags为各段起点的布尔矩阵（按列）'''
+    positions = np.arange(flags.shape[0])[:, None]
+    return np.maximum.accumulate(np.where(flags, positions, 0), axis=0)
+
+
+def rank_block(values, method='min', groups=None, ascending=False, pct=False):
+    '''
+    对 行数×指标数 的数值矩阵按列一次性排名：全部列在同一次排序中完成，不再逐列调用Series.rank
+
+    :param values: 二维数值数组，空值不参与排名，名次为空
+    :param method: 并列时的名次，见METHODS
+    :param groups: 与行数等长的分组编码，给出时在各组内分别排名，编码为负的行名次为空
+    :param ascending: 为False时数值最大者为第1名
+    :param pct: 为True时返回名次占组内有效人数的比例
+    :return: 与values同形状的float64名次矩阵
+    '''
+    if method not in METHODS:
+        raise ValueError(f"不支持的排名方式: {method}，可选: {', '.join(METHODS)}")
+    values = np.asarray(values, dtype='float64')
+    if values.ndim == 1:
+        return rank_block(values[:, None], method, groups, ascending, pct)[:, 0]
+    n, m = values.shape
+    ranks = np.full((n, m), np.nan)
+    if n == 0:
+        return ranks
+
+    missing = np.isnan(values)
+    groups = np.zeros(n, dtype='int64') if groups is None else np.asarray(groups, dtype='int64')
+    # 空值及无分组的行排在最后，不计名次
+    keys = np.where(missing, np.inf, values if ascending else -values)
+    invalid = missing | (groups < 0)[:, None]
+
+    # 先按数值稳定排序，再按分组稳定排序，得到各列 组→数值→行位置 的顺序
+    order = np.argsort(keys, axis=0, kind='stable')
+    order = np.take_along_axis(order, np.argsort(groups[order], axis=0, kind='stable'), axis=0)
+    sorted_keys = np.take_along_axis(keys, order, axis=0)
+    sorted_groups = groups[order]
+
+    new_group = np.ones((n, m), dtype=bool)
+    new_group[1:] = sorted_groups[1:] != sorted_groups[:-1]
+    new_value = new_group.copy()
+    new_value[1:] |= sorted_keys[1:] != sorted_keys[:-1]
+
+    group_start = _run_starts(new_group)
+    if method == 'min':
+        sorted_ranks = _run_starts(new_value) - group_start + 1
+    elif method == 'dense':
+        distinct = np.cumsum(new_value, axis=0)
+        sorted_ranks = distinct - np.take_along_axis(distinct, group_start, axis=0) + 1
+    else:
+        sorted_ranks = np.arange(n)[:, None] - group_start + 1
+
+    np.put_along_axis(ranks, order, sorted_ranks.astype('float64'), axis=0)
+    ranks[invalid] = np.nan
+
+    if pct:
+        valid = ~invalid
+        codes = np.where(groups < 0, 0, groups)
+        counts = np.zeros((codes.max() + 1, m))
+        if method == 'dense':
+            # dense的比例以组内不同数值的个数为分母
+            np.maximum.at(counts, codes, np.nan_to_num(ranks))
+        else:
+            np.add.at(counts, codes, valid)
+        ranks = ranks / counts[codes]
+    return ranks
+
+
+@timed('ranking')
+def rank_columns(df, columns, by=None, method='min', ascending=False, pct=False):
+    '''
+    对df的多列一次性排名
+
+    :param columns: 排名指标列
+    :param by: 分组列，如 "分行"、"组别"，给出时在各组内分别排名，为None时全国排名
+    :return: 列名与columns相同、与df同索引的名次DataFrame
+    '''
+    groups = None
+    if by is not None:
+        groups = pd.factorize(df[by], sort=True)[0]
+    values = df[list(columns)].to_numpy(dtype='float64', na_value=np.nan)
+    ranks = rank_block(values, method, groups, ascending, pct)
+    return pd.DataFrame(ranks, index=df.index, columns=list(columns))
+
+
+@timed('ranking')
+def rank_levels(df, columns, levels, method='min', ascending=False, pct=False):
+    '''
+    一次生成多个层级的名次，如全国、分行内、组别内
+
+    :param levels: {输出列后缀: 分组列或None}，如 {'_排名': None, '_分行排名': '分行', '_组别排名': '组别'}
+    :return: 列为 "{指标列}{后缀}" 的DataFrame，按指标列、层级顺序排列
+    '''
+    parts = {suffix: rank_columns(df, columns, by, method, ascending, pct) for suffix, by in levels.items()}
+    data = {f"{col}{suffix}": parts[suffix][col] for col in columns for suffix in levels}
+    return pd.DataFrame(data, index=df.index)
@@ -0,0 +1,104 @@
+import re
+import numpy as np
+import pandas as pd
+
+from run_metrics import timed
+
+# 条件计数的比较符，如 ">0"、"<=1000"
+_CONDITION = re.compile(r'^(>=|<=|==|!=|>|<)(-?\d+(?:\.\d+)?)$')
+_COMPARE = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+}
+
+
+def _parse_condition(how):
+    m = _CONDITION.match(how)
+    if m is None:
+        raise ValueError(f"不支持的聚合方式: {how}")
+    return _COMPARE[m.group(1)], float(m.group(2))
+
+
+def indicator_matrix(df, conditions):
+    '''
+    将多个条件一次性计算为 行数×条件数 的uint8矩阵，空值不满足任何条件
+
+    :param conditions: [(源列, 条件), ...]，条件如 ">0"
+    '''
+    if not conditions:
+        return np.zeros((len(df), 0), dtype=np.uint8)
+    columns = []
+    for column, how in conditions:
+        compare, threshold = _parse_condition(how)
+        values = df[column].to_numpy(dtype='float64', na_value=np.nan)
+        columns.append(compare(values, threshold))
+    return np.column_stack(columns).astype(np.uint8)
+
+
+@timed('aggregation')
+def aggregate(df, by, specs):
+    '''
+    按分组一次性完成多项统计，代替逐组调用lambda的NamedAgg：
+    全部条件计数先算成一个uint8矩阵，再用一次内置groupby求和
+
+    :param by: 分组列（单列名或列名列表）
+    :param specs: [(输出列, 源列, 聚合方式), ...]，聚合方式为 "nunique"、"sum" 或条件如 ">0"、"<=1000"
+    :return: 与 df.groupby(by, as_index=False).agg(...) 结构相同的DataFrame，列按specs顺序排列
+    '''
+    by = [by] if isinstance(by, str) else list(by)
+    keys = [df[col] for col in by]
+    parts = {}
+
+    conditions = [(name, column, how) for name, column, how in specs if how not in ('nunique', 'sum')]
+    if conditions:
+        matrix = indicator_matrix(df, [(column, how) for _, column, how in conditions])
+        counts = pd.DataFrame(matrix, index=df.index, columns=[name for name, _, _ in conditions])
+        counts = counts.groupby(keys, observed=True).sum().astype('int64')
+        for name in counts.columns:
+            parts[name] = counts[name]
+
+    sums = [(name, column) for name, column, how in specs if how == 'sum']
+    if sums:
+        totals = df[list(dict.fromkeys(column for _, column in sums))].groupby(keys, observed=True).sum()
+        for name, column in sums:
+            parts[name] = totals[column]
+
+    for name, column, how in specs:
+        if how == 'nunique':
+            parts[name] = df[column].groupby(keys, observed=True).nunique()
+
+    result = pd.DataFrame({name: parts[name] for name, _, _ in specs})
+    return result.reset_index()
+
+
+@timed('aggregation')
+def rollup(base, by, levels, labels):
+    '''
+    在按by分组的聚合结果上补充上卷行，相当于SQL的 GROUPING SETS：明细数据只在生成base时归约一次，
+    各层级及总计均由base按组相加得到。上卷按相加计算，nunique类指标要求同一值只属于一个分组（如柜员号）
+
+    :param base: 按by分组的聚合结果，除by外均为可相加的数值列
+    :param by: 分组列列表，如 ['组别', '分行']
+    :param levels: 需要补充的分组集合，按输出顺序排列，每项为by的子集，[]为总计，如 [['组别'], []]
+    :param labels: {被上卷的分组列: 上卷行中该列的取值}，如 {'组别': '无组别', '分行': '全国'}
+    :return: 上卷行在前、base在后的DataFrame，列顺序与base相同
+    '''
+    values = [col for col in base.columns if col not in by]
+    parts = []
+    for level in levels:
+        level = list(level)
+        if not level:
+            row = {col: labels[col] for col in by}
+            row.update({col: base[col].sum() for col in values})
+            part = pd.DataFrame([row])
+        else:
+            part = base.groupby(level, observed=True)[values].sum().reset_index()
+            for col in by:
+                if col not in level:
+                    part[col] = labels[col]
+        parts.append(part[list(base.columns)])
+    return pd.concat(parts + [base]).reset_index(drop=True)
@@ -0,0 +1,125 @@
+import os
+import importlib
+from datetime import datetime
+
+# 报表名与生成脚本的对应关系，按执行顺序排列；"模块:报表名" 为同一脚本生成的多张报表之一，
+# 见 generate_report.SalesReport。本模块只依赖标准库，报表脚本及pandas等在首次计算时才导入
+REPORTS = {
+    'report': 'generate_report:report',
+    'sh': 'generate_report:sh',
+    'jhdls': 'generate_report:jhdls',
+    'month': 'generate_report:month',
+    'month24': 'generate_report:month24',
+    'business': 'generate_report_business',
+    'business_sale': 'generate_report_business_sale',
+    'top': 'top_business_list',
+}
+
+# 工作目录下存放源文件的文件夹
+SOURCE_DIR_NAME = '参考文件'
+
+
+def load_report(name):
+    '''
+    导入报表脚本（不执行其命令行入口），name为REPORTS中的报表名；
+    返回脚本模块，或同一脚本中的报表对象，两者均提供 MATCH_FILE、snapshot_requests、build、main
+    '''
+    if name not in REPORTS:
+        raise ValueError(f"未知的报表: {name}，可选: {', '.join(REPORTS)}")
+    module_name, _, report = REPORTS[name].partition(':')
+    module = importlib.import_module(module_name)
+    return module.sales_report(report) if report else module
+
+
+def required_sources(name, date):
+    '''
+    某张报表需要的源文件，只计算日期不读取文件；传入已读取的源文件时应按此给出各键
+
+    :param date: 报表日期，格式为YYYYMMDD
+    :return: {键: (文件关键词, 日期)}，如 {'sales_today': ('投资理财销售量统计表', date(2025, 3, 19)), ...}
+    '''
+    datetime.strptime(date, "%Y%m%d")
+    return {key: (request[0], d) for request in load_report(name).snapshot_requests(date)
+            for key, d in request[1].items()}
+
+
+def build_report(name, date, sources, df_match=None, repository=None, metrics=None):
+    '''
+    在本进程内计算一张报表，返回各工作表的DataFrame，不写出工作簿，也不读写报表脚本的模块变量
+
+    :param name: 报表名，见REPORTS
+    :param date: 报表日期，格式为YYYYMMDD
+    :param sources: 已读取的源文件 {键: DataFrame}（键见 required_sources），
+                    或工作目录（其下 参考文件 文件夹中为源文件）
+    :param df_match: 分行全简称对应及组别分类，DataFrame或文件路径；
+                     sources为工作目录时默认读取其下的对应关系文件
+    :param repository: 读取源文件及缓存加工后花名册的SnapshotRepository，默认每次调用新建、调用结束即释放；
+                       传入 snapshot_repository.get_repository() 等长期持有的仓库可在多次调用间复用已读取的快照
+    :param metrics: 记录各阶段耗时的RunMetrics，默认不记录
+    :return: {工作簿名: {工作表名: DataFrame}}，与写入excel的工作表一致
+    '''
+    datetime.strptime(date, "%Y%m%d")
+    module = load_report(name)
+    from run_metrics import RunMetrics, use_metrics
+    from snapshot_repository import SnapshotRepository, use_repository
+
+    repository = repository if repository is not None else SnapshotRepository()
+    metrics = metrics if metrics is not None else RunMetrics(enabled=False)
+    if isinstance(sources, dict):
+        missing = [key for key in required_sources(name, date) if key not in sources]
+        if missing:
+            raise ValueError(f"报表{name}缺少源文件: {', '.join(missing)}")
+        if df_match is None:
+            raise ValueError('传入已读取的源文件时需同时给出df_match')
+    elif df_match is None:
+        df_match = os.path.join(os.fspath(sources), module.MATCH_FILE)
+
+    with use_repository(repository), use_metrics(metrics), metrics.stage('report', 'build', name):
+        if isinstance(sources, dict):
+            dfs = sources
+        else:
+            with metrics.stage('load', 'load_snapshots'):
+                dfs = repository.load(module.snapshot_requests(date), os.path.join(os.fspath(sources), SOURCE_DIR_NAME))
+        if not hasattr(df_match, 'columns'):
+            df_match = repository.match(os.fspath(df_match))
+        return module.build(date, dfs, df_match)
+
+
+def build_sales_report(date, sources, **kwargs):
+    '''理财经理开单情况统计表，参数同 build_report'''
+    return build_report('report', date, sources, **kwargs)
+
+
+def build_sh_report(date, sources, **kwargs):
+    '''理财经理开单情况统计表（全省口径），参数同 build_report'''
+    return build_report('sh', date, sources, **kwargs)
+
+
+def build_jhdls_report(date, sources, **kwargs):
+    '''理财经理开单情况统计表（全市口径），参数同 build_report'''
+    return build_report('jhdls', date, sources, **kwargs)
+
+
+def build_month_report(date, sources, **kwargs):
+    '''月度理财经理开单情况统计表，参数同 build_report'''
+    return build_report('month', date, sources, **kwargs)
+
+
+def build_month24_report(date, sources, **kwargs):
+    '''月度理财经理开单情况统计表（使用24版分行对应关系文件），参数同 build_report'''
+    return build_report('month24', date, sources, **kwargs)
+
+
+def build_business_report(date, sources, **kwargs):
+    '''中间业务收入TOP榜单及投资理财中收统计表，参数同 build_report'''
+    return build_report('business', date, sources, **kwargs)
+
+
+def build_business_sale_report(date, sources, **kwargs):
+    '''投资理财中收及销量统计表，参数同 build_report'''
+    return build_report('business_sale', date, sources, **kwargs)
+
+
+def build_top_report(date, sources, **kwargs):
+    '''4种业务TOP周榜单，参数同 build_report'''
+    return build_report('top', date, sources, **kwargs)
@@ -0,0 +1,72 @@
+class ReportDAG:
+    '''
+    报表计算图：读取快照、加工花名册、计算增量、分组汇总及输出工作表均登记为具名阶段，
+    请求某些阶段时只计算其上游阶段，未被请求的阶段不执行；
+    一次计算内每个阶段只执行一次，结果不在两次计算之间保留
+    '''
+
+    def __init__(self):
+        self.stages = {}
+
+    def stage(self, name, *deps, source=None):
+        '''
+        登记阶段的装饰器，被装饰函数按deps的顺序接收上游阶段（或输入参数）的结果
+
+        :param name: 阶段名
+        :param deps: 上游阶段名或输入参数名
+        :param source: 读取源文件的阶段给出其读取清单函数，接收统计日期，返回 (文件关键词, {键: 日期}, 扩展名列表)
+        '''
+        def register(func):
+            if name in self.stages:
+                raise ValueError(f"阶段{name}重复登记")
+            self.stages[name] = (func, deps, source)
+            return func
+        return register
+
+    def ancestors(self, targets, params=()):
+        '''targets及其全部上游阶段，按可执行的顺序排列（不含输入参数）'''
+        order = []
+        visiting = set()
+
+        def visit(name):
+            if name in params or name in order:
+                return
+            if name not in self.stages:
+                raise ValueError(f"未登记的阶段: {name}")
+            if name in visiting:
+                raise ValueError(f"阶段{name}存在循环依赖")
+            visiting.add(name)
+            for dep in self.stages[name][1]:
+                visit(dep)
+            visiting.discard(name)
+            order.append(name)
+
+        for target in targets:
+            visit(target)
+        return order
+
+    def sources(self, targets, params=()):
+        '''targets上游的读取源文件阶段：{阶段名: 读取清单函数}'''
+        return {name: self.stages[name][2] for name in self.ancestors(targets, params)
+                if self.stages[name][2] is not None}
+
+    def compute(self, targets, params):
+        '''
+        计算targets，只执行其上游阶段，多个阶段共用的上游只执行一次
+
+        :param targets: 需要的阶段名列表
+        :param params: {输入参数名: 值}，如统计日期、工作目录
+        :return: {阶段名: 结果}
+        '''
+        # 先检查依赖关系（未登记的阶段、循环依赖），再开始计算
+        self.ancestors(targets, params)
+        values = dict(params)
+
+        def evaluate(name):
+            if name in values:
+                return values[name]
+            func, deps, _ = self.stages[name]
+            values[name] = func(*[evaluate(dep) for dep in deps])
+            return values[name]
+
+        return {target: evaluate(target) for target in targets}
@@ -0,0 +1,51 @@
+# 开单情况统计表的各统计口径：花名册与分行全简称对应关系的关联键，以及上卷总计行的分行名称
+HIERARCHIES = {
+    '全国': {'on': '总行/一级分行名称', 'total': '全国'},
+    '全省': {'on': '二级分行名称', 'total': '全省'},
+    '全市': {'on': '一级支行名称', 'total': '全市'},
+}
+
+# 默认口径，其报表的工作簿名不加口径名
+DEFAULT_HIERARCHY = '全国'
+
+# 总计行的组别
+TOTAL_GROUP = '无组别'
+
+# 分行全简称对应关系及组别分类文件的各版本，''为默认版本
+MATCH_FILES = {
+    '': '分行全简称对应及组别分类.xlsx',
+    '24': '分行全简称对应及组别分类24.xlsx',
+}
+
+# 统计周期：输出的工作簿及结果表名、除当日外读取的销售量快照 {快照标签: 快照日期所取的窗口起点}，
+# 以及各统计窗口 (明细列后缀, 窗口名称, 结果表中的表头, 用户中间表中的开单标识列)；按开单业务数分层取最后一个窗口
+PERIODS = {
+    'daily': {
+        'workbook': '理财经理开单情况统计表',
+        'sheet': '结果通报表',
+        'snapshots': {'lm': 'month', 'ld': 'day', 'lw': 'week'},
+        'windows': [('本日', 'day', '本日开单率情况', '当日0产能'),
+                    ('本周累积', 'week', '本周开单率情况', '本周0产能')],
+    },
+    'month': {
+        'workbook': '月度理财经理开单情况统计表',
+        'sheet': '月结果通报表',
+        'snapshots': {},
+        'windows': [('本月', 'month', '本月开单率情况', '本月0产能')],
+    },
+}
+
+# 结果表版式：各资产列的顺序、开单率列名是否带窗口后缀、各层业务开单率的顺序
+LAYOUTS = {
+    'compact': {'assets': ['保险', '理财/资管', '贵金属', '基金'], 'rate_suffix': False, 'levels': [4, 3, 2, 1]},
+    'labeled': {'assets': ['理财/资管', '保险', '基金', '贵金属'], 'rate_suffix': True, 'levels': [1, 2, 3, 4]},
+}
+
+# 开单情况统计表的各报表：统计周期、对应关系版本（见MATCH_FILES）、统计口径及结果表版式
+SALES_REPORTS = {
+    'report': {'period': 'daily', 'match': '', 'hierarchy': '全国', 'layout': 'compact'},
+    'sh': {'period': 'daily', 'match': '', 'hierarchy': '全省', 'layout': 'labeled'},
+    'jhdls': {'period': 'daily', 'match': '', 'hierarchy': '全市', 'layout': 'labeled'},
+    'month': {'period': 'month', 'match': '', 'hierarchy': '全国', 'layout': 'labeled'},
+    'month24': {'period': 'month', 'match': '24', 'hierarchy': '全国', 'layout': 'labeled'},
+}
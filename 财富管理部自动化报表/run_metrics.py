@@ -0,0 +1,376 @@
+import os
+import sys
+import json
+import time
+import argparse
+import functools
+import threading
+import contextlib
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    # Windows下没有resource模块，不统计内存峰值
+    resource = None
+
+# 运行报告写在工作目录下的该文件夹中，文件名为 "{入口}_{报表日期}_{开始时间}.json"
+REPORT_DIR_NAME = '运行报告'
+
+# 阶段名称，按流水线顺序排列；report为整张报表（main），其自身耗时即未归入其他阶段的部分
+STAGES = ('load', 'reduce', 'deltas', 'aggregation', 'ranking', 'write')
+
+
+def rss_mb():
+    '''本进程当前的常驻内存（MB），无法统计时返回None'''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1048576
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_mb():
+    '''本进程启动以来的内存峰值（MB），无法统计时返回None'''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return peak / 1048576 if sys.platform == 'darwin' else peak / 1024
+
+
+def count_rows(value):
+    '''
+    阶段输入输出的行数：DataFrame、Series及数组为行数，SnapshotTensor为花名册行数，
+    字典、列表及元组为各项之和，其余（如日期、路径）为None
+    '''
+    if getattr(value, 'ndim', 0) >= 1 and hasattr(value, 'shape'):
+        return int(value.shape[0])
+    roster = getattr(value, 'roster', None)
+    if roster is not None:
+        return count_rows(roster)
+    if isinstance(value, dict):
+        items = value.values()
+    elif isinstance(value, (list, tuple)):
+        items = value
+    else:
+        return None
+    counts = [n for n in (count_rows(item) for item in items) if n is not None]
+    return sum(counts) if counts else None
+
+
+def top_allocations(before, after, limit=10):
+    '''
+    两次tracemalloc快照之间新增内存最多的代码位置
+
+    :return: [{'where': '目录/文件:行号', 'size_kb': 新增KB, 'count': 新增内存块数}, ...]
+    '''
+    # 不计入统计及采样调用栈本身占用的内存
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__),
+              tracemalloc.Filter(False, '*run_profiler.py')]
+    stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'lineno')
+    stats = sorted((s for s in stats if s.size_diff > 0), key=lambda s: s.size_diff, reverse=True)
+    allocations = []
+    for s in stats[:limit]:
+        frame = s.traceback[0]
+        where = os.path.join(os.path.basename(os.path.dirname(frame.filename)), os.path.basename(frame.filename))
+        allocations.append({'where': f"{where}:{frame.lineno}", 'size_kb': round(s.size_diff / 1024, 1),
+                            'count': s.count_diff})
+    return allocations
+
+
+def _round(value, digits=4):
+    return None if value is None else round(value, digits)
+
+
+def _script_name(func):
+    '''函数所在的报表名：直接运行脚本时模块名为__main__，取脚本文件名'''
+    if func.__module__ != '__main__':
+        return func.__module__
+    main = sys.modules['__main__']
+    return os.path.splitext(os.path.basename(getattr(main, '__file__', '') or '__main__'))[0]
+
+
+class RunMetrics:
+    '''
+    运行指标：按阶段记录耗时（墙钟及本进程CPU）、输入输出行数及内存，阶段可以嵌套，
+    self_s为扣除嵌套阶段后的自身耗时，按阶段汇总时只累计自身耗时，不重复计算
+    '''
+
+    def __init__(self, enabled=True):
+        # 为False时不记录任何阶段，供库调用时避免记录在进程内持续累积
+        self.enabled = enabled
+        self.started = datetime.now()
+        self.records = []
+        # 运行中另外写出的文件，如性能剖析结果：{类别: 路径}
+        self.artifacts = {}
+        # 开启tracemalloc时统计各阶段新增内存最多的代码位置，只统计不超过该嵌套深度的阶段，None为不统计
+        self.trace_depth = None
+        self._origin = time.perf_counter()
+        self._cpu_origin = time.process_time()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def current_report(self):
+        '''当前所在的报表，不在任何报表中时返回None'''
+        stack = self._stack()
+        return stack[-1]['report'] if stack else None
+
+    @contextlib.contextmanager
+    def stage(self, stage, name, report=None, rows_in=None):
+        '''
+        记录一个阶段的上下文管理器，返回的记录可在块内补充 rows_out 等字段
+
+        :param stage: 阶段，见STAGES，整张报表为report
+        :param name: 阶段内的具体步骤，如函数名或工作簿名
+        :param report: 报表名，为None时沿用外层阶段的报表
+        '''
+        if not self.enabled:
+            yield {}
+            return
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        record = {
+            'report': report or (parent['report'] if parent else None),
+            'stage': stage,
+            'name': name,
+            'depth': len(stack),
+            'start_s': _round(time.perf_counter() - self._origin),
+            'rows_in': rows_in,
+            'rows_out': None,
+        }
+        nested = {'wall': 0.0, 'cpu': 0.0}
+        record['_nested'] = nested
+        # 快照在计时开始前及结束后获取，其耗时不计入本阶段
+        trace = self.trace_depth is not None and len(stack) <= self.trace_depth and tracemalloc.is_tracing()
+        before = tracemalloc.take_snapshot() if trace else None
+        rss_start, peak_start = rss_mb(), peak_mb()
+        wall, cpu = time.perf_counter(), time.process_time()
+        stack.append(record)
+        try:
+            yield record
+        except BaseException as e:
+            record['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            stack.pop()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            if parent is not None:
+                parent['_nested']['wall'] += wall
+                parent['_nested']['cpu'] += cpu
+            del record['_nested']
+            peak_end = peak_mb()
+            record.update({
+                'wall_s': _round(wall),
+                'self_s': _round(wall - nested['wall']),
+                'cpu_s': _round(cpu),
+                'self_cpu_s': _round(cpu - nested['cpu']),
+                'rss_start_mb': _round(rss_start, 1),
+                'rss_end_mb': _round(rss_mb(), 1),
+                'peak_mb': _round(peak_end, 1),
+                'peak_growth_mb': _round(peak_end - peak_start, 1) if peak_end is not None else None,
+            })
+            if before is not None:
+                record['allocations'] = top_allocations(before, tracemalloc.take_snapshot())
+            with self._lock:
+                self.records.append(record)
+
+    def call(self, stage, func, args=(), kwargs=None, report=None):
+        '''
+        调用func并记录为一个阶段，输入行数为各参数行数之和，输出行数为返回值的行数；
+        stage为report时报表名取函数所在的脚本
+        '''
+        kwargs = kwargs or {}
+        if not self.enabled:
+            return func(*args, **kwargs)
+        report = report or (_script_name(func) if stage == 'report' else None)
+        rows_in = count_rows(list(args) + list(kwargs.values()))
+        with self.stage(stage, func.__name__, report, rows_in) as record:
+            result = func(*args, **kwargs)
+            record['rows_out'] = count_rows(result)
+            return result
+
+    def add(self, stage, name, report=None, **fields):
+        '''补记在其他进程中完成的阶段，如写出进程中的工作簿写出，fields为耗时等字段'''
+        record = {'report': report, 'stage': stage, 'name': name, 'depth': 0,
+                  'start_s': _round(time.perf_counter() - self._origin)}
+        record.update(fields)
+        with self._lock:
+            self.records.append(record)
+        return record
+
+    def totals(self):
+        '''按 报表、阶段 汇总自身耗时：{报表: {阶段: {'calls', 'wall_s', 'cpu_s'}}}'''
+        totals = {}
+        for record in self.records:
+            item = totals.setdefault(record['report'] or '-', {}).setdefault(
+                record['stage'], {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0})
+            item['calls'] += 1
+            item['wall_s'] += record.get('self_s') or 0.0
+            item['cpu_s'] += record.get('self_cpu_s') or 0.0
+        for stages in totals.values():
+            for item in stages.values():
+                item['wall_s'] = round(item['wall_s'], 4)
+                item['cpu_s'] = round(item['cpu_s'], 4)
+        return totals
+
+    def to_dict(self, entry=None, params=None):
+        '''运行报告的内容'''
+        return {
+            'entry': entry,
+            'params': params or {},
+            'argv': sys.argv,
+            'pid': os.getpid(),
+            'python': sys.version.split()[0],
+            'started': self.started.isoformat(timespec='seconds'),
+            'finished': datetime.now().isoformat(timespec='seconds'),
+            'wall_s': _round(time.perf_counter() - self._origin),
+            'cpu_s': _round(time.process_time() - self._cpu_origin),
+            'peak_mb': _round(peak_mb(), 1),
+            'stages': sorted(self.records, key=lambda r: r['start_s']),
+            'totals': self.totals(),
+            'artifacts': self.artifacts,
+        }
+
+    def output_path(self, base_path, entry, params=None, suffix='.json'):
+        '''
+        本次运行的输出文件路径：工作目录下 运行报告 文件夹中的 "{入口}_{报表日期}_{开始时间}{后缀}"，
+        运行报告与性能剖析结果使用相同的文件名
+        '''
+        folder = os.path.join(base_path, REPORT_DIR_NAME)
+        os.makedirs(folder, exist_ok=True)
+        date = (params or {}).get('param_date') or (params or {}).get('start') or ''
+        return os.path.join(folder, f"{entry}_{date}_{self.started:%Y%m%d%H%M%S}{suffix}")
+
+    def write(self, base_path, entry, params=None):
+        '''
+        将运行报告写入工作目录下的 运行报告 文件夹，先写临时文件再替换
+
+        :param entry: 入口名，如 generate_report、run_reports
+        :param params: 运行参数，如 {'param_date': '20250319'}
+        :return: 运行报告路径
+        '''
+        path = self.output_path(base_path, entry, params)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(entry, params), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+
+def format_summary(report):
+    '''
+    将运行报告（to_dict的结果或读入的json）格式化为汇总表：各阶段明细按开始时间排列，
+    嵌套阶段缩进显示，其后为各报表按阶段汇总的自身耗时
+    '''
+    width = max([24] + [len(str(r['report'] or '-')) + 2 for r in report['stages']])
+    lines = [f"{'报表':<{width}}{'阶段':<12}{'步骤':<34}{'耗时(秒)':>10}{'自身(秒)':>10}{'CPU(秒)':>10}"
+             f"{'输入行':>10}{'输出行':>10}{'内存峰值MB':>12}{'峰值增长MB':>12}"]
+
+    def cell(value, width, digits=None):
+        if value is None:
+            return f"{'-':>{width}}"
+        return f"{value:>{width}.{digits}f}" if digits is not None else f"{value:>{width}}"
+
+    for record in report['stages']:
+        name = '  ' * record.get('depth', 0) + str(record['name'])
+        line = f"{str(record['report'] or '-'):<{width}}{record['stage']:<12}{name:<34}" \
+               f"{cell(record.get('wall_s'), 10, 3)}{cell(record.get('self_s'), 10, 3)}" \
+               f"{cell(record.get('cpu_s'), 10, 3)}{cell(record.get('rows_in'), 10)}" \
+               f"{cell(record.get('rows_out'), 10)}{cell(record.get('peak_mb'), 12, 1)}" \
+               f"{cell(record.get('peak_growth_mb'), 12, 1)}"
+        if record.get('error'):
+            line += f"  失败：{record['error']}"
+        lines.append(line)
+        # 开启--trace-allocations时列出新增内存最多的几处
+        for allocation in record.get('allocations', [])[:3]:
+            lines.append(f"{'':<{width + 12}}{'  ' * record.get('depth', 0)}  + {allocation['size_kb'] / 1024:.1f} MB"
+                         f"  {allocation['where']}")
+
+    stages = list(STAGES) + ['report']
+    lines.append('')
+    lines.append(f"{'报表':<{width}}" + ''.join(f"{stage:>13}" for stage in stages) + f"{'合计':>11}")
+    for name, totals in report['totals'].items():
+        values = [totals.get(stage, {}).get('wall_s', 0.0) for stage in stages]
+        lines.append(f"{name:<{width}}" + ''.join(f"{v:>13.3f}" for v in values) + f"{sum(values):>13.3f}")
+    for kind, path in report.get('artifacts', {}).items():
+        lines.append(f"{kind}：{path}")
+    lines.append(f"总耗时 {report['wall_s']:.3f} 秒，CPU {report['cpu_s']:.3f} 秒，"
+                 f"内存峰值 {report['peak_mb'] if report['peak_mb'] is not None else '-'} MB")
+    return '\n'.join(lines)
+
+
+_metrics = RunMetrics()
+
+# 各线程在 use_metrics 块内改用的运行指标
+_local = threading.local()
+
+
+def get_metrics():
+    '''返回当前使用的运行指标：use_metrics块内为指定的运行指标，否则为进程内共享的运行指标'''
+    override = getattr(_local, 'metrics', None)
+    return override if override is not None else _metrics
+
+
+@contextlib.contextmanager
+def use_metrics(metrics):
+    '''在with块内（仅限当前线程）将阶段记入指定的运行指标，如库调用时记入调用方的RunMetrics或不记录'''
+    previous = getattr(_local, 'metrics', None)
+    _local.metrics = metrics
+    try:
+        yield metrics
+    finally:
+        _local.metrics = previous
+
+
+def reset_metrics():
+    '''开始新一次运行，丢弃已记录的阶段'''
+    global _metrics
+    _metrics = RunMetrics()
+    return _metrics
+
+
+def stage(stage, name, report=None, rows_in=None):
+    '''在进程内共享的运行指标中记录一个阶段，参数同 RunMetrics.stage'''
+    return get_metrics().stage(stage, name, report, rows_in)
+
+
+def timed(stage, report=None):
+    '''
+    记录函数每次调用的装饰器，记入调用时进程内共享的运行指标
+
+    :param stage: 阶段，见STAGES，报表的main为report
+    :param report: 报表名，为None时沿用外层阶段的报表
+    '''
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return get_metrics().call(stage, func, args, kwargs, report)
+        return wrapper
+    return decorate
+
+
+def finish_run(base_path, entry, params=None):
+    '''运行结束时写出运行报告并输出汇总表，返回运行报告路径'''
+    metrics = get_metrics()
+    path = metrics.write(base_path, entry, params)
+    print(format_summary(metrics.to_dict(entry, params)))
+    print(f"\n运行报告已保存至：{path}\n")
+    return path
+
+
+if __name__ == "__main__":
+
+    # 读取并校验执行参数
+    parser = argparse.ArgumentParser(description='输出运行报告的各阶段汇总表')
+    parser.add_argument('path', help='运行报告（json）路径')
+    args = parser.parse_args()
+
+    with open(args.path, encoding='utf-8') as f:
+        print(format_summary(json.load(f)))
@@ -0,0 +1,142 @@
+import os
+import sys
+import pstats
+import cProfile
+import argparse
+import threading
+import contextlib
+import tracemalloc
+
+from run_metrics import get_metrics
+
+# 采样调用栈的间隔（秒），采样结果用于生成火焰图
+SAMPLE_INTERVAL = 0.005
+
+# --trace-allocations 统计到的阶段嵌套深度：0为整张报表（main），1为其中的读取、计算及写出等各阶段
+TRACE_DEPTH = 1
+
+# tracemalloc 为每块内存保存的调用栈深度，按代码行统计时1层即可
+TRACE_FRAMES = 1
+
+# 运行结束时输出的耗时最多的函数数
+TOP_FUNCTIONS = 20
+
+
+def add_profile_arguments(parser):
+    '''为入口脚本的参数解析加上性能剖析相关的选项'''
+    parser.add_argument('--profile', action='store_true',
+                        help='输出cProfile结果（.pstats）及火焰图用的折叠调用栈（.collapsed）到 运行报告 文件夹')
+    parser.add_argument('--trace-allocations', action='store_true',
+                        help='使用tracemalloc统计各阶段新增内存最多的代码位置，记入运行报告（运行明显变慢）')
+    return parser
+
+
+def parse_report_args(script, argv=None):
+    '''
+    解析报表脚本的执行参数：报表日期及性能剖析选项
+
+    :param script: 脚本文件名，用于用法说明
+    :return: argparse.Namespace，含 date、profile、trace_allocations
+    '''
+    parser = argparse.ArgumentParser(prog=script, description='生成指定日期的报表')
+    parser.add_argument('date', metavar='YYYYMMDD', help='报表日期')
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def _frame_label(code):
+    '''折叠调用栈中一层的名称：函数名 (文件名:行号)，去掉火焰图格式中作分隔符的分号'''
+    label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label.replace(';', ',')
+
+
+class StackSampler:
+    '''
+    定时采样一个线程的调用栈，按折叠格式（"外层;...;内层 次数"）累计，
+    可直接交给 flamegraph.pl、speedscope 等工具生成火焰图；C扩展内的耗时计入调用它的Python函数
+    '''
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def write(self, path):
+        '''写出折叠调用栈文件，按次数从多到少排列'''
+        with open(path, 'w', encoding='utf-8') as f:
+            for key, count in sorted(self.counts.items(), key=lambda item: item[1], reverse=True):
+                f.write(f"{key} {count}\n")
+
+
+@contextlib.contextmanager
+def profiling(base_path, entry, params=None, profile=False, trace_allocations=False):
+    '''
+    在with块内按选项进行性能剖析，结果与运行报告同名写入 运行报告 文件夹并记入运行报告；
+    只剖析本进程，多进程读取或写出时子进程中的耗时不在其中
+
+    :param entry: 入口名，如 generate_report、run_reports
+    :param params: 运行参数，用于输出文件名中的报表日期
+    :param profile: 是否输出cProfile结果及折叠调用栈
+    :param trace_allocations: 是否按阶段统计新增内存最多的代码位置
+    '''
+    metrics = get_metrics()
+    if trace_allocations:
+        tracemalloc.start(TRACE_FRAMES)
+        metrics.trace_depth = TRACE_DEPTH
+    profiler = sampler = None
+    if profile:
+        sampler = StackSampler()
+        sampler.start()
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield
+    finally:
+        # 运行失败时同样写出已有的剖析结果，便于定位
+        if profiler is not None:
+            profiler.disable()
+            sampler.stop()
+            stats_path = metrics.output_path(base_path, entry, params, '.pstats')
+            profiler.dump_stats(stats_path)
+            collapsed_path = metrics.output_path(base_path, entry, params, '.collapsed')
+            sampler.write(collapsed_path)
+            metrics.artifacts.update({'pstats': stats_path, 'collapsed': collapsed_path})
+            stats = pstats.Stats(profiler, stream=sys.stdout)
+            stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        if trace_allocations:
+            metrics.trace_depth = None
+            tracemalloc.stop()
+
+
+if __name__ == "__main__":
+
+    # 读取并校验执行参数
+    parser = argparse.ArgumentParser(description='输出已保存的cProfile结果中耗时最多的函数，给出多个文件时合并统计')
+    parser.add_argument('paths', nargs='+', help='cProfile结果（.pstats）路径')
+    parser.add_argument('--sort', default='cumulative', help='排序方式，如 cumulative、tottime，默认cumulative')
+    parser.add_argument('--top', type=int, default=TOP_FUNCTIONS, help=f"输出的函数数，默认{TOP_FUNCTIONS}")
+    args = parser.parse_args()
+
+    pstats.Stats(*args.paths).sort_stats(args.sort).print_stats(args.top)
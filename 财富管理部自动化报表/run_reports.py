@@ -0,0 +1,263 @@
+import os
+import sys
+import argparse
+import traceback
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from snapshot_loader import DEFAULT_EXTS, resolve_file
+from snapshot_readers import columns_for
+from snapshot_history import can_serve
+from snapshot_repository import get_repository
+from workbook_pool import get_writer_pool
+from run_metrics import stage, finish_run
+from run_profiler import add_profile_arguments, profiling
+from report_api import REPORTS, load_report
+import excel_writer
+
+
+def parse_report_names(names):
+    '''解析报表名列表，"all"或未指定时返回全部报表'''
+    if not names or 'all' in names:
+        return list(REPORTS)
+    unknown = [n for n in names if n not in REPORTS]
+    if unknown:
+        raise ValueError(f"未知的报表: {', '.join(unknown)}，可选: all, {', '.join(REPORTS)}")
+    return list(dict.fromkeys(names))
+
+
+def missing_inputs(module, param_date, base_path):
+    '''返回某张报表缺失的源文件及对应关系文件（历史库中已入库的日期不算缺失），不读取文件内容'''
+    folder_path = os.path.join(base_path, '参考文件')
+    missing = []
+    if not os.path.exists(os.path.join(base_path, module.MATCH_FILE)):
+        missing.append(module.MATCH_FILE)
+    for request in module.snapshot_requests(param_date):
+        filename_str, dates = request[0], request[1]
+        exts = request[2] if len(request) > 2 and request[2] else DEFAULT_EXTS
+        for d in dates.values():
+            try:
+                resolve_file(folder_path, filename_str, d, exts)
+            except FileNotFoundError as e:
+                if not can_serve(folder_path, filename_str, d, columns_for(filename_str)):
+                    missing.append(str(e))
+    return missing
+
+
+def plan_dates(start, end):
+    '''返回起止日期之间（含两端）的全部工作日，格式为YYYYMMDD'''
+    start = datetime.strptime(start, "%Y%m%d").date()
+    end = datetime.strptime(end, "%Y%m%d").date()
+    if start > end:
+        raise ValueError(f"起始日期{start:%Y%m%d}晚于结束日期{end:%Y%m%d}")
+    return [(start + timedelta(days=i)).strftime('%Y%m%d') for i in range((end - start).days + 1)
+            if (start + timedelta(days=i)).weekday() < 5]
+
+
+def _check_inputs(modules, param_date, base_path, failures):
+    '''校验输入文件，返回可以生成的报表；缺少文件的报表记入failures并跳过，不影响其余报表'''
+    runnable = {}
+    for name, module in modules.items():
+        missing = missing_inputs(module, param_date, base_path)
+        if missing:
+            failures[name] = '缺少输入文件: ' + '; '.join(missing)
+        else:
+            runnable[name] = module
+    return runnable
+
+
+def _check_outputs(runnable, param_date, failures):
+    '''
+    校验各报表输出的工作簿路径，与排在前面的报表重名的报表记入failures并跳过，避免后写出的覆盖先写出的；
+    返回可以生成的报表
+    '''
+    owners = {}
+    scheduled = {}
+    for name, module in runnable.items():
+        paths = [os.path.normcase(path) for path in module.output_files(param_date)]
+        clashes = [f"{path}（与报表{owners[path]}相同）" for path in paths if path in owners]
+        if clashes:
+            failures[name] = '输出文件重名: ' + '; '.join(clashes)
+            continue
+        owners.update(dict.fromkeys(paths, name))
+        scheduled[name] = module
+    return scheduled
+
+
+def _generate(runnable, param_date, base_path, match_frames, failures):
+    '''
+    依次调用各报表的main生成报表，对应关系文件按文件名只读取一次；提供main_batch的报表
+    （如各口径的开单情况统计表）按同一main_batch合并为一次调用，共用快照对齐及聚合。
+    工作簿在写出进程中并行写出，全部报表计算完成后等待写出结束，写出失败同样记入failures
+    '''
+    pool = get_writer_pool()
+    batches = {}
+    for name, module in runnable.items():
+        if module.MATCH_FILE not in match_frames:
+            match_frames[module.MATCH_FILE] = get_repository().match(os.path.join(base_path, module.MATCH_FILE))
+        module.abs_path = base_path
+        module.df_match = match_frames[module.MATCH_FILE]
+        batches.setdefault(getattr(module, 'main_batch', name), {})[name] = module
+    for key, modules in batches.items():
+        pool.owner = next(iter(modules))
+        try:
+            if len(modules) == 1:
+                next(iter(modules.values())).main(param_date)
+            else:
+                for name, e in key(param_date, modules).items():
+                    traceback.print_exception(e)
+                    failures[name] = f"{type(e).__name__}: {e}"
+        except Exception as e:
+            traceback.print_exc()
+            for name in modules:
+                failures[name] = f"{type(e).__name__}: {e}"
+    pool.owner = None
+    for name, reason in pool.wait().items():
+        failures[name] = f"{failures[name]}; {reason}" if name in failures else reason
+
+
+def _requests(runnable, param_date):
+    '''汇总多张报表所需的源文件清单'''
+    return [r for module in runnable.values() for r in module.snapshot_requests(param_date)]
+
+
+def run_reports(param_date, names=None, base_path=None):
+    '''
+    在同一进程内生成某日期的多张报表：先汇总全部报表所需的源文件一次性读取，再依次生成
+
+    :param param_date: 8位日期字符串，格式为YYYYMMDD
+    :param names: 报表名列表，为None或包含"all"时生成全部报表
+    :param base_path: 工作目录，默认为当前目录
+    :return: {报表名: 失败原因}，全部成功时为空字典
+    '''
+    base_path = base_path or os.getcwd()
+    names = parse_report_names(names)
+    modules = {name: load_report(name) for name in names}
+
+    failures = {}
+    runnable = _check_inputs(modules, param_date, base_path, failures)
+    runnable = _check_outputs(runnable, param_date, failures)
+
+    # 汇总全部报表所需的源文件，每个文件只解析一次
+    requests = _requests(runnable, param_date)
+    if requests:
+        print(f"开始读取{len(runnable)}张报表所需的源文件...\n")
+        with stage('load', 'preload', 'run_reports'):
+            get_repository().load(requests, os.path.join(base_path, '参考文件'))
+
+    _generate(runnable, param_date, base_path, {}, failures)
+    return failures
+
+
+def run_range(start, end, names=None, base_path=None):
+    '''
+    补跑一段日期的报表：先规划全部日期所需的源文件，每个文件只解析一次；
+    生成当日报表的同时在后台预读下一日的源文件，某文件在之后的日期不再使用时立即释放
+
+    :param start: 起始日期，格式为YYYYMMDD
+    :param end: 结束日期，格式为YYYYMMDD
+    :return: {日期: {报表名: 失败原因}}，只包含有失败的日期
+    '''
+    base_path = base_path or os.getcwd()
+    folder_path = os.path.join(base_path, '参考文件')
+    names = parse_report_names(names)
+    modules = {name: load_report(name) for name in names}
+    repository = get_repository()
+
+    # 规划：每个日期可生成的报表、所需源文件及每个文件最后一次被使用的日期
+    dates = plan_dates(start, end)
+    failures = {d: {} for d in dates}
+    plan = {}
+    last_use = {}
+    for i, param_date in enumerate(dates):
+        runnable = _check_inputs(modules, param_date, base_path, failures[param_date])
+        runnable = _check_outputs(runnable, param_date, failures[param_date])
+        requests = _requests(runnable, param_date)
+        plan[param_date] = (runnable, requests)
+        for _, slot, _ in repository.slots(requests, folder_path):
+            last_use[slot] = i
+    print(f"共{len(dates)}个日期，需读取{len(last_use)}份源文件。\n")
+
+    match_frames = {}
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        prefetch = None
+        for i, param_date in enumerate(dates):
+            runnable, requests = plan[param_date]
+            print(f"========== {param_date} ==========\n")
+            try:
+                with stage('load', 'preload', 'run_reports'):
+                    if prefetch is not None:
+                        prefetch.result()
+                    repository.load(requests, folder_path)
+            except Exception as e:
+                for name in runnable:
+                    failures[param_date][name] = f"{type(e).__name__}: {e}"
+                runnable = {}
+
+            # 后台预读下一日的源文件
+            prefetch = None
+            if i + 1 < len(dates) and plan[dates[i + 1]][1]:
+                prefetch = prefetcher.submit(repository.load, plan[dates[i + 1]][1], folder_path)
+
+            _generate(runnable, param_date, base_path, match_frames, failures[param_date])
+            repository.evict([slot for slot, last in last_use.items() if last == i])
+
+        if prefetch is not None:
+            prefetch.result()
+
+    return {d: f for d, f in failures.items() if f}
+
+
+if __name__ == "__main__":
+
+    # 读取并校验执行参数
+    parser = argparse.ArgumentParser(description='在同一进程内生成某日期（或一段日期）的全部或部分报表')
+    parser.add_argument('args', nargs='*', metavar='[YYYYMMDD] 报表名',
+                        help=f"报表日期（使用--from/--to时省略）及报表名，可选: all, {', '.join(REPORTS)}，默认为all")
+    parser.add_argument('--from', dest='start', help='补跑起始日期，格式为YYYYMMDD')
+    parser.add_argument('--to', dest='end', help='补跑结束日期（含），格式为YYYYMMDD，默认与起始日期相同')
+    parser.add_argument('--side-output', choices=excel_writer.SIDE_OUTPUT_FORMATS,
+                        help='中间表（机构中间表、用户中间表、多日明细情况）改为在工作簿旁写出该格式的文件，工作簿只保留通报用的工作表')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        if args.start:
+            reports = args.args or ['all']
+            plan_dates(args.start, args.end or args.start)
+        elif args.args:
+            reports = args.args[1:] or ['all']
+            datetime.strptime(args.args[0], "%Y%m%d")
+        else:
+            parser.error('请指定报表日期，或使用--from/--to指定日期范围')
+        parse_report_names(reports)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.side_output:
+        excel_writer.SIDE_OUTPUT = args.side_output
+
+    if args.start:
+        params = {'start': args.start, 'end': args.end or args.start, 'reports': reports}
+    else:
+        params = {'param_date': args.args[0], 'reports': reports}
+    try:
+        with profiling(os.getcwd(), 'run_reports', params, args.profile, args.trace_allocations):
+            if args.start:
+                failures = run_range(args.start, args.end or args.start, reports)
+            else:
+                failures = {args.args[0]: run_reports(args.args[0], reports)}
+            get_writer_pool().shutdown()
+        params['failures'] = {d: f for d, f in failures.items() if f}
+    except BaseException as e:
+        # 各报表之外的失败（如预读源文件失败）记入运行报告
+        params['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        # 写出运行报告并输出各阶段的耗时，运行失败时同样写出
+        finish_run(os.getcwd(), 'run_reports', params)
+
+    for param_date, date_failures in failures.items():
+        for name, reason in date_failures.items():
+            print(f"{param_date} 报表{name}生成失败：{reason}\n")
+    sys.exit(1 if any(failures.values()) else 0)
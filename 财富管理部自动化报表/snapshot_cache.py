@@ -0,0 +1,153 @@
+import os
+import hashlib
+import functools
+import pandas as pd
+
+from snapshot_readers import read_snapshot
+from snapshot_schema import SCHEMA, RESERVED_CATEGORIES, TEXT_DTYPE
+
+# 缓存目录建在源文件所在文件夹下，设置环境变量 SNAPSHOT_CACHE=0 可关闭缓存
+CACHE_DIR_NAME = '.snapshot_cache'
+CACHE_ENABLED = os.environ.get('SNAPSHOT_CACHE', '1') != '0'
+
+# 缓存格式的版本号：读取、加工逻辑变化而使已有缓存的内容不再适用时加1，旧缓存随之失效
+CACHE_VERSION = 1
+
+# 列存储类型的指纹，SCHEMA等变化后按旧类型写出的缓存不再命中
+SCHEMA_FINGERPRINT = hashlib.md5(repr((SCHEMA, RESERVED_CATEGORIES, str(TEXT_DTYPE))).encode('utf-8')).hexdigest()[:8]
+
+
+def _columnar_engine():
+    """检测可用的parquet引擎，均未安装时返回None（退回pickle格式）"""
+    for engine in ['pyarrow', 'fastparquet']:
+        try:
+            __import__(engine)
+            return engine
+        except ImportError:
+            continue
+    return None
+
+PARQUET_ENGINE = _columnar_engine()
+
+
+def reader_identity(reader):
+    '''读取函数的标识（模块及限定名），functools.partial取其原函数，传入的参数由缓存键的extra区分'''
+    while isinstance(reader, functools.partial):
+        reader = reader.func
+    return f"{getattr(reader, '__module__', '')}.{getattr(reader, '__qualname__', repr(reader))}"
+
+
+def cache_key(full_path, extra='', reader=None):
+    """
+    根据缓存版本、列存储类型、读取函数及文件绝对路径、大小、修改时间生成缓存键，
+    文件被替换、读取方式或缓存格式变化后键随之变化
+    """
+    stat = os.stat(full_path)
+    identity = reader_identity(reader) if reader is not None else ''
+    raw = (f"v{CACHE_VERSION}|{SCHEMA_FINGERPRINT}|{identity}|"
+           f"{os.path.abspath(full_path)}|{stat.st_size}|{stat.st_mtime_ns}|{extra}")
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def _cache_files(cache_dir, stem):
+    '''列出同一源文件的全部缓存文件（含已过期的旧版本）'''
+    if not os.path.isdir(cache_dir):
+        return []
+    return [f for f in os.listdir(cache_dir) if f.rsplit('-', 1)[0] == stem]
+
+
+def _write_cache(df, cache_dir, stem, key):
+    '''将df写入列式缓存，先写临时文件再原子替换，并清理同名旧缓存'''
+    os.makedirs(cache_dir, exist_ok=True)
+    for old in _cache_files(cache_dir, stem):
+        try:
+            os.remove(os.path.join(cache_dir, old))
+        except OSError:
+            pass
+
+    if PARQUET_ENGINE is not None:
+        target = os.path.join(cache_dir, f"{stem}-{key}.parquet")
+        tmp_path = target + f'.{os.getpid()}.tmp'
+        try:
+            df.to_parquet(tmp_path, engine=PARQUET_ENGINE)
+            os.replace(tmp_path, target)
+            return target
+        except Exception:
+            # 混合类型的object列无法写入parquet时退回pickle
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    target = os.path.join(cache_dir, f"{stem}-{key}.pkl")
+    tmp_path = target + f'.{os.getpid()}.tmp'
+    df.to_pickle(tmp_path)
+    os.replace(tmp_path, target)
+    return target
+
+
+def _cache_location(full_path, extra='', reader=read_snapshot, stamp=''):
+    '''
+    返回缓存目录、缓存文件名前缀及缓存键：extra区分文件名前缀，stamp只计入缓存键，
+    stamp变化后新缓存与旧缓存同名，写入时旧缓存随之清理
+    '''
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(full_path)), CACHE_DIR_NAME)
+    stem = os.path.basename(full_path).replace('-', '_')
+    if extra:
+        stem = f"{stem}.{hashlib.md5(extra.encode('utf-8')).hexdigest()[:8]}"
+    return cache_dir, stem, cache_key(full_path, f"{extra}|{stamp}" if stamp else extra, reader)
+
+
+def cached_path(full_path, extra='', reader=read_snapshot, stamp=''):
+    '''源文件已有有效缓存时返回缓存文件路径，否则返回None'''
+    if not CACHE_ENABLED:
+        return None
+    cache_dir, stem, key = _cache_location(full_path, extra, reader, stamp)
+    for ext in ['.parquet', '.pkl']:
+        cached = os.path.join(cache_dir, f"{stem}-{key}{ext}")
+        if os.path.exists(cached):
+            return cached
+    return None
+
+
+def load_with_cache(full_path, reader=read_snapshot, extra='', stamp=''):
+    '''
+    读取源文件，首次读取后转存为列式缓存，之后按 路径+大小+修改时间 命中缓存直接加载，
+    缓存版本、列存储类型或读取函数不同时不命中
+
+    :param full_path: 源文件完整路径
+    :param reader: 缓存未命中时使用的读取函数
+    :param extra: 附加到缓存键的信息（如读取的列），不同读取方式互不干扰
+    :param stamp: 只附加到缓存键的版本信息（如所依赖的其他文件的缓存键），变化后旧缓存被替换而不是并存
+    :return: DataFrame
+    '''
+    if not CACHE_ENABLED:
+        return reader(full_path)
+
+    cache_dir, stem, key = _cache_location(full_path, extra, reader, stamp)
+    cached = cached_path(full_path, extra, reader, stamp)
+    if cached is not None:
+        try:
+            if cached.endswith('.parquet'):
+                return pd.read_parquet(cached, engine=PARQUET_ENGINE)
+            return pd.read_pickle(cached)
+        except Exception:
+            # 缓存损坏时重新读取源文件
+            pass
+
+    df = reader(full_path)
+    try:
+        _write_cache(df, cache_dir, stem, key)
+    except OSError as e:
+        print(f"写入缓存失败，本次直接使用源文件: {e}\n")
+    return df
+
+
+def clear_cache(folder_path):
+    '''删除文件夹下的全部快照缓存'''
+    cache_dir = os.path.join(folder_path, CACHE_DIR_NAME)
+    if not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    for f in os.listdir(cache_dir):
+        os.remove(os.path.join(cache_dir, f))
+        removed += 1
+    return removed
@@ -0,0 +1,159 @@
+import os
+import sys
+import bisect
+import argparse
+from datetime import datetime
+
+import pandas as pd
+
+from snapshot_cache import PARQUET_ENGINE
+from snapshot_readers import read_snapshot, columns_for
+from snapshot_index import get_index
+
+# 历史库建在源文件所在文件夹下，按 表/date=YYYYMMDD/ 分区存放每日快照
+HISTORY_DIR_NAME = '快照历史库'
+
+# 各表已入库日期的有序列表，按 (历史库目录, 表名) 缓存，写入新分区时失效
+_partition_dates = {}
+
+
+def history_path(folder_path):
+    '''返回源文件夹对应的历史库目录'''
+    return os.path.join(folder_path, HISTORY_DIR_NAME)
+
+
+def _partition_dir(store_path, table, d):
+    return os.path.join(store_path, table, f"date={d.strftime('%Y%m%d')}")
+
+
+def _partition_file(partition_dir):
+    '''返回分区内的数据文件，不存在时返回None'''
+    for name in ['part.parquet', 'part.pkl']:
+        path = os.path.join(partition_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def partition_dates(store_path, table):
+    '''返回某表已入库的全部日期（升序）'''
+    key = (os.path.abspath(store_path), table)
+    if key not in _partition_dates:
+        table_dir = os.path.join(store_path, table)
+        dates = []
+        if os.path.isdir(table_dir):
+            for name in os.listdir(table_dir):
+                if name.startswith('date=') and _partition_file(os.path.join(table_dir, name)):
+                    dates.append(datetime.strptime(name[5:], '%Y%m%d').date())
+        _partition_dates[key] = sorted(dates)
+    return _partition_dates[key]
+
+
+def write_partition(df, store_path, table, d):
+    '''将某日快照写入分区，先写临时文件再原子替换'''
+    partition_dir = _partition_dir(store_path, table, d)
+    os.makedirs(partition_dir, exist_ok=True)
+    old = _partition_file(partition_dir)
+
+    if PARQUET_ENGINE is not None:
+        target = os.path.join(partition_dir, 'part.parquet')
+        tmp_path = target + f'.{os.getpid()}.tmp'
+        df.to_parquet(tmp_path, engine=PARQUET_ENGINE, index=False)
+    else:
+        target = os.path.join(partition_dir, 'part.pkl')
+        tmp_path = target + f'.{os.getpid()}.tmp'
+        df.to_pickle(tmp_path)
+    os.replace(tmp_path, target)
+    if old is not None and old != target:
+        os.remove(old)
+
+    _partition_dates.pop((os.path.abspath(store_path), table), None)
+    return target
+
+
+def read_partition(store_path, table, d):
+    '''读取某表某日的快照，分区不存在时抛出FileNotFoundError'''
+    path = _partition_file(_partition_dir(store_path, table, d))
+    if path is None:
+        raise FileNotFoundError(f"历史库中没有 {table} {d.strftime('%Y%m%d')} 的快照")
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, engine=PARQUET_ENGINE)
+    return pd.read_pickle(path)
+
+
+def snapshot_date_as_of(store_path, table, d):
+    '''返回某表在日期d当天或之前最近一次入库的日期，没有时返回None'''
+    dates = partition_dates(store_path, table)
+    i = bisect.bisect_right(dates, d)
+    return dates[i - 1] if i else None
+
+
+def load_as_of(store_path, table, d, exact=True):
+    '''
+    从历史库读取某表截至日期d的快照
+
+    :param exact: 为True时只返回当天的快照，为False时返回当天或之前最近一次的快照
+    '''
+    if not exact:
+        found = snapshot_date_as_of(store_path, table, d)
+        if found is None:
+            raise FileNotFoundError(f"历史库中没有 {table} 在 {d.strftime('%Y%m%d')} 之前的快照")
+        d = found
+    return read_partition(store_path, table, d)
+
+
+def can_serve(folder_path, table, d, usecols):
+    '''历史库能否替代源文件：分区存在，且入库的列满足读取需要（入库时只保留声明的列）'''
+    store_path = history_path(folder_path)
+    if d not in partition_dates(store_path, table):
+        return False
+    return usecols is not None or columns_for(table) is None
+
+
+def ingest(folder_path, store_path=None, overwrite=False):
+    '''
+    将源文件夹中的每日快照规范化后写入历史库：只保留流水线用到的列并统一类型
+
+    :param folder_path: 源文件所在文件夹
+    :param store_path: 历史库目录，默认为源文件夹下的快照历史库
+    :param overwrite: 为True时重新写入已入库的日期
+    :return: [(表名, 日期, 行数), ...] 本次写入的快照
+    '''
+    store_path = store_path or history_path(folder_path)
+    # 同一表同一日期有多个扩展名时按 xlsx、xls、csv 的顺序取一个
+    index = get_index(folder_path)
+    sources = {key: index.find(key[0], key[1], ['.xlsx', '.xls', '.csv']) for key in index.files}
+
+    written = []
+    for (table, d), source in sorted(sources.items()):
+        if not overwrite and d in partition_dates(store_path, table):
+            continue
+        df = read_snapshot(source.path, usecols=columns_for(table))
+        write_partition(df, store_path, table, d)
+        written.append((table, d, len(df)))
+    return written
+
+
+if __name__ == "__main__":
+
+    # 读取并校验执行参数
+    parser = argparse.ArgumentParser(description='每日快照历史库：入库及查看')
+    parser.add_argument('command', choices=['ingest', 'list'], help='ingest: 源文件入库；list: 查看已入库的日期')
+    parser.add_argument('folder', nargs='?', default=os.path.join(os.getcwd(), '参考文件'), help='源文件所在文件夹，默认为 ./参考文件')
+    parser.add_argument('--store', help='历史库目录，默认为源文件夹下的快照历史库')
+    parser.add_argument('--overwrite', action='store_true', help='重新写入已入库的日期')
+    args = parser.parse_args()
+
+    store_path = args.store or history_path(args.folder)
+    if args.command == 'ingest':
+        written = ingest(args.folder, store_path, args.overwrite)
+        for table, d, rows in written:
+            print(f"已入库：{table} {d.strftime('%Y%m%d')}（{rows}行）")
+        print(f"\n共入库{len(written)}份快照，历史库位于：{store_path}\n")
+    else:
+        if not os.path.isdir(store_path):
+            print(f"历史库不存在：{store_path}")
+            sys.exit(1)
+        for table in sorted(os.listdir(store_path)):
+            dates = partition_dates(store_path, table)
+            print(f"{table}: {', '.join(d.strftime('%Y%m%d') for d in dates)}")
@@ -0,0 +1,98 @@
+import os
+import re
+import bisect
+import threading
+from datetime import datetime
+from collections import namedtuple
+
+# 源文件名形如 "投资理财中收统计表20250319.xls"：表名 + 8位日期 + 扩展名
+SOURCE_FILE_PATTERN = re.compile(r'^(?P<table>.+?)(?P<date>\d{8})(?P<ext>\.(?:xlsx|xls|csv))$')
+
+SnapshotFile = namedtuple('SnapshotFile', ['table', 'date', 'ext', 'path', 'size', 'mtime_ns'])
+
+
+def parse_source_name(filename):
+    '''将源文件名解析为 (表名, 日期, 扩展名)，不符合命名规则时返回None'''
+    m = SOURCE_FILE_PATTERN.match(filename)
+    if m is None:
+        return None
+    try:
+        d = datetime.strptime(m.group('date'), '%Y%m%d').date()
+    except ValueError:
+        return None
+    return m.group('table'), d, m.group('ext')
+
+
+class SnapshotIndex:
+    '''
+    源文件夹索引：一次扫描目录，将每个文件名解析为 (表, 日期, 扩展名, 大小, 修改时间)，
+    之后按 (表, 日期) 直接查找文件，按表查找某日之前最近的快照
+    '''
+
+    def __init__(self, folder_path):
+        self.folder_path = os.path.abspath(folder_path)
+        self.files = {}
+        self.dates = {}
+        self.scanned_mtime_ns = None
+        self.scan()
+
+    def scan(self):
+        '''扫描目录并重建索引'''
+        files = {}
+        dates = {}
+        self.scanned_mtime_ns = os.stat(self.folder_path).st_mtime_ns
+        with os.scandir(self.folder_path) as entries:
+            for entry in entries:
+                parsed = parse_source_name(entry.name)
+                if parsed is None or not entry.is_file():
+                    continue
+                table, d, ext = parsed
+                stat = entry.stat()
+                files.setdefault((table, d), {})[ext] = SnapshotFile(
+                    table, d, ext, entry.path, stat.st_size, stat.st_mtime_ns)
+        for table, d in files:
+            dates.setdefault(table, []).append(d)
+        for table in dates:
+            dates[table].sort()
+        self.files = files
+        self.dates = dates
+
+    def is_stale(self):
+        '''目录在扫描后有文件增删时返回True'''
+        return os.stat(self.folder_path).st_mtime_ns != self.scanned_mtime_ns
+
+    def find(self, table, d, exts):
+        '''按扩展名优先顺序返回某表某日的文件，不存在时返回None'''
+        candidates = self.files.get((table, d))
+        if not candidates:
+            return None
+        for ext in exts:
+            if ext in candidates:
+                return candidates[ext]
+        return None
+
+    def latest_before(self, table, d, inclusive=True):
+        '''返回某表在日期d（inclusive为False时不含当天）之前最近一份快照的日期，没有时返回None'''
+        dates = self.dates.get(table, [])
+        i = bisect.bisect_right(dates, d) if inclusive else bisect.bisect_left(dates, d)
+        return dates[i - 1] if i else None
+
+    def tables(self):
+        '''返回目录中出现的全部表名'''
+        return sorted(self.dates)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(folder_path):
+    '''返回源文件夹的索引，同一文件夹在进程内只扫描一次，目录有文件增删时重新扫描'''
+    folder = os.path.abspath(folder_path)
+    with _indexes_lock:
+        index = _indexes.get(folder)
+        if index is None:
+            index = _indexes[folder] = SnapshotIndex(folder)
+        elif index.is_stale():
+            index.scan()
+        return index
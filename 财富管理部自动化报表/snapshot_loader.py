@@ -0,0 +1,98 @@
+import os
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from snapshot_cache import load_with_cache, cached_path
+from snapshot_readers import read_snapshot, columns_for
+from snapshot_index import get_index
+from run_metrics import timed
+
+# 并行读取的进程数，设置环境变量 SNAPSHOT_WORKERS=1 可退回串行读取
+MAX_WORKERS = int(os.environ.get('SNAPSHOT_WORKERS', '0')) or os.cpu_count() or 1
+
+DEFAULT_EXTS = ['.csv', '.xlsx', '.xls']
+
+
+def resolve_file(folder_path, filename_str, d, exts=DEFAULT_EXTS):
+    '''按关键词及日期在源文件夹索引中查找文件，按扩展名顺序取第一个存在的，返回完整路径'''
+    found = get_index(folder_path).find(filename_str, d, exts)
+    if found is None:
+        filename = filename_str + f"{d.strftime('%Y%m%d')}"
+        raise FileNotFoundError(f"未找到文件: {filename}[{'|'.join(exts)}]")
+    return found.path
+
+
+def _cache_extra(usecols):
+    '''按读取的列区分缓存，整表读取与按列读取的缓存互不干扰'''
+    return '|'.join(usecols) if usecols else ''
+
+
+def _read_file(job):
+    '''读取单个文件，失败时统一抛出ValueError'''
+    full_path, usecols = job
+    try:
+        if usecols is None:
+            return load_with_cache(full_path)
+        return load_with_cache(full_path, reader=partial(read_snapshot, usecols=list(usecols)),
+                               extra=_cache_extra(usecols))
+    except Exception as e:
+        raise ValueError(f"读取文件 {full_path} 失败: {e}")
+
+
+def read_files(jobs, max_workers=None):
+    '''
+    读取一组文件并返回 {(路径, 读取列): DataFrame}
+    已有缓存的文件在本进程直接加载，其余文件同时分发到进程池解析
+
+    :param jobs: [(路径, 读取列元组或None), ...]
+    '''
+    jobs = list(dict.fromkeys(jobs))
+    max_workers = max_workers or MAX_WORKERS
+
+    result = {}
+    pending = []
+    for job in jobs:
+        if cached_path(job[0], _cache_extra(job[1])) is not None:
+            result[job] = _read_file(job)
+        else:
+            pending.append(job)
+
+    if len(pending) <= 1 or max_workers <= 1:
+        for job in pending:
+            result[job] = _read_file(job)
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(pending))) as pool:
+            for job, df in zip(pending, pool.map(_read_file, pending)):
+                result[job] = df
+    return result
+
+
+def load_snapshots(requests, folder_path, max_workers=None, projected=True):
+    '''
+    一次性读取多类源文件
+
+    :param requests: [(文件关键词, {键: 日期}, 扩展名列表或None), ...]
+    :param folder_path: 源文件所在文件夹
+    :param projected: 为True时只读取snapshot_readers中声明的列
+    :return: {键: DataFrame}，各类文件的键合并在同一字典中
+    '''
+    # 先确认全部文件存在，再开始耗时的解析
+    key_jobs = {}
+    for request in requests:
+        filename_str, dates = request[0], request[1]
+        exts = request[2] if len(request) > 2 and request[2] else DEFAULT_EXTS
+        usecols = columns_for(filename_str) if projected else None
+        usecols = tuple(usecols) if usecols else None
+        for key, d in dates.items():
+            key_jobs[key] = (resolve_file(folder_path, filename_str, d, exts), usecols)
+
+    frames = read_files(key_jobs.values(), max_workers)
+    return {key: frames[job] for key, job in key_jobs.items()}
+
+
+@timed('load')
+def find_file_and_load(dict, folder_path, filename_str, exts=DEFAULT_EXTS):
+    '''
+    根据参数字典到对应文件夹获取带有关键词的文件，读取为df并存储在字典中
+    '''
+    return load_snapshots([(filename_str, dict, exts)], folder_path)
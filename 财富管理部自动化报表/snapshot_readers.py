@@ -0,0 +1,289 @@
+import codecs
+import importlib.util
+import warnings
+import zipfile
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+
+# 忽略读取警告
+warnings.filterwarnings('ignore', category=UserWarning, message="Workbook contains no default style")
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_ROW = f'{_NS}row'
+
+# 文件头特征：OOXML为zip压缩包，旧版xls为OLE2复合文档（BIFF）
+_ZIP_MAGIC = b'PK\x03\x04'
+_BIFF_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+# 源文件前两行为标题，第三行为表头（对应 read_excel 的 header=2）
+HEADER_ROW = 2
+
+# 各类快照表在流水线中实际用到的列，未声明的表仍整表读取
+SNAPSHOT_COLUMNS = {
+    '理财经理详细信息': ['序号', '柜员号', '姓名', '总行/一级分行名称', '二级分行名称', '一级支行名称'],
+    '投资理财销售量统计表': ['人员工号', '理财', '资产管理计划', '保险', '基金', '实物贵金属', '黄金积存', '合计'],
+    '投资理财销售量统计表-权益': ['人员工号', '基金', '合计'],
+    '投资理财中收统计表': ['人员工号', '理财', '资产管理计划', '保险', '基金', '实物贵金属', '黄金积存', '合计'],
+}
+
+# 金额列统一解码为float64，其余列按内容推断类型
+AMOUNT_COLUMNS = ['理财', '资产管理计划', '保险', '基金', '实物贵金属', '黄金积存', '合计']
+
+
+def columns_for(filename_str):
+    '''返回某类快照表需要读取的列，未声明时返回None'''
+    return SNAPSHOT_COLUMNS.get(filename_str)
+
+
+def _decode_column(name, values):
+    '''将单列取值转换为带类型的数组，数值型字符串与read_excel一样转换为数字'''
+    if name in AMOUNT_COLUMNS:
+        return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').astype('float64')
+
+    series = pd.Series(values)
+    if series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+        try:
+            series = pd.to_numeric(series)
+        except (ValueError, TypeError):
+            return series
+    # 整数值的浮点列（如序号 1.0）还原为整数
+    if series.dtype.kind == 'f' and series.notna().all() and np.equal(np.mod(series, 1), 0).all():
+        series = series.astype('int64')
+    return series
+
+
+def _column_index(ref):
+    '''将单元格引用（如 "AB12"）转换为从0开始的列序号'''
+    index = 0
+    for ch in ref:
+        if 'A' <= ch <= 'Z':
+            index = index * 26 + ord(ch) - 64
+        else:
+            break
+    return index - 1
+
+
+def _first_sheet_path(archive):
+    '''从workbook.xml及其关系文件中找到第一个工作表在压缩包中的路径'''
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    sheet = workbook.find(f'{_NS}sheets/{_NS}sheet')
+    rel_id = sheet.get(f'{_REL_NS}id')
+    rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels:
+        if rel.get('Id') == rel_id:
+            target = rel.get('Target')
+            return target.lstrip('/') if target.startswith('/') else 'xl/' + target
+    raise ValueError('工作簿中未找到工作表')
+
+
+def _shared_strings(archive):
+    '''读取共享字符串表，文件中不存在时返回空列表'''
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == f'{_NS}si':
+                strings.append(''.join(t.text or '' for t in elem.iter(f'{_NS}t')))
+                elem.clear()
+    return strings
+
+
+def _cell_value(cell, shared):
+    '''按单元格类型解码取值，与openpyxl只读模式的结果保持一致'''
+    cell_type = cell.get('t', 'n')
+    if cell_type == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iter(f'{_NS}t'))
+    v = cell.find(f'{_NS}v')
+    if v is None or v.text is None:
+        return None
+    if cell_type == 's':
+        return shared[int(v.text)]
+    if cell_type in ('str', 'e'):
+        return v.text
+    if cell_type == 'b':
+        return v.text == '1'
+    if '.' in v.text or 'E' in v.text or 'e' in v.text:
+        return float(v.text)
+    return int(v.text)
+
+
+def read_excel_columns(full_path, usecols, header=HEADER_ROW):
+    '''
+    流式解析xlsx工作表XML，跳过标题行后只解码声明的列，不加载样式及其余单元格
+
+    :param full_path: 源文件完整路径（按文件内容读取，以.xls命名的xlsx文件同样适用）
+    :param usecols: 需要读取的列名列表，文件中不存在的列将被忽略
+    :param header: 表头所在行（从0开始计数）
+    :return: 仅包含所需列的DataFrame
+    '''
+    header_row = header + 1
+    with zipfile.ZipFile(full_path) as archive:
+        shared = _shared_strings(archive)
+        sheet_path = _first_sheet_path(archive)
+
+        positions = None
+        columns = {}
+        with archive.open(sheet_path) as f:
+            for _, elem in ET.iterparse(f):
+                if elem.tag != _ROW:
+                    continue
+                row_num = int(elem.get('r', 0))
+                if row_num < header_row:
+                    elem.clear()
+                    continue
+
+                # 按列序号取出本行需要的单元格
+                cells = {}
+                position = -1
+                for cell in elem:
+                    ref = cell.get('r')
+                    position = _column_index(ref) if ref else position + 1
+                    if positions is None or position in positions:
+                        cells[position] = _cell_value(cell, shared)
+                elem.clear()
+
+                if positions is None:
+                    # 表头行：记录所需列所在位置
+                    positions = {}
+                    for i, value in sorted(cells.items()):
+                        if value in usecols and value not in positions.values():
+                            positions[i] = value
+                    columns = {i: [] for i in positions}
+                    continue
+
+                picked = [cells.get(i) for i in positions]
+                # 跳过空行（导出文件末尾常带有空白行）
+                if all(v is None or v == '' for v in picked):
+                    continue
+                for i, v in zip(positions, picked):
+                    columns[i].append(None if v == '' else v)
+
+    if positions is None:
+        return pd.DataFrame(columns=[])
+    order = sorted(positions, key=lambda i: usecols.index(positions[i]))
+    return pd.DataFrame({positions[i]: _decode_column(positions[i], columns[i]) for i in order})
+
+
+def _finalize(df, usecols):
+    '''统一各读取引擎的输出：只保留所需列、去掉空行，并按与流式读取相同的规则解码类型'''
+    names = [c for c in usecols if c in df.columns]
+    df = df[names].dropna(how='all').reset_index(drop=True)
+    return pd.DataFrame({name: _decode_column(name, df[name].tolist()) for name in names})
+
+
+def _excel_with_pandas(engine):
+    '''生成基于pandas.read_excel的读取函数，以文件句柄传入，由引擎按内容识别格式'''
+    def reader(full_path, usecols=None, header=HEADER_ROW):
+        with open(full_path, 'rb') as f:
+            df = pd.read_excel(f, engine=engine, header=header,
+                               usecols=(lambda c: c in usecols) if usecols else None)
+        return df if usecols is None else _finalize(df, usecols)
+    return reader
+
+
+def _read_stream(full_path, usecols=None, header=HEADER_ROW):
+    '''流式XML读取，只支持按列读取，整表读取交给openpyxl'''
+    if usecols is None:
+        return _excel_with_pandas('openpyxl')(full_path, None, header)
+    return read_excel_columns(full_path, usecols, header)
+
+
+def sniff_encoding(full_path, size=65536):
+    '''判断csv文件编码：能按utf-8解码则为utf-8，否则按gb18030读取'''
+    with open(full_path, 'rb') as f:
+        head = f.read(size)
+    try:
+        codecs.getincrementaldecoder('utf-8-sig')().decode(head, final=False)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'gb18030'
+
+
+def _csv_reader(engine):
+    '''生成csv读取函数，csv文件第一行即为表头'''
+    def reader(full_path, usecols=None, header=0):
+        encoding = sniff_encoding(full_path)
+        names = None
+        if usecols is not None:
+            present = pd.read_csv(full_path, nrows=0, encoding=encoding).columns
+            names = [c for c in usecols if c in present]
+        df = pd.read_csv(full_path, engine=engine, encoding=encoding, header=header, usecols=names)
+        return df if usecols is None else _finalize(df, usecols)
+    return reader
+
+
+def sniff_format(full_path):
+    '''按文件头判断真实格式，不依赖扩展名：xlsx（OOXML压缩包）、biff（旧版xls）或csv'''
+    with open(full_path, 'rb') as f:
+        head = f.read(8)
+    if head.startswith(_ZIP_MAGIC):
+        return 'xlsx'
+    if head.startswith(_BIFF_MAGIC):
+        return 'biff'
+    return 'csv'
+
+
+# 各格式可用的读取引擎，按优先级排列：(引擎名, 依赖的模块, 读取函数)
+READERS = {'xlsx': [], 'biff': [], 'csv': []}
+
+
+def register_reader(fmt, engine, func, requires=None, first=False):
+    '''
+    注册读取引擎
+
+    :param fmt: 文件格式（xlsx/biff/csv）
+    :param engine: 引擎名
+    :param func: 读取函数 func(full_path, usecols=None)
+    :param requires: 引擎依赖的第三方模块名，未安装时自动跳过
+    :param first: 为True时放在最高优先级
+    '''
+    entry = (engine, requires, func)
+    READERS[fmt] = [e for e in READERS.get(fmt, []) if e[0] != engine]
+    if first:
+        READERS[fmt].insert(0, entry)
+    else:
+        READERS[fmt].append(entry)
+
+
+def available_engines(fmt):
+    '''返回某格式在当前环境下可用的 [(引擎名, 读取函数)]'''
+    return [(engine, func) for engine, requires, func in READERS.get(fmt, [])
+            if requires is None or importlib.util.find_spec(requires) is not None]
+
+
+def pick_reader(fmt, engine=None):
+    '''选择引擎：指定引擎名时使用该引擎，否则取优先级最高的可用引擎'''
+    engines = available_engines(fmt)
+    if engine is not None:
+        engines = [e for e in engines if e[0] == engine]
+    if not engines:
+        raise ValueError(f"没有可读取{fmt}格式文件的引擎" + (f": {engine}" if engine else ''))
+    return engines[0]
+
+
+# 优先级依据 benchmark_readers.py 在参考文件上的测试结果：calamine最快；
+# 未安装calamine时xlsx走流式XML读取，旧版xls走xlrd，csv优先用pyarrow多线程读取
+register_reader('xlsx', 'calamine', _excel_with_pandas('calamine'), requires='python_calamine')
+register_reader('xlsx', 'stream', _read_stream)
+register_reader('xlsx', 'openpyxl', _excel_with_pandas('openpyxl'), requires='openpyxl')
+register_reader('biff', 'calamine', _excel_with_pandas('calamine'), requires='python_calamine')
+register_reader('biff', 'xlrd', _excel_with_pandas('xlrd'), requires='xlrd')
+register_reader('csv', 'pyarrow', _csv_reader('pyarrow'), requires='pyarrow')
+register_reader('csv', 'c', _csv_reader('c'))
+
+
+def read_snapshot(full_path, usecols=None, engine=None):
+    '''
+    读取快照文件：先按文件头识别真实格式，再交给该格式最快的可用引擎
+
+    :param full_path: 源文件完整路径
+    :param usecols: 需要读取的列，为None时整表读取
+    :param engine: 指定引擎名，为None时自动选择
+    :return: DataFrame
+    '''
+    fmt = sniff_format(full_path)
+    _, reader = pick_reader(fmt, engine)
+    return reader(full_path, usecols)
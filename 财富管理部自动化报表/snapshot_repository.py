@@ -0,0 +1,185 @@
+import os
+import threading
+import contextlib
+import pandas as pd
+
+from snapshot_loader import DEFAULT_EXTS, MAX_WORKERS, resolve_file, read_files
+from snapshot_readers import columns_for
+from snapshot_cache import load_with_cache
+from snapshot_history import can_serve, history_path, read_partition
+from snapshot_schema import apply_schema
+from org_dimension import load_dimension
+
+
+class SnapshotRepository:
+    '''
+    进程内快照仓库：按 (源文件夹, 表, 日期, 读取列) 缓存已读取的DataFrame，
+    并按 (花名册, 对应关系表, 关联键, 输出列) 缓存加工后的花名册，
+    同一进程内生成多张报表时每个源文件只解析一次、每份花名册只关联一次；
+    花名册的机构及组别取自持久化的机构维表，源文件未变化时不再按字符串关联
+    '''
+
+    def __init__(self, max_workers=None, projected=True):
+        self.max_workers = max_workers or MAX_WORKERS
+        self.projected = projected
+        self.frames = {}
+        self.rosters = {}
+        self.matches = {}
+        # 已读取DataFrame对应的源文件路径，用于判断机构维表是否需要重新生成
+        self.sources = {}
+        # 实际读取过的源文件路径（含命中磁盘缓存的），用于核对重复读取
+        self.loaded_files = []
+        self._lock = threading.Lock()
+
+    def _usecols(self, filename_str):
+        '''按是否按列读取返回某类表需要的列元组'''
+        usecols = columns_for(filename_str) if self.projected else None
+        return tuple(usecols) if usecols else None
+
+    def slots(self, requests, folder_path):
+        '''
+        将读取清单展开为仓库中的存放位置，不读取文件
+
+        :return: [(键, (源文件夹, 表, 日期, 读取列), 扩展名列表), ...]
+        '''
+        folder = os.path.abspath(folder_path)
+        result = []
+        for request in requests:
+            filename_str, dates = request[0], request[1]
+            exts = request[2] if len(request) > 2 and request[2] else DEFAULT_EXTS
+            usecols = self._usecols(filename_str)
+            for key, d in dates.items():
+                result.append((key, (folder, filename_str, d, usecols), exts))
+        return result
+
+    def load(self, requests, folder_path):
+        '''
+        读取多类源文件，已在仓库中的(表, 日期)直接复用，其余文件一次性并行读取，
+        源文件不存在而历史库中已入库的日期直接从历史库读取
+
+        :param requests: [(文件关键词, {键: 日期}, 扩展名列表或None), ...]
+        :param folder_path: 源文件所在文件夹
+        :return: {键: DataFrame}
+        '''
+        key_slots = {}
+        pending = {}
+        archived = []
+        missing = []
+        for key, slot, exts in self.slots(requests, folder_path):
+            key_slots[key] = slot
+            if slot in self.frames or slot in pending or slot in archived:
+                continue
+            folder, filename_str, d, usecols = slot
+            # 先确认全部文件存在，再开始耗时的解析；源文件已删除时从历史库读取
+            try:
+                pending[slot] = (resolve_file(folder, filename_str, d, exts), usecols)
+            except FileNotFoundError as e:
+                if can_serve(folder, filename_str, d, usecols):
+                    archived.append(slot)
+                else:
+                    missing.append(str(e))
+        if missing:
+            raise FileNotFoundError('; '.join(dict.fromkeys(missing)))
+
+        loaded = {}
+        if pending:
+            frames = read_files(pending.values(), self.max_workers)
+            for slot, job in pending.items():
+                loaded[slot] = frames[job]
+        for slot in archived:
+            folder, filename_str, d, _ = slot
+            loaded[slot] = read_partition(history_path(folder), filename_str, d)
+
+        # 按声明的类型存放：工号为整数，机构及组别为分类，姓名为Arrow字符串
+        loaded = {slot: apply_schema(df) for slot, df in loaded.items()}
+
+        # 预读线程与主线程可能同时写入
+        with self._lock:
+            self.frames.update(loaded)
+            self.sources.update((id(loaded[slot]), job[0]) for slot, job in pending.items())
+            self.loaded_files.extend(dict.fromkeys(job[0] for job in pending.values()))
+            self.loaded_files.extend(f"{history_path(slot[0])}:{slot[1]}:{slot[2].strftime('%Y%m%d')}"
+                                     for slot in archived)
+            return {key: self.frames[slot] for key, slot in key_slots.items()}
+
+    def match(self, path):
+        '''读取分行全简称对应及组别分类，经列式缓存读取且同一文件在进程内只读取一次'''
+        path = os.path.abspath(path)
+        with self._lock:
+            if path not in self.matches:
+                df_match = load_with_cache(path, reader=pd.read_excel)
+                self.matches[path] = df_match
+                self.sources[id(df_match)] = path
+            return self.matches[path]
+
+    def roster(self, df_manager, df_match, on, columns):
+        '''
+        返回与分行对应关系关联后的花名册，同一组参数只关联一次；
+        与 pd.merge(df_manager, df_match, on=on, how='left')[columns] 的结果相同
+
+        :param df_manager: 理财经理详细信息
+        :param df_match: 分行全简称对应及组别分类
+        :param on: 关联键
+        :param columns: 输出列
+        '''
+        key = (id(df_manager), id(df_match), on, tuple(columns))
+        if key not in self.rosters:
+            dimension = load_dimension(df_manager, df_match, on,
+                                       self.sources.get(id(df_manager)), self.sources.get(id(df_match)))
+            # 维表与花名册逐行对应，按位置拼接
+            df_manager_match = pd.concat([df_manager.reset_index(drop=True),
+                                          dimension.drop(columns=['柜员号', on])], axis=1)
+            # 同时保留两张输入表的引用，避免其被回收后id被复用
+            self.rosters[key] = (df_manager, df_match, apply_schema(df_manager_match[columns]))
+        return self.rosters[key][2]
+
+    def evict(self, slots):
+        '''释放不再需要的快照，以及由这些花名册加工出的结果'''
+        with self._lock:
+            released = set()
+            for slot in slots:
+                df = self.frames.pop(slot, None)
+                if df is not None:
+                    released.add(id(df))
+                    self.sources.pop(id(df), None)
+            for key in [k for k in self.rosters if k[0] in released]:
+                del self.rosters[key]
+
+    def clear(self):
+        '''释放仓库中的全部数据'''
+        self.frames.clear()
+        self.rosters.clear()
+        self.matches.clear()
+        self.sources.clear()
+        self.loaded_files.clear()
+
+
+_repository = None
+
+# 各线程在 use_repository 块内改用的仓库
+_local = threading.local()
+
+
+def get_repository():
+    '''返回当前使用的快照仓库：use_repository块内为指定的仓库，否则为进程内共享的仓库'''
+    global _repository
+    override = getattr(_local, 'repository', None)
+    if override is not None:
+        return override
+    if _repository is None:
+        _repository = SnapshotRepository()
+    return _repository
+
+
+@contextlib.contextmanager
+def use_repository(repository):
+    '''
+    在with块内（仅限当前线程）改用指定的快照仓库，块内读取的快照及加工的花名册只缓存在该仓库中，
+    供库调用方隔离或按需释放，不占用进程内共享的仓库
+    '''
+    previous = getattr(_local, 'repository', None)
+    _local.repository = repository
+    try:
+        yield repository
+    finally:
+        _local.repository = previous
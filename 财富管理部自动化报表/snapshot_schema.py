@@ -0,0 +1,85 @@
+import importlib.util
+import pandas as pd
+
+from snapshot_readers import AMOUNT_COLUMNS
+
+# 姓名等文本列使用Arrow存储的字符串，未安装pyarrow时使用pandas自带的字符串类型
+TEXT_DTYPE = pd.StringDtype('pyarrow' if importlib.util.find_spec('pyarrow') else 'python')
+
+# 快照表及花名册各列的存储类型：工号为整数，机构及组别为分类，金额为定长浮点
+SCHEMA = {
+    '序号': 'int32',
+    '柜员号': 'int64',
+    '人员工号': 'int64',
+    '姓名': TEXT_DTYPE,
+    '总行/一级分行名称': 'category',
+    '二级分行名称': 'category',
+    '一级支行名称': 'category',
+    '分行': 'category',
+    '组别': 'category',
+    **{col: 'float64' for col in AMOUNT_COLUMNS + ['理财/资管', '贵金属', '4类业务合计']},
+}
+
+# 分类列中始终保留的类别，保证补缺时不必临时增加类别
+RESERVED_CATEGORIES = {
+    '组别': ['无组别'],
+}
+
+
+def _convert(series, dtype):
+    '''按声明类型转换单列，无法无损转换的列（如含空值的工号）保持原类型'''
+    if dtype == 'category':
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = series.cat.categories
+        else:
+            categories = pd.Index(series.dropna().unique()).sort_values()
+        extra = [c for c in RESERVED_CATEGORIES.get(series.name, []) if c not in categories]
+        if extra:
+            categories = categories.append(pd.Index(extra))
+        if isinstance(series.dtype, pd.CategoricalDtype) and not extra:
+            return series
+        return series.astype(pd.CategoricalDtype(categories))
+
+    if series.dtype == dtype:
+        return series
+    if pd.api.types.is_integer_dtype(pd.api.types.pandas_dtype(dtype)):
+        if series.isna().any():
+            return series
+        if series.dtype.kind == 'f' and not (series % 1 == 0).all():
+            return series
+    try:
+        return series.astype(dtype)
+    except (ValueError, TypeError):
+        return series
+
+
+def apply_schema(df):
+    '''按SCHEMA转换df中已声明的列，返回新的DataFrame'''
+    converted = {col: _convert(df[col], SCHEMA[col]) for col in df.columns if col in SCHEMA}
+    changed = {col: s for col, s in converted.items() if s is not df[col]}
+    if not changed:
+        return df
+    df = df.copy(deep=False)
+    for col, s in changed.items():
+        df[col] = s
+    return df
+
+
+def fill_missing(df, value):
+    '''
+    左关联后补缺，与DataFrame.fillna一致；分类列缺失且补缺值不在类别中时先增加该类别
+
+    :param value: 补缺值，或 {列名: 补缺值}
+    '''
+    values = value if isinstance(value, dict) else {col: value for col in df.columns}
+    df = df.copy(deep=False)
+    for col, fill in values.items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if not series.isna().any():
+            continue
+        if isinstance(series.dtype, pd.CategoricalDtype) and fill not in series.cat.categories:
+            series = series.cat.add_categories([fill])
+        df[col] = series.fillna(fill)
+    return df
@@ -0,0 +1,112 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from snapshot_schema import fill_missing
+
+
+class SnapshotTensor:
+    '''
+    理财经理×资产×快照 的稠密数组：各日快照只按工号对齐到花名册一次，
+    行与花名册逐行对应，资产及快照均按名称取用，不再为每个日期关联出一张宽表
+    '''
+
+    def __init__(self, roster, values, assets, labels, key='柜员号'):
+        '''
+        :param roster: 花名册，与values的第一维逐行对应
+        :param values: 人员数×资产数×快照数 的float64数组
+        :param assets: 资产列名
+        :param labels: 快照标签，如 today、ld、lw、lm
+        '''
+        self.roster = roster.reset_index(drop=True)
+        self.values = values
+        self.assets = list(assets)
+        self.labels = list(labels)
+        self.key = key
+        self._asset_pos = {asset: i for i, asset in enumerate(self.assets)}
+        self._label_pos = {label: i for i, label in enumerate(self.labels)}
+
+    @classmethod
+    def from_snapshots(cls, roster, snapshots, assets, key='柜员号', on='人员工号', derived=None, fill=None):
+        '''
+        将各日快照按工号对齐到花名册后堆叠，与逐日 pd.merge(花名册, 快照, how='left') 的结果相同；
+        快照中同一工号有多行时发出警告并取首次出现的一行（pd.merge会使该人员在结果中重复出现）
+
+        :param roster: 花名册（只保留需要输出的列）
+        :param snapshots: {快照标签: 快照DataFrame}
+        :param assets: 资产列，按输出顺序排列
+        :param key: 花名册中的关联键
+        :param on: 快照中的关联键
+        :param derived: {派生列: [源列, ...]}，按顺序逐列相加，可引用前面的派生列
+        :param fill: 补缺值，快照中没有的人员及花名册中的空值统一补为该值，为None时保留空值
+        '''
+        derived = derived or {}
+        keys = roster[key].to_numpy()
+        # 需要从快照中读取的列：非派生的资产列及派生列的源列
+        sources = [asset for asset in assets if asset not in derived]
+        sources += [col for cols in derived.values() for col in cols if col not in derived and col not in sources]
+
+        values = np.empty((len(roster), len(assets), len(snapshots)), dtype='float64')
+        for j, (label, df) in enumerate(snapshots.items()):
+            df = df[df[on].notna()]
+            duplicated = df[on].duplicated()
+            if duplicated.any():
+                examples = ', '.join(map(str, df.loc[duplicated, on].unique()[:5]))
+                warnings.warn(f"快照{label}中{on}有{int(duplicated.sum())}行重复（如 {examples}），按首次出现的行对齐",
+                              stacklevel=2)
+                df = df[~duplicated]
+            index = pd.Index(df[on])
+            positions = index.get_indexer(keys)
+            columns = {}
+            for col in sources:
+                aligned = df[col].to_numpy(dtype='float64', na_value=np.nan)[positions]
+                aligned[positions < 0] = np.nan
+                columns[col] = aligned
+            for name, cols in derived.items():
+                total = columns[cols[0]]
+                for col in cols[1:]:
+                    total = total + columns[col]
+                columns[name] = total
+            for i, asset in enumerate(assets):
+                values[:, i, j] = columns[asset]
+
+        if fill is not None:
+            values[np.isnan(values)] = fill
+            roster = fill_missing(roster, fill)
+        return cls(roster, values, assets, snapshots.keys(), key)
+
+    @classmethod
+    def concat(cls, tensors, suffixes):
+        '''按资产维拼接同一花名册、同一组快照的多个数组，资产列名分别加后缀'''
+        first = tensors[0]
+        for tensor in tensors[1:]:
+            if tensor.labels != first.labels or len(tensor.roster) != len(first.roster):
+                raise ValueError("只能拼接同一花名册、同一组快照的数组")
+        assets = [f"{asset}{suffix}" for tensor, suffix in zip(tensors, suffixes) for asset in tensor.assets]
+        values = np.concatenate([tensor.values for tensor in tensors], axis=1)
+        return cls(first.roster, values, assets, first.labels, first.key)
+
+    def asset_index(self, assets):
+        return [self._asset_pos[asset] for asset in assets]
+
+    def label_index(self, label):
+        return self._label_pos[label]
+
+    def get(self, asset, label):
+        '''某项资产某日快照的一维数组'''
+        return self.values[:, self._asset_pos[asset], self._label_pos[label]]
+
+    def slice(self, assets, label):
+        '''若干资产某日快照的 人员数×资产数 数组'''
+        return self.values[:, self.asset_index(assets), self._label_pos[label]]
+
+    def series(self, asset, label):
+        '''某项资产某日快照，与花名册同索引的Series'''
+        return pd.Series(self.get(asset, label), index=self.roster.index, name=asset)
+
+    def frame(self, label, assets=None):
+        '''某日快照还原为DataFrame：花名册列在前，资产列在后'''
+        assets = self.assets if assets is None else assets
+        data = pd.DataFrame(self.slice(assets, label), index=self.roster.index, columns=assets)
+        return pd.concat([self.roster, data], axis=1)
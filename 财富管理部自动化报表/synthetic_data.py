@@ -0,0 +1,438 @@
+import os
+import json
+import argparse
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from workbook_pool import WorkbookJob, get_writer_pool
+
+# 一级分行：(全称, 简称)，超过列表长度时按 "{简称}{序号}分行" 续编
+BRANCHES = [
+    ('北京分行', '北京'), ('天津分行', '天津'), ('河北省分行', '河北'), ('山西省分行', '山西'),
+    ('内蒙古自治区分行', '内蒙古'), ('辽宁省分行', '辽宁'), ('大连分行', '大连'), ('吉林省分行', '吉林'),
+    ('黑龙江省分行', '黑龙江'), ('上海分行', '上海'), ('江苏省分行', '江苏'), ('浙江省分行', '浙江'),
+    ('宁波分行', '宁波'), ('安徽省分行', '安徽'), ('福建省分行', '福建'), ('厦门分行', '厦门'),
+    ('江西省分行', '江西'), ('山东省分行', '山东'), ('青岛分行', '青岛'), ('河南省分行', '河南'),
+    ('湖北省分行', '湖北'), ('湖南省分行', '湖南'), ('广东省分行', '广东'), ('深圳分行', '深圳'),
+    ('广西壮族自治区分行', '广西'), ('海南省分行', '海南'), ('重庆分行', '重庆'), ('四川省分行', '四川'),
+    ('贵州省分行', '贵州'), ('云南省分行', '云南'), ('西藏自治区分行', '西藏'), ('陕西省分行', '陕西'),
+    ('甘肃省分行', '甘肃'), ('青海省分行', '青海'), ('宁夏回族自治区分行', '宁夏'), ('新疆维吾尔自治区分行', '新疆'),
+]
+HEAD_OFFICE = '总行'
+# 组别名称须与报表中的组别排序一致
+GROUPS = ['第一组', '第二组', '第三组', '第四组']
+
+SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤'
+GIVEN = '伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超兰霞平刚桂华建国玉萍红梅鑫波斌宇浩凯婷雪琳晨欣怡佳慧颖琪思博文轩子涵俊杰嘉瑶雨萱志鹏晓东海燕春梦瑶'
+
+MANAGER_COLUMNS = ['序号', '柜员号', '姓名', '总行/一级分行名称', '二级分行名称', '一级支行名称', '网点名称', '机构编号',
+                   '出生日期', '职级', '理财经理注册时间', '人员性质', '是否为贵宾理财经理', '是否为CRM系统用户',
+                   'CRM系统用户角色', 'CRM用户状态', '是否在web系统注册', '岗位资格起始日期（初级）',
+                   '理财经理岗位资格编号（初级）', '岗位资格失效日期（初级）', '岗位资格起始日期（中级）',
+                   '理财经理岗位资格编号（中级）', '岗位资格失效日期（中级）', '基金从业(销售业务)资格证书编号',
+                   'AFP证书编号', 'AFP证书失效日期', 'CFP证书编号', 'CFP失效日期', 'CPB证书编号', 'CPB失效日期', '首次准入时间']
+SALES_ORG_COLUMNS = ['一级分行编码', '一级分行名称', '二级分行名称', '一级支行名称', '一级支行编号', '网点名称', '网点编号',
+                     '人员工号', '人员姓名', '人员角色', '是否贵宾理财经理']
+INTERBUSI_ORG_COLUMNS = ['一级分行编码', '一级分行名称', '二级分行名称', '一级支行名称', '网点名称',
+                         '人员工号', '人员姓名', '人员角色', '是否贵宾理财经理']
+
+# 各类业务每个工作日的成交模型：(成交概率系数, 单笔金额对数均值, 对数标准差, 撤单/退保的概率, 中收费率)
+ASSETS = {
+    '理财': (0.25, 12.5, 1.2, 0.0, 0.003),
+    '保险': (0.08, 10.5, 1.0, 0.03, 0.08),
+    '基金': (0.12, 10.0, 1.3, 0.02, 0.012),
+    '资产管理计划': (0.02, 13.0, 0.8, 0.0, 0.005),
+    '实物贵金属': (0.05, 8.5, 1.0, 0.01, 0.05),
+    '黄金积存': (0.06, 7.0, 1.2, 0.05, 0.005),
+}
+
+# 源文件类型：标题、表头之前的两行及表尾备注与真实下发的文件一致
+TABLES = {
+    '理财经理详细信息': {'title': '理财经理详细信息表'},
+    '投资理财销售量统计表': {'title': '投资理财销售量统计表', 'remark': '备注:\n    1.统计单位：元；\n    2.未包含统计期内未确认的理财交易量；\n'},
+    '投资理财销售量统计表-权益': {'title': '投资理财销售量统计表', 'remark': '备注:\n    1.统计单位：元；\n    2.基金仅包含权益类基金；\n'},
+    '投资理财中收统计表': {'title': '投资理财中收统计表', 'remark': '备注:\n        1.统计单位：元；\n'},
+}
+FORMATS = ('xlsx', 'csv')
+
+# 生成参数随工作目录一同保存，参数不变时可复用已生成的数据
+PARAMS_FILE = 'synthetic.json'
+
+
+def _date_strings(origin, offsets):
+    '''origin加上offsets天的日期字符串（YYYY-MM-DD），相同日期只格式化一次'''
+    unique, codes = np.unique(offsets, return_inverse=True)
+    labels = [(origin + timedelta(days=int(d))).strftime('%Y-%m-%d') for d in unique]
+    return pd.Categorical.from_codes(codes.ravel(), categories=labels)
+
+
+class SyntheticBank:
+    '''
+    合成的机构及理财经理：按一级分行、二级分行、一级支行、网点四级生成机构，理财经理按分行规模不均匀分布，
+    每个工作日按成交模型随机生成各业务的成交额，快照为当月累计值（每月初清零），与下发的源文件口径一致。
+    同一seed下任一日期的快照都相同，与请求的日期及顺序无关
+    '''
+
+    def __init__(self, managers=1000, branches=36, groups=4, seed=0, cities=8, districts=5, outlets=3,
+                 turnover=0.1, origin=date(2025, 1, 1)):
+        '''
+        :param managers: 理财经理人数
+        :param branches: 一级分行数（另有总行）
+        :param groups: 组别数，最多4组
+        :param cities: 每个一级分行下的二级分行数，districts、outlets依次为下一级的机构数
+        :param turnover: 一年内入职及离职的人数占比，在origin起一年内均匀发生
+        :param origin: 人员变动的起始日期
+        '''
+        if not 1 <= groups <= len(GROUPS):
+            raise ValueError(f"组别数须在1到{len(GROUPS)}之间")
+        if managers < 1 or branches < 1:
+            raise ValueError("理财经理人数及分行数须为正数")
+        self.managers = managers
+        self.seed = seed
+        self.origin = origin
+        rng = np.random.default_rng([seed, 0])
+
+        # 机构：一级分行及其下各级机构的名称、编码
+        self.branches = []
+        for i in range(branches):
+            full, short = BRANCHES[i % len(BRANCHES)]
+            if i >= len(BRANCHES):
+                short = f"{short}{i // len(BRANCHES) + 1}"
+                full = f"{short}分行"
+            self.branches.append((full, short, GROUPS[i % groups]))
+        branch_codes = [f"{11 + i % 89:02d}{100013 + i * 7:06d}" for i in range(branches)]
+        city_names = [f"{short}{c + 1}市分行" for _, short, _ in self.branches for c in range(cities)]
+        district_names = [f"{city[:-2]}{d + 1}区支行" for city in city_names for d in range(districts)]
+        outlet_names = [f"{district[:-2]}{o + 1}网点" for district in district_names for o in range(outlets)]
+
+        # 理财经理按分行规模分布，约0.5%在总行
+        n = managers
+        weights = rng.pareto(2.0, branches) + 1
+        branch = rng.choice(branches, size=n, p=weights / weights.sum())
+        head = rng.random(n) < 0.005
+        city = branch * cities + rng.integers(0, cities, n)
+        district = city * districts + rng.integers(0, districts, n)
+        outlet = district * outlets + rng.integers(0, outlets, n)
+
+        # 柜员号：入行年月 + 5位当月序号，共11位
+        year_month = rng.integers(2005, 2025, n) * 100 + rng.integers(1, 13, n)
+        sequence = pd.Series(year_month).groupby(year_month).cumcount().to_numpy()
+        if sequence.max() >= 100000:
+            raise ValueError("理财经理人数过多，柜员号的当月序号超过5位")
+        ids = year_month.astype('int64') * 100000 + sequence
+        given = rng.integers(0, len(GIVEN), (n, 2))
+        double = rng.random(n) < 0.7
+        names = np.char.add(np.char.add(np.array(list(SURNAMES))[rng.integers(0, len(SURNAMES), n)],
+                                        np.array(list(GIVEN))[given[:, 0]]),
+                            np.where(double, np.array(list(GIVEN))[given[:, 1]], ''))
+
+        outlet_codes = np.array([f"{branch_codes[o // (cities * districts * outlets)][:2]}{5000 + o:06d}"
+                                 for o in range(len(outlet_names))], dtype=object)
+        self.people = pd.DataFrame({
+            '柜员号': ids,
+            '姓名': names.astype(object),
+            'branch': np.where(head, -1, branch),
+            'city': np.where(head, -1, city),
+            'district': np.where(head, -1, district),
+            'outlet': outlet,
+            'vip': rng.random(n) < 0.22,
+        })
+        self.branch_names = [full for full, _, _ in self.branches]
+        self.branch_codes = branch_codes
+        self.cities = cities
+        self.districts = districts
+        self.city_names = city_names
+        self.district_names = district_names
+        self.outlet_names = outlet_names
+        self.outlet_codes = outlet_codes
+        # 生日、注册及准入日期，相对1970-01-01的天数
+        self.birth = rng.integers(3650, 12000, n)
+        self.registered = ((year_month // 100 - 1970) * 365.25 + (year_month % 100) * 30.4).astype('int64') \
+            + rng.integers(0, 365, n)
+
+        # 人员变动：部分人员在一年内入职或离职，其余始终在岗
+        days = 366
+        self.joined = np.full(n, -1, dtype='int64')
+        self.left = np.full(n, 10 ** 6, dtype='int64')
+        moving = rng.random(n)
+        joins = moving < turnover / 2
+        leaves = (moving >= turnover / 2) & (moving < turnover)
+        self.joined[joins] = rng.integers(0, days, joins.sum())
+        self.left[leaves] = rng.integers(0, days, leaves.sum())
+
+        # 成交活跃度及单笔规模因人而异，权益类基金占基金销量的比例因人而异
+        self.activity = rng.beta(2.0, 2.0, n) * 1.6
+        self.scale = rng.lognormal(0.0, 0.6, n)
+        self.equity_share = rng.beta(2.0, 3.0, n)
+        self._state = None
+
+    def active(self, d):
+        '''某日在岗人员的布尔数组'''
+        day = (d - self.origin).days
+        return (self.joined <= day) & (self.left > day)
+
+    def _flows(self, d):
+        '''某个工作日各人员各业务的成交额及中收，按 (seed, 日期) 生成，与其他日期无关'''
+        rng = np.random.default_rng([self.seed, d.toordinal()])
+        n = self.managers
+        probs, mus, sigmas, cancels, fees = (np.array(v) for v in zip(*ASSETS.values()))
+        hit = rng.random((n, len(ASSETS))) < self.activity[:, None] * probs[None, :]
+        amounts = np.exp(mus[None, :] + sigmas[None, :] * rng.standard_normal((n, len(ASSETS))))
+        amounts *= self.scale[:, None]
+        amounts[rng.random((n, len(ASSETS))) < cancels[None, :]] *= -1
+        amounts = np.where(hit & self.active(d)[:, None], amounts, 0.0)
+        income = amounts * fees[None, :] * rng.uniform(0.6, 1.4, (n, len(ASSETS)))
+        return amounts, income
+
+    def month_to_date(self, d):
+        '''
+        截至d的当月累计成交额、中收及权益类基金销量，各为 人员×业务 的数组；
+        按日期顺序请求时沿用上次的累计结果，只补算其后的工作日
+        '''
+        first = d.replace(day=1)
+        if self._state is not None and self._state[0] <= d and self._state[0] >= first:
+            day, sales, income = self._state[0], self._state[1].copy(), self._state[2].copy()
+            day += timedelta(days=1)
+        else:
+            day = first
+            sales = np.zeros((self.managers, len(ASSETS)))
+            income = np.zeros((self.managers, len(ASSETS)))
+        while day <= d:
+            if day.weekday() < 5:
+                amounts, fees = self._flows(day)
+                sales += amounts
+                income += fees
+            day += timedelta(days=1)
+        self._state = (d, sales, income)
+        equity = sales[:, list(ASSETS).index('基金')] * self.equity_share
+        return sales, income, equity
+
+    def match_table(self):
+        '''
+        分行全简称对应及组别分类，含全国、全省、全市三种口径的对应关系：
+        一级分行按 总行/一级分行名称，二级分行按 二级分行名称，一级支行按 一级支行名称 关联，组别沿用所属一级分行
+        '''
+        rows = [(HEAD_OFFICE, None, None, HEAD_OFFICE, None)]
+        rows += [(full, None, None, short, group) for full, short, group in self.branches]
+        group_of = [group for _, _, group in self.branches]
+        rows += [(None, city, None, city, group_of[i // self.cities])
+                 for i, city in enumerate(self.city_names)]
+        rows += [(None, None, district, district, group_of[i // (self.cities * self.districts)])
+                 for i, district in enumerate(self.district_names)]
+        return pd.DataFrame(rows, columns=['总行/一级分行名称', '二级分行名称', '一级支行名称', '分行', '组别'])
+
+    def _org(self, people):
+        '''各人员的机构名称及编码'''
+        branch = people['branch'].to_numpy()
+        head = branch < 0
+        names = np.array([HEAD_OFFICE] + self.branch_names, dtype=object)[branch + 1]
+        codes = np.array(['11005293'] + self.branch_codes, dtype=object)[branch + 1]
+        city = np.where(head, None, np.array(self.city_names + [None], dtype=object)[people['city'].to_numpy()])
+        district = np.where(head, None,
+                            np.array(self.district_names + [None], dtype=object)[people['district'].to_numpy()])
+        outlet = people['outlet'].to_numpy()
+        outlet_names = np.where(head, None, np.array(self.outlet_names, dtype=object)[outlet])
+        outlet_codes = np.where(head, '11005293', self.outlet_codes[outlet])
+        return {
+            '一级分行编码': codes,
+            '一级分行名称': names,
+            '二级分行名称': city,
+            '一级支行名称': district,
+            '一级支行编号': outlet_codes,
+            '网点名称': outlet_names,
+            '网点编号': outlet_codes,
+        }
+
+    def roster(self, d):
+        '''某日的理财经理详细信息'''
+        people = self.people[self.active(d)]
+        people = people.sort_values(['branch', '柜员号'], kind='stable')
+        org = self._org(people)
+        n = len(people)
+        epoch = date(1970, 1, 1)
+        index = people.index.to_numpy()
+        vip = np.where(people['vip'].to_numpy(), '是', '否')
+        data = dict.fromkeys(MANAGER_COLUMNS)
+        data.update({
+            '序号': np.arange(1, n + 1),
+            '柜员号': people['柜员号'].to_numpy(),
+            '姓名': people['姓名'].to_numpy(),
+            '总行/一级分行名称': org['一级分行名称'],
+            '二级分行名称': org['二级分行名称'],
+            '一级支行名称': org['一级支行名称'],
+            '网点名称': org['网点名称'],
+            '机构编号': org['网点编号'],
+            '出生日期': _date_strings(epoch, self.birth[index]),
+            '理财经理注册时间': _date_strings(epoch, self.registered[index]),
+            '人员性质': '理财经理',
+            '是否为贵宾理财经理': vip,
+            '是否为CRM系统用户': '是',
+            'CRM系统用户角色': '理财经理',
+            'CRM用户状态': '正常',
+            '是否在web系统注册': '否',
+            '岗位资格起始日期（初级）': _date_strings(epoch, self.registered[index] + 30),
+            '岗位资格失效日期（初级）': '2025-12-31',
+            '首次准入时间': (people['柜员号'].to_numpy() // 100000),
+        })
+        return pd.DataFrame(data, columns=MANAGER_COLUMNS)
+
+    def snapshot(self, table, d):
+        '''某日的源文件内容（不含标题行及表尾备注），按合计降序排列并给出全国排名'''
+        if table == '理财经理详细信息':
+            return self.roster(d)
+        if table not in TABLES:
+            raise ValueError(f"不支持的源文件类型: {table}")
+        mask = self.active(d)
+        people = self.people[mask]
+        sales, income, equity = self.month_to_date(d)
+        org = self._org(people)
+        if table == '投资理财销售量统计表-权益':
+            org_columns = SALES_ORG_COLUMNS
+            values = {'基金': equity[mask]}
+        else:
+            org_columns = SALES_ORG_COLUMNS if table == '投资理财销售量统计表' else INTERBUSI_ORG_COLUMNS
+            block = (sales if table == '投资理财销售量统计表' else income)[mask]
+            values = {asset: block[:, j] for j, asset in enumerate(ASSETS)}
+        values = {col: np.round(v, 2) for col, v in values.items()}
+        total = np.round(np.sum(list(values.values()), axis=0), 2)
+
+        data = {'序号': None}
+        for col in org_columns:
+            if col in org:
+                data[col] = org[col]
+        data['人员工号'] = people['柜员号'].to_numpy()
+        data['人员姓名'] = people['姓名'].to_numpy()
+        data['人员角色'] = '理财经理'
+        data['是否贵宾理财经理'] = np.where(people['vip'].to_numpy(), '是', '否')
+        data.update(values)
+        data['合计'] = total
+        df = pd.DataFrame(data, columns=['序号'] + org_columns + list(values) + ['合计'])
+        df = df.iloc[np.lexsort((df['人员工号'].to_numpy(), -total))].reset_index(drop=True)
+        df['序号'] = np.arange(1, len(df) + 1)
+        df['全国排名'] = df['序号']
+        return df
+
+
+def title_rows(table, d):
+    '''源文件表头之前的两行：表名及报表类型、统计时间、机构属性'''
+    title = TABLES[table]['title']
+    if table == '理财经理详细信息':
+        return [[title], [None, '机构属性:自营', None, None, None, None, None, None, f"统计时间:{d:%Y%m%d}"]]
+    return [[title], ['报表类型：日', None, None, f"统计时间：{d:%Y%m%d}", None, None, '机构属性：自营']]
+
+
+def write_snapshot(df, path, table, d, fmt='xlsx'):
+    '''
+    写出一份源文件：xlsx为下发的版式（两行标题、第三行表头、表尾备注），由写出进程池写出；
+    csv为导出的版式（第一行即为表头）
+    '''
+    if fmt == 'csv':
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        df.to_csv(tmp_path, index=False, encoding='utf-8')
+        os.replace(tmp_path, path)
+        return
+    remark = TABLES[table].get('remark')
+    if remark:
+        df = pd.concat([df, pd.DataFrame({'序号': [None, remark]})], ignore_index=True)
+    with WorkbookJob(path) as writer:
+        writer.write(df, 'Sheet1', index=False, title_rows=title_rows(table, d))
+
+
+def required_snapshots(param_dates, names=None):
+    '''
+    按各报表的源文件清单汇总生成某些日期的报表所需的源文件
+
+    :param param_dates: 报表日期列表，格式为YYYYMMDD
+    :param names: 报表名列表，为None时为全部报表
+    :return: ({文件关键词: 有序日期列表}, 对应关系文件名列表)
+    '''
+    import run_reports
+    from report_api import load_report
+    modules = [load_report(name) for name in run_reports.parse_report_names(names)]
+    snapshots = {}
+    for param_date in param_dates:
+        for module in modules:
+            for request in module.snapshot_requests(param_date):
+                snapshots.setdefault(request[0], set()).update(request[1].values())
+    match_files = list(dict.fromkeys(module.MATCH_FILE for module in modules))
+    return {table: sorted(dates) for table, dates in snapshots.items()}, match_files
+
+
+def generate_workdir(base_path, param_dates, names=None, fmt='xlsx', **params):
+    '''
+    生成可直接运行报表的工作目录：对应关系文件及 参考文件 下各报表所需的全部源文件
+
+    :param base_path: 工作目录
+    :param param_dates: 报表日期列表，格式为YYYYMMDD
+    :param names: 报表名列表，为None时为全部报表
+    :param fmt: 源文件格式，见FORMATS
+    :param params: SyntheticBank的参数，如 managers、branches、groups、seed
+    :return: {文件路径: 行数}
+    '''
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的源文件格式: {fmt}，可选: {', '.join(FORMATS)}")
+    snapshots, match_files = required_snapshots(param_dates, names)
+    bank = SyntheticBank(**params)
+    folder_path = os.path.join(base_path, '参考文件')
+    os.makedirs(folder_path, exist_ok=True)
+    pool = get_writer_pool()
+
+    written = {}
+    match = bank.match_table()
+    for match_file in match_files:
+        path = os.path.join(base_path, match_file)
+        with WorkbookJob(path) as writer:
+            writer.write(match, 'Sheet1', index=False)
+        written[path] = len(match)
+
+    # 按日期顺序生成，当月累计值沿用前一日的结果；每个日期的文件写完后再生成下一日，避免同时持有多日数据
+    by_date = {}
+    for table, dates in snapshots.items():
+        for d in dates:
+            by_date.setdefault(d, []).append(table)
+    for d in sorted(by_date):
+        for table in by_date[d]:
+            path = os.path.join(folder_path, f"{table}{d:%Y%m%d}.{fmt}")
+            df = bank.snapshot(table, d)
+            write_snapshot(df, path, table, d, fmt)
+            written[path] = len(df)
+        failures = pool.wait(verbose=False)
+        if failures:
+            raise RuntimeError('; '.join(failures.values()))
+
+    with open(os.path.join(base_path, PARAMS_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'dates': list(param_dates), 'names': names, 'format': fmt, **params}, f, ensure_ascii=False)
+    return written
+
+
+if __name__ == "__main__":
+
+    # 读取并校验执行参数
+    parser = argparse.ArgumentParser(description='生成合成的源文件及对应关系文件，用于压力测试及基准测试')
+    parser.add_argument('date', help='报表日期，格式为YYYYMMDD')
+    parser.add_argument('reports', nargs='*', help='报表名，默认为all')
+    parser.add_argument('--to', dest='end', help='结束日期（含），生成该段日期全部工作日的报表所需的源文件')
+    parser.add_argument('--output', default=os.path.join(os.getcwd(), '合成数据'), help='工作目录，默认为 ./合成数据')
+    parser.add_argument('--managers', type=int, default=1000, help='理财经理人数，默认1000')
+    parser.add_argument('--branches', type=int, default=36, help='一级分行数，默认36')
+    parser.add_argument('--groups', type=int, default=4, help='组别数（1-4），默认4')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子，默认0')
+    parser.add_argument('--format', choices=FORMATS, default='xlsx', help='源文件格式，默认xlsx')
+    args = parser.parse_args()
+
+    try:
+        import run_reports
+        dates = run_reports.plan_dates(args.date, args.end or args.date)
+        run_reports.parse_report_names(args.reports)
+    except ValueError as e:
+        parser.error(str(e))
+    if not dates:
+        parser.error('日期范围内没有工作日')
+
+    start = datetime.now()
+    written = generate_workdir(args.output, dates, args.reports or None, args.format, managers=args.managers,
+                               branches=args.branches, groups=args.groups, seed=args.seed)
+    get_writer_pool().shutdown()
+    print(f"已生成{len(written)}个文件（{sum(written.values())}行），用时{(datetime.now() - start).total_seconds():.1f}秒：{args.output}")
@@ -1,341 +1,233 @@
 import os
-import sys
 import warnings
 
 import pandas as pd
-from datetime import datetime, timedelta
+from snapshot_repository import get_repository
+from snapshot_schema import fill_missing
+from period_delta import PeriodDelta, last_workday, last_wednesday, last_month_end, snapshot_dates
+from snapshot_tensor import SnapshotTensor
+from leaderboard import leaderboard
+from workbook_pool import WorkbookJob, wait_workbooks
+from run_metrics import timed, finish_run
+from run_profiler import parse_report_args, profiling
+from datetime import datetime
 
 # 忽略读取警告
 warnings.filterwarnings('ignore', category=UserWarning, message="Workbook contains no default style")
-# 检查是否有足够的参数
-if len(sys.argv) != 2:
-    print("用法: python 111.py <YYYYMMDD>")
-    sys.exit(1)  # 如果没有参数，退出程序
-
-param_date = sys.argv[1]
-abs_path = os.getcwd()
-
-def get_last_workday(date_obj):
-    """计算上一个工作日（周一返回上周五，周末返回周五，其他返回前一日）"""
-    if date_obj.isoweekday() == 1:  # 周一
-        return date_obj - timedelta(days=3)
-    elif date_obj.isoweekday() >= 6:  # 周六或周日
-        return date_obj - timedelta(days=(date_obj.isoweekday() - 5))
-    else:  # 周二到周五
-        return date_obj - timedelta(days=1)
-
-def get_last_wednesday(date_obj):
-    """计算上一个周三（当天为周三时取七天前）"""
-    current_weekday = date_obj.isoweekday()
-    # 当天是周三时 delta=7，否则按原逻辑计算
-    delta = 7 if current_weekday == 3 else (current_weekday - 3) % 7
-    return date_obj - timedelta(days=delta)
-
-def last_day_of_last_month(date_obj):
-    """计算传入日期的上个月的最后一天"""
-    first_day_of_current_month = date_obj.replace(day=1)
-    return first_day_of_current_month - timedelta(days=1)
 
 
-def load_data(date_str):
+def snapshot_requests(date_str):
     """
-    根据传入的日期读取相关文件并返回字典
+    根据传入的日期返回生成报表所需的源文件清单，只计算日期不读取文件
 
-    :param folder_path: 文件夹路径
     :param date_str: 8位日期字符串，格式为YYYYMMDD
-    :return: 包含DataFrame的字典
+    :return: [(文件关键词, {键: 日期}, 扩展名列表), ...]
     """
     date_obj = datetime.strptime(date_str, "%Y%m%d").date()
-    folder_path = os.path.join(abs_path, '参考文件')
-    print(f'正在读取投资理财销售量统计表{date_str}.xlsx...\n')
+
     # 处理投资理财销售量统计表
     sales_dates = {
         'sales_today': date_obj,
-        'sales_lm': last_day_of_last_month(date_obj),
-        'sales_lw': get_last_wednesday(date_obj)
+        'sales_lm': last_month_end(date_obj),
+        'sales_lw': last_wednesday(date_obj)
     }
 
-    if get_last_wednesday(date_obj).month != date_obj.month:
-        cross_month = 1
+    # 权益类基金数据仅在本周窗口跨月时需要上月底数据
+    if last_month_end(date_obj) in snapshot_dates(date_obj, ['week']):
+        fund_dates = {
+            'fund_today': date_obj,
+            'fund_lm': last_month_end(date_obj),
+            'fund_lw': last_wednesday(date_obj)
+        }
     else:
-        cross_month = 0
-
-    sales_dict = {}
-
-    for key, d in sales_dates.items():
-        filename = f"投资理财销售量统计表{d.strftime('%Y%m%d')}"
-        filepath = os.path.join(folder_path, filename)
-        found = False
-        # 尝试不同的文件扩展名
-        for ext in ['.xls', '.xlsx', '.csv']:
-            full_path = filepath + ext
-            if os.path.exists(full_path):
-                try:
-                    if ext == '.csv':
-                        df = pd.read_csv(full_path)
-                    else:
-                        df = pd.read_excel(full_path, engine='openpyxl', header=2)
-                    sales_dict[key] = df
-                    found = True
-                    break
-                except Exception as e:
-                    raise ValueError(f"读取文件 {full_path} 失败: {e}")
-        if not found:
-            raise FileNotFoundError(f"未找到文件: {filename}[.csv|.xlsx|.xls]")
-    print(f'正在读取理财经理详细信息表{date_str}.xlsx...\n')
+        fund_dates = {
+            'fund_today': date_obj,
+            'fund_lw': last_wednesday(date_obj)
+        }
+
     # 处理理财经理详细信息
     manager_dates = {
         'manager_today': date_obj
     }
 
-    manager_dict = {}
-    for key, d in manager_dates.items():
-        filename = f"理财经理详细信息{d.strftime('%Y%m%d')}"
-        filepath = os.path.join(folder_path, filename)
-        found = False
-        for ext in ['.csv', '.xlsx', '.xls']:
-            full_path = filepath + ext
-            if os.path.exists(full_path):
-                try:
-                    if ext == '.csv':
-                        df = pd.read_csv(full_path)
-                    else:
-                        df = pd.read_excel(full_path, engine='openpyxl', header=2)
-                    manager_dict[key] = df
-                    found = True
-                    break
-                except Exception as e:
-                    raise ValueError(f"读取文件 {full_path} 失败: {e}")
-        if not found:
-            raise FileNotFoundError(f"未找到文件: {filename}[.csv|.xlsx]")
-
-    # 合并字典
-    return {**sales_dict, **manager_dict}, cross_month
-
-dfs, cross_month = load_data(param_date)
-
-#加载权益类基金数据
-def fund_lodaData(date_str):
+    return [('投资理财销售量统计表', sales_dates, ['.xls', '.xlsx', '.csv']),
+            ('投资理财销售量统计表-权益', fund_dates),
+            ('理财经理详细信息', manager_dates)]
+
+
+@timed('load')
+def load_data(date_str):
+    """
+    根据传入的日期读取相关文件并返回字典
+
+    :param date_str: 8位日期字符串，格式为YYYYMMDD
+    :return: 包含DataFrame的字典
+    """
     date_obj = datetime.strptime(date_str, "%Y%m%d").date()
     folder_path = os.path.join(abs_path, '参考文件')
-    if get_last_wednesday(date_obj).month != date_obj.month:
-        sales_dates = {
-            'sales_today': date_obj,
-            'sales_lm': last_day_of_last_month(date_obj),
-            'sales_lw': get_last_wednesday(date_obj)
-        }
-    else:
-        sales_dates = {
-            'sales_today': date_obj,
-            'sales_lw': get_last_wednesday(date_obj)
-        }
-    # 处理投资理财销售量统计表
-    print(f'正在读取投资理财销售量统计表-权益{date_str}.xlsx...\n')
-    fund_dict = {}
-    for key, d in sales_dates.items():
-        filename = f"投资理财销售量统计表-权益{d.strftime('%Y%m%d')}"
-        filepath = os.path.join(folder_path, filename)
-        found = False
-        for ext in ['.csv', '.xlsx', '.xls']:
-            full_path = filepath + ext
-            if os.path.exists(full_path):
-                try:
-                    if ext == '.csv':
-                        df = pd.read_csv(full_path)
-                    else:
-                        df = pd.read_excel(full_path, engine='openpyxl', header=2)
-                    fund_dict[key] = df
-                    found = True
-                    break
-                except Exception as e:
-                    raise ValueError(f"读取文件 {full_path} 失败: {e}")
-        if not found:
-            raise FileNotFoundError(f"未找到文件: {filename}[.csv|.xlsx]")
-    # 处理理财经理详细信息
-    manager_dates = {
-        'manager_today': date_obj
-    }
+    print(f'正在读取投资理财销售量统计表{date_str}.xlsx...\n')
+
+    # 销售量、权益类基金及理财经理信息一次性分发到进程池并行解析，理财经理信息只读取一次
+    print(f'正在读取投资理财销售量统计表-权益及理财经理详细信息表{date_str}.xlsx...\n')
+    dfs = get_repository().load(snapshot_requests(date_str), folder_path)
 
-    manager_dict = {}
-    for key, d in manager_dates.items():
-        filename = f"理财经理详细信息{d.strftime('%Y%m%d')}"
-        filepath = os.path.join(folder_path, filename)
-        found = False
-        for ext in ['.csv', '.xlsx', '.xls']:
-            full_path = filepath + ext
-            if os.path.exists(full_path):
-                try:
-                    if ext == '.csv':
-                        df = pd.read_csv(full_path)
-                    else:
-                        df = pd.read_excel(full_path, engine='openpyxl', header=2)
-                    manager_dict[key] = df
-                    found = True
-                    break
-                except Exception as e:
-                    raise ValueError(f"读取文件 {full_path} 失败: {e}")
-        if not found:
-            raise FileNotFoundError(f"未找到文件: {filename}[.csv|.xlsx]")
-
-    return {**fund_dict, **manager_dict}
-
-fund_dfs = fund_lodaData(param_date)
-
-# 明细销售情况预处理
-
-# 读取分行全简称对应关系及组别分类
-df_match = pd.read_excel(os.path.join(abs_path,'分行全简称对应及组别分类.xlsx'))
+    return dfs
 
 # 处理柜员信息表并与对应关系关联
 def process_manager(df_manager,df_match):
-    df_manager_match = pd.merge(df_manager,df_match,on = '总行/一级分行名称',how = 'left')
     column_need = ["序号","柜员号","姓名","总行/一级分行名称","分行"]
-    return df_manager_match[column_need]
+    # 同一花名册与对应关系表在进程内只关联一次
+    return get_repository().roster(df_manager,df_match,'总行/一级分行名称',column_need)
 
-# 将单日明细情况与分行情况关联获得分行及组别
-def process_sales(df_sales,df_manager_match):
-    df_sales_processed = pd.merge(df_manager_match,df_sales,how = 'left',left_on = '柜员号',right_on = '人员工号',suffixes=('_manager', '_sales'))
-    df_sales_processed['理财/资管'] = df_sales_processed['理财']+df_sales_processed['资产管理计划']
-    df_sales_processed['贵金属'] = df_sales_processed['实物贵金属'] + df_sales_processed['黄金积存']
-    column_need = ["柜员号","姓名","总行/一级分行名称","分行","理财/资管","理财","保险","基金","资产管理计划","贵金属","实物贵金属","黄金积存","合计"]
-    return df_sales_processed[column_need]
+# 将各日销售量快照按人员工号对齐到花名册获得分行，存为 人员×资产×快照 的数组
+def process_sales(sales_snapshots,df_manager_match):
+    roster_need = ["柜员号","姓名","总行/一级分行名称","分行"]
+    asset_need = ["理财/资管","理财","保险","基金","资产管理计划","贵金属","实物贵金属","黄金积存","合计"]
+    derived = {'理财/资管': ['理财','资产管理计划'], '贵金属': ['实物贵金属','黄金积存']}
+    return SnapshotTensor.from_snapshots(df_manager_match[roster_need],sales_snapshots,asset_need,derived=derived,fill=0)
 
 # 对df进行预处理
+@timed('reduce')
 def all_df_reduce(dfs,df_match):
 
     dfs_processed = {}
 
     for i in dfs.keys():
         if 'manager' in i :
-            dfs_processed[i] = process_manager(dfs[i],df_match).fillna({ '组别': '无组别'})
-        else: continue
-    for i in dfs.keys():
-        if 'sales' in i:
-            dfs_processed[i] = process_sales(dfs[i],dfs_processed['manager_today']).fillna(0)
+            dfs_processed[i] = fill_missing(process_manager(dfs[i],df_match),{ '组别': '无组别'})
         else: continue
+    # 各日快照按 today、lw、lm 标识，一次对齐到当日花名册
+    sales_snapshots = {i.split('_',1)[1]: dfs[i] for i in dfs.keys() if 'sales' in i}
+    dfs_processed['sales'] = process_sales(sales_snapshots,dfs_processed['manager_today'])
 
     return dfs_processed
 
-dfs_processed = all_df_reduce(dfs,df_match)
-
 #单独处理权益类基金
-#权益基金数据预处理
-def process_fund_sales(df_sales,df_manager_match):
-    df_sales_processed = pd.merge(df_manager_match,df_sales,how = 'left',left_on = '柜员号',right_on = '人员工号',suffixes=('_manager', '_sales'))
-    column_need = ["柜员号","姓名","总行/一级分行名称","分行","基金"]
-    return df_sales_processed[column_need]
+# 将各日权益类基金快照按人员工号对齐到花名册，存为 人员×资产×快照 的数组
+def process_fund_sales(sales_snapshots,df_manager_match):
+    roster_need = ["柜员号","姓名","总行/一级分行名称","分行"]
+    asset_need = ["基金"]
+    return SnapshotTensor.from_snapshots(df_manager_match[roster_need],sales_snapshots,asset_need,fill=0)
 
+@timed('reduce')
 def fund_df_reduce(dfs,df_match):
 
     dfs_processed = {}
 
     for i in dfs.keys():
         if 'manager' in i :
-            dfs_processed[i] = process_manager(dfs[i],df_match).fillna({ '组别': '无组别'})
-        else: continue
-    for i in dfs.keys():
-        if 'sales' in i:
-            dfs_processed[i] = process_fund_sales(dfs[i],dfs_processed['manager_today']).fillna(0)
+            dfs_processed[i] = fill_missing(process_manager(dfs[i],df_match),{ '组别': '无组别'})
         else: continue
+    # 各日快照按 today、lw、lm 标识，一次对齐到当日花名册
+    sales_snapshots = {i.split('_',1)[1]: dfs[i] for i in dfs.keys() if 'sales' in i}
+    dfs_processed['sales'] = process_fund_sales(sales_snapshots,dfs_processed['manager_today'])
 
     return dfs_processed
 
-fund_dfs_process = fund_df_reduce(fund_dfs,df_match)
-# 加工4种业务本周累积销售情况
-def manager_sales_situ(sales_today,sales_last_week,sales_last_month,cross_month):
-
-    merge_df2 = pd.merge(sales_today,sales_last_week,on = '柜员号',how = 'left',suffixes=('', '_lw'))
+@timed('ranking')
+def top_list(merge_result,metric,title):
+    '''按指标降序生成榜单（数值相同按花名册顺序），金额换算为万元'''
+    board = leaderboard(merge_result,metric,['分行','姓名',metric])
+    board[metric] = round(board[metric]/10000)
+    return board.rename(columns={metric: title})
 
-    merge_result = merge_df2[["柜员号","姓名","分行"]].copy()
+# 加工4种业务本周累积销售情况
+@timed('deltas')
+def manager_sales_situ(sales,date_obj):
+
+    # 各日快照均为当月累计值，上周三在上月时加回上月底数据由增量引擎处理
+    period = PeriodDelta(date_obj,sales,{'': (date_obj,'today'),
+                                         '_lw': (last_wednesday(date_obj),'lw'),
+                                         '_lm': (last_month_end(date_obj),'lm')})
+    windows = {'本周累积': 'week'}
     asset_columns = ['理财/资管', '保险', '基金', '贵金属']
 
-    if cross_month == 0:
-
-        for col in asset_columns:
-            merge_result[f"{col}_本周累积"] = merge_df2[col]-merge_df2[f"{col}_lw"]
-
-        sort_LC = merge_result.sort_values(by='理财/资管_本周累积' , ascending = False)
-        sort_LC['理财/资管_本周累积'] = round(sort_LC['理财/资管_本周累积']/10000)
-        sort_BX = merge_result.sort_values(by='保险_本周累积' , ascending = False)
-        sort_BX['保险_本周累积'] = round(sort_BX['保险_本周累积']/10000)
-        sort_JJ = merge_result.sort_values(by='基金_本周累积', ascending=False)
-        sort_JJ['基金_本周累积'] = round(sort_JJ['基金_本周累积']/10000)
-        sort_GJS = merge_result.sort_values(by='贵金属_本周累积', ascending=False)
-        sort_GJS['贵金属_本周累积'] = round(sort_GJS['贵金属_本周累积']/10000)
-        sort_LC['理财/资管_本周累积'] = sort_LC.rename(columns={'理财/资管_本周累积':'理财/资管本周销量（万元）'},inplace=True)
-        sort_BX['保险_本周累积'] = sort_BX.rename(columns={'保险_本周累积':'保险_本周销量（万元）'},inplace=True)
-        sort_JJ['基金_本周累积'] = sort_JJ.rename(columns={'基金_本周累积':'基金_本周销量（万元）'},inplace=True)
-        sort_GJS['贵金属_本周累积'] = sort_GJS.rename(columns={'贵金属_本周累积': '贵金属_本周销量（万元）'}, inplace=True)
-        sort_LC = sort_LC[['分行', '姓名', '理财/资管本周销量（万元）']]
-        sort_BX = sort_BX[['分行', '姓名', '保险_本周销量（万元）']]
-        sort_JJ = sort_JJ[['分行','姓名','基金_本周销量（万元）']]
-        sort_GJS = sort_GJS[['分行', '姓名', '贵金属_本周销量（万元）']]
-        return merge_df2,merge_result,sort_LC,sort_BX,sort_JJ,sort_GJS
-
-    elif cross_month == 1:
-        merge_df3 = pd.merge(merge_df2,sales_last_month,on = '柜员号',how = 'left',suffixes=('', '_lm'))
-
-        for col in asset_columns:
-            merge_result[f"{col}_本周累积"] = merge_df3[col] + merge_df3[f"{col}_lm"] - merge_df3[f"{col}_lw"]
-        sort_LC = merge_result.sort_values(by='理财/资管_本周累积', ascending=False)
-        sort_LC['理财/资管_本周累积'] = round(sort_LC['理财/资管_本周累积']/10000)
-        sort_BX = merge_result.sort_values(by='保险_本周累积', ascending=False)
-        sort_BX['保险_本周累积'] = round(sort_BX['保险_本周累积']/10000)
-        sort_JJ = merge_result.sort_values(by='基金_本周累积', ascending=False)
-        sort_JJ['基金_本周累积'] = round(sort_JJ['基金_本周累积']/10000)
-        sort_GJS = merge_result.sort_values(by='贵金属_本周累积', ascending=False)
-        sort_GJS['贵金属_本周累积'] = round(sort_GJS['贵金属_本周累积']/10000)
-        sort_LC['理财/资管_本周累积'] = sort_LC.rename(columns={'理财/资管_本周累积': '理财/资管本周销量（万元）'}, inplace=True)
-        sort_BX['保险_本周累积'] = sort_BX.rename(columns={'保险_本周累积': '保险_本周销量（万元）'}, inplace=True)
-        sort_JJ['基金_本周累积'] = sort_JJ.rename(columns={'基金_本周累积': '基金_本周销量（万元）'}, inplace=True)
-        sort_GJS['贵金属_本周累积'] = sort_GJS.rename(columns={'贵金属_本周累积': '贵金属_本周销量（万元）'}, inplace=True)
-        sort_LC = sort_LC[['分行', '姓名', '理财/资管本周销量（万元）']]
-        sort_BX = sort_BX[['分行', '姓名', '保险_本周销量（万元）']]
-        sort_JJ = sort_JJ[['分行', '姓名', '基金_本周销量（万元）']]
-        sort_GJS = sort_GJS[['分行', '姓名', '贵金属_本周销量（万元）']]
-        return merge_df3, merge_result, sort_LC, sort_BX, sort_JJ, sort_GJS
-merge_mid,df_result,sort_LC, sort_BX, sort_JJ, sort_GJS = manager_sales_situ(dfs_processed['sales_today'],dfs_processed['sales_lw'],dfs_processed['sales_lm'],cross_month)
-
-#加工权益基金本周累积销售情况
-def fund_top_list(sales_today,sales_last_week,cross_month,**args):
-    fund_merge_df = pd.merge(sales_today, sales_last_week, on='柜员号', how='left', suffixes=('', '_lw'))
-    merge_result = fund_merge_df[["柜员号", "姓名", "分行"]].copy()
-    asset_columns = ['基金']
-    if cross_month == 0:
-        for col in asset_columns:
-            merge_result[f"{col}_本周累积"] = fund_merge_df[col]-fund_merge_df[f"{col}_lw"]
-        sort_fund = merge_result.sort_values(by='基金_本周累积', ascending=False)
-        sort_fund['基金_本周累积'] = round(sort_fund['基金_本周累积']/10000)
-        sort_fund['基金_本周累积'] = sort_fund.rename(columns={'基金_本周累积': '基金_本周销量（万元）'}, inplace=True)
-        sort_fund = sort_fund[['分行', '姓名', '基金_本周销量（万元）']]
-        return merge_result, sort_fund
-    if cross_month == 1:
-        sales_last_month = args['last_month_sale']
-        fund_merge_df2 = pd.merge(fund_merge_df, sales_last_month, on='柜员号', how='left', suffixes=('', '_lm'))
-        for col in asset_columns:
-            merge_result[f"{col}_本周累积"] = fund_merge_df2[col] + fund_merge_df2[f"{col}_lm"] - fund_merge_df2[f"{col}_lw"]
-        sort_fund = merge_result.sort_values(by='基金_本周累积', ascending=False)
-        sort_fund['基金_本周累积'] = round(sort_fund['基金_本周累积'] / 10000)
-        sort_fund['基金_本周累积'] = sort_fund.rename(columns={'基金_本周累积': '基金_本周销量（万元）'}, inplace=True)
-        sort_fund = sort_fund[['分行', '姓名', '基金_本周销量（万元）']]
-        return merge_result, sort_fund
-
-if cross_month == 0:
-    fund_merge,fund_top = fund_top_list(fund_dfs_process['sales_today'],fund_dfs_process['sales_lw'],cross_month)
-elif cross_month ==1:
-    fund_merge,fund_top = fund_top_list(fund_dfs_process['sales_today'],fund_dfs_process['sales_lw'],cross_month,last_month_sale = fund_dfs_process['sales_lm'])
-
-if not os.path.exists('./业务TOP周榜单'):
-    os.makedirs('./业务TOP周榜单')
-#写入文件业务TOP周榜单
-print(f"正在生成：4大业务TOP榜单{param_date}.xlsx...\n")
-output_path = os.path.join(abs_path,'业务TOP周榜单',f'4种业务TOP周榜单{param_date}.xlsx')
-with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-    sort_LC.to_excel(writer, sheet_name='理财资管top榜单', index=False)
-    sort_BX.to_excel(writer, sheet_name='保险top榜单', index=False)
-    sort_GJS.to_excel(writer, sheet_name='贵金属top榜单', index=False)
-    fund_top.to_excel(writer, sheet_name='基金top榜单', index=False)
-print(f"4大业务TOP榜单数据已保存至：{output_path}\n")
-
+    merge_df = period.detail(windows)
+    merge_result = pd.concat([merge_df[["柜员号","姓名","分行"]],period.deltas(windows,asset_columns)],axis=1)
 
+    # 4种业务TOP榜单：只取出入选人员再换算为万元
+    sort_LC = top_list(merge_result,'理财/资管_本周累积','理财/资管本周销量（万元）')
+    sort_BX = top_list(merge_result,'保险_本周累积','保险_本周销量（万元）')
+    sort_JJ = top_list(merge_result,'基金_本周累积','基金_本周销量（万元）')
+    sort_GJS = top_list(merge_result,'贵金属_本周累积','贵金属_本周销量（万元）')
+    return merge_df,merge_result,sort_LC,sort_BX,sort_JJ,sort_GJS
 
+#加工权益基金本周累积销售情况
+@timed('deltas')
+def fund_top_list(fund,date_obj):
+    # 上月底数据仅在跨月时读取，未读取时不在数组中
+    period = PeriodDelta(date_obj,fund,{'': (date_obj,'today'),
+                                        '_lw': (last_wednesday(date_obj),'lw'),
+                                        '_lm': (last_month_end(date_obj),'lm')})
+    windows = {'本周累积': 'week'}
+    merge_result = pd.concat([fund.roster[["柜员号", "姓名", "分行"]],period.deltas(windows,['基金'])],axis=1)
+    sort_fund = top_list(merge_result,'基金_本周累积','基金_本周销量（万元）')
+    return merge_result, sort_fund
+
+# 分行全简称对应关系及组别分类文件
+MATCH_FILE = '分行全简称对应及组别分类.xlsx'
+
+def output_files(param_date):
+    '''输出的工作簿路径（相对工作目录），供run_reports检查各报表的输出是否重名'''
+    return [os.path.join('业务TOP周榜单',f'4种业务TOP周榜单{param_date}.xlsx')]
+
+def build(param_date,dfs,df_match):
+    '''
+    由已读取的源文件计算各工作表，不读写文件，也不使用模块变量
+
+    :param dfs: load_data的结果，{键: DataFrame}
+    :param df_match: 分行全简称对应关系及组别分类
+    :return: {工作簿名: {工作表名: DataFrame}}
+    '''
+    date_obj = datetime.strptime(param_date, "%Y%m%d").date()
+
+    # 权益类基金数据按 sales_ 键与理财经理信息组成单独的字典，不修改传入的dfs
+    fund_dfs = {key.replace('fund_', 'sales_'): df for key, df in dfs.items() if key.startswith('fund_')}
+    fund_dfs['manager_today'] = dfs['manager_today']
+    dfs = {key: df for key, df in dfs.items() if not key.startswith('fund_')}
+
+    dfs_processed = all_df_reduce(dfs,df_match)
+    fund_dfs_process = fund_df_reduce(fund_dfs,df_match)
+
+    merge_mid,df_result,sort_LC, sort_BX, sort_JJ, sort_GJS = manager_sales_situ(dfs_processed['sales'],date_obj)
+
+    fund_merge,fund_top = fund_top_list(fund_dfs_process['sales'],date_obj)
+
+    return {'4种业务TOP周榜单': {'理财资管top榜单': sort_LC,'保险top榜单': sort_BX,'贵金属top榜单': sort_GJS,'基金top榜单': fund_top}}
+
+@timed('report')
+def main(param_date):
+    '''生成报表，使用模块变量 abs_path（工作目录）及 df_match（分行全简称对应关系）'''
+    sheets = build(param_date,load_data(param_date),df_match)['4种业务TOP周榜单']
+
+    if not os.path.exists('./业务TOP周榜单'):
+        os.makedirs('./业务TOP周榜单')
+    #写入文件业务TOP周榜单
+    print(f"正在生成：4大业务TOP榜单{param_date}.xlsx...\n")
+    output_path = os.path.join(abs_path,output_files(param_date)[0])
+    with WorkbookJob(output_path) as writer:
+        for sheetname, df in sheets.items():
+            writer.write(df,sheetname,index=False)
+
+if __name__ == "__main__":
+
+    # 读取并校验执行参数，--profile 输出性能剖析结果，--trace-allocations 按阶段统计内存分配
+    args = parse_report_args('top_business_list.py')
+    param_date = args.date
+    abs_path = os.getcwd()
+
+    params = {'param_date': param_date}
+    try:
+        # 读取分行全简称对应关系及组别分类
+        df_match = get_repository().match(os.path.join(abs_path,MATCH_FILE))
+        with profiling(abs_path,'top_business_list',params,args.profile,args.trace_allocations):
+            main(param_date)
+            # 等待工作簿在写出进程中全部写完
+            wait_workbooks()
+    except BaseException as e:
+        # 失败原因记入运行报告
+        params['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        # 写出运行报告并输出各阶段的耗时，运行失败时同样写出
+        finish_run(abs_path,'top_business_list',params)
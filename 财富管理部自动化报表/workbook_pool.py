@@ -0,0 +1,151 @@
+import os
+import time
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import excel_writer
+from excel_writer import StreamingExcelWriter, check_writable
+from run_metrics import get_metrics, stage
+
+# 并行写出工作簿的进程数，设置环境变量 REPORT_WRITERS=1 可退回在本进程依次写出
+WRITER_WORKERS = int(os.environ.get('REPORT_WRITERS', '0')) or os.cpu_count() or 1
+
+
+def _write_job(path, sheets, side_output, batch_rows):
+    '''在写出进程中将一个工作簿的全部工作表写入文件，返回写出的 (墙钟耗时, CPU耗时)'''
+    wall, cpu = time.perf_counter(), time.process_time()
+    with StreamingExcelWriter(path, batch_rows=batch_rows, side_output=side_output) as writer:
+        for df, sheet_name, index, title_rows in sheets:
+            writer.write(df, sheet_name, index=index, title_rows=title_rows)
+    return time.perf_counter() - wall, time.process_time() - cpu
+
+
+class WorkbookJob:
+    '''
+    待写出的工作簿：接口与StreamingExcelWriter相同，with块中只收集各工作表已算好的DataFrame，
+    退出with块时整本提交到写出进程池，报表脚本不必等待写出完成即可继续计算
+    '''
+
+    def __init__(self, path, pool=None):
+        self.path = path
+        self.pool = pool or get_writer_pool()
+        self.owner = self.pool.owner
+        # 写出耗时记入提交时所在的报表
+        self.report = get_metrics().current_report()
+        # 在提交时确定输出方式，写出进程中不再读取模块变量
+        self.side_output = excel_writer.SIDE_OUTPUT
+        self.batch_rows = excel_writer.BATCH_ROWS
+        self.sheets = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.pool.submit(self)
+
+    def write(self, df, sheet_name, index=True, title_rows=None):
+        '''登记一张工作表，参数同 StreamingExcelWriter.write；无法写出的DataFrame在登记时即抛出ValueError，不等到写出进程中失败'''
+        check_writable(df, sheet_name, index)
+        self.sheets.append((df, sheet_name, index, title_rows))
+
+
+class WorkbookPool:
+    '''
+    工作簿写出进程池：各工作簿的xml生成及压缩分发到多个进程同时进行，
+    一批报表的写出耗时接近其中最慢的一本；进程数为1时在本进程依次写出
+    '''
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or WRITER_WORKERS
+        # 当前提交工作簿的报表名，由run_reports在生成各报表前设置，用于归集失败原因
+        self.owner = None
+        self._executor = None
+        self._pending = []
+        # 已提交、尚未等待完成的工作簿：{规范化路径: 提交时的报表名}
+        self._paths = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job):
+        '''提交一本工作簿，返回Future；与尚未等待完成的工作簿路径相同时抛出ValueError，不再后写覆盖先写'''
+        key = os.path.normcase(os.path.abspath(job.path))
+        with self._lock:
+            if key in self._paths:
+                owner = self._paths[key]
+                raise ValueError(f"工作簿{job.path}已由{f'报表{owner}' if owner else '此前的任务'}提交，不能重复写出")
+            self._paths[key] = job.owner
+        args = (job.path, job.sheets, job.side_output, job.batch_rows)
+        rows = sum(len(sheet[0]) for sheet in job.sheets)
+        if self.max_workers <= 1:
+            future = Future()
+            try:
+                with stage('write', os.path.basename(job.path), job.report, rows):
+                    future.set_result(_write_job(*args))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            future = self._executor.submit(_write_job, *args)
+            # 写出进程中的耗时在等待写出完成时补记
+            future.add_done_callback(lambda f: self._record(job, rows, f))
+        with self._lock:
+            self._pending.append((job, future))
+        return future
+
+    @staticmethod
+    def _record(job, rows, future):
+        '''补记写出进程中完成的工作簿写出'''
+        if future.cancelled() or future.exception() is not None:
+            return
+        wall, cpu = future.result()
+        get_metrics().add('write', os.path.basename(job.path), job.report, rows_in=rows, rows_out=None,
+                          wall_s=round(wall, 4), self_s=round(wall, 4), cpu_s=round(cpu, 4),
+                          self_cpu_s=round(cpu, 4), process='writer')
+
+    def wait(self, verbose=True):
+        '''
+        等待已提交的工作簿全部写出
+
+        :param verbose: 是否逐本输出保存路径
+        :return: {报表名或文件路径: 失败原因}，全部成功时为空字典
+        '''
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._paths = {}
+        failures = {}
+        for job, future in pending:
+            try:
+                future.result()
+                if verbose:
+                    print(f"{os.path.basename(job.path)}已保存至：{job.path}\n")
+            except Exception as e:
+                owner = job.owner or job.path
+                reason = f"写出{os.path.basename(job.path)}失败: {type(e).__name__}: {e}"
+                failures[owner] = f"{failures[owner]}; {reason}" if owner in failures else reason
+        return failures
+
+    def shutdown(self):
+        '''关闭写出进程'''
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+_pool = None
+
+
+def get_writer_pool():
+    '''返回进程内共享的工作簿写出进程池'''
+    global _pool
+    if _pool is None:
+        _pool = WorkbookPool()
+    return _pool
+
+
+def wait_workbooks():
+    '''独立运行报表脚本时等待全部工作簿写出，有写出失败时抛出异常'''
+    failures = get_writer_pool().wait()
+    if failures:
+        raise RuntimeError('; '.join(failures.values()))